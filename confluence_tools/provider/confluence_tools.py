@@ -1,8 +1,8 @@
 from typing import Any
-import requests
 
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
+from unit.credential_check import validate_credentials
 
 
 class ConfluenceToolsProvider(ToolProvider):
@@ -14,26 +14,20 @@ class ConfluenceToolsProvider(ToolProvider):
             username = credentials["userName"]
             password = credentials["password"]
 
-            # Setup session and headers
-            session = requests.Session()
-            session.auth = (username, password)
-            headers = {'Content-Type': 'application/json'}
+            # Validate within a deadline through the pooled session shared with the tools;
+            # a success is cached, so the first tool call does not validate again
+            result = validate_credentials(base_url, username, password)
 
-            # Make API request to validate credentials
-            base_api_url = f"{base_url}/rest/api"
-            response = session.get(
-                f"{base_api_url}/user/current",
-                headers=headers
-            )
-
-            if response.status_code != 200:
-                raise ToolProviderCredentialValidationError(
-                    f"Confluence登录失败，HTTP状态码: {response.status_code}，响应内容: {response.text}"
-                )
+            if not result["success"]:
+                if "status_code" in result:
+                    raise ToolProviderCredentialValidationError(
+                        f"Confluence登录失败，HTTP状态码: {result['status_code']}，响应内容: {result['details']}"
+                    )
+                raise ToolProviderCredentialValidationError(f"请求Confluence API失败: {result['details']}")
 
+        except ToolProviderCredentialValidationError:
+            raise
         except KeyError as e:
             raise ToolProviderCredentialValidationError(f"缺少必需的认证信息: {str(e)}") from e
-        except requests.RequestException as e:
-            raise ToolProviderCredentialValidationError(f"请求Confluence API失败: {str(e)}") from e
         except Exception as e:
             raise ToolProviderCredentialValidationError(f"验证凭据时发生错误: {str(e)}") from e
@@ -0,0 +1,66 @@
+"""Tests for compressed file blob outputs."""
+
+import gzip
+import io
+import unittest
+import zipfile
+
+from unit.blob_output import BlobOutput
+
+
+def pieces():
+    for i in range(2000):
+        yield f"## Section {i}\n\n段落 {i} with repeated text repeated text repeated text\n"
+
+
+class TestBlobOutput(unittest.TestCase):
+    """Test suite for BlobOutput."""
+
+    def setUp(self):
+        self.expected = "".join(pieces()).encode('utf-8')
+
+    def build(self, compression, threshold=1024 * 1024):
+        with BlobOutput("设计文档", ".md", "text/markdown", compression, threshold=threshold) as output:
+            for piece in pieces():
+                output.write(piece)
+            return output.finish(), output.meta(), output.size
+
+    def test_uncompressed(self):
+        """Test that without compression the blob and metadata match the plain file"""
+        blob, meta, size = self.build("none")
+        self.assertEqual(blob, self.expected)
+        self.assertEqual(size, len(self.expected))
+        self.assertEqual(meta, {'mime_type': 'text/markdown', 'filename': '设计文档.md',
+                                'original_filename': '设计文档', 'save_as': '设计文档.md'})
+
+    def test_gzip(self):
+        """Test that gzip output decompresses to the content and is labelled as gzip"""
+        for threshold in (1024 * 1024, 1024):
+            with self.subTest(threshold=threshold):
+                blob, meta, size = self.build("gzip", threshold)
+                self.assertEqual(gzip.decompress(blob), self.expected)
+                self.assertLess(len(blob), len(self.expected) / 5)
+                self.assertEqual(size, len(self.expected))
+                self.assertEqual(meta['mime_type'], 'application/gzip')
+                self.assertEqual(meta['filename'], '设计文档.md.gz')
+
+    def test_zip(self):
+        """Test that zip output holds the file under its original name"""
+        for threshold in (1024 * 1024, 1024):
+            with self.subTest(threshold=threshold):
+                blob, meta, _ = self.build("zip", threshold)
+                with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+                    self.assertEqual(archive.namelist(), ['设计文档.md'])
+                    self.assertEqual(archive.read('设计文档.md'), self.expected)
+                    self.assertIsNone(archive.testzip())
+                self.assertEqual(meta['mime_type'], 'application/zip')
+                self.assertEqual(meta['save_as'], '设计文档.zip')
+
+    def test_unknown_compression(self):
+        """Test that an unsupported compression is rejected"""
+        with self.assertRaises(ValueError):
+            BlobOutput("a", ".md", "text/markdown", "bz2")
+
+
+if __name__ == '__main__':
+    unittest.main()
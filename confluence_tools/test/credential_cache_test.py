@@ -0,0 +1,97 @@
+"""Unit tests for the credential validation cache."""
+
+import time
+import unittest
+
+from stub_confluence import StubState, serve
+from unit.confluence_retry import CircuitBreakerRegistry
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache
+
+
+class TestCredentialValidationCache(unittest.TestCase):
+    """Test suite for CredentialValidationCache on its own."""
+
+    def setUp(self):
+        self.cache = CredentialValidationCache(ttl=60)
+
+    def test_mark_valid(self):
+        """Test that a validation is remembered per base URL and user"""
+        self.assertFalse(self.cache.is_valid("https://wiki/", "user", "secret"))
+        self.cache.mark_valid("https://wiki/", "user", "secret")
+        self.assertTrue(self.cache.is_valid("https://wiki", "user", "secret"))
+        self.assertFalse(self.cache.is_valid("https://wiki", "other", "secret"))
+        self.assertFalse(self.cache.is_valid("https://other", "user", "secret"))
+
+    def test_changed_password_is_a_miss(self):
+        """Test that another password does not reuse the validation and drops it"""
+        self.cache.mark_valid("https://wiki", "user", "secret")
+        self.assertFalse(self.cache.is_valid("https://wiki", "user", "changed"))
+        self.assertFalse(self.cache.is_valid("https://wiki", "user", "secret"))
+
+    def test_ttl_expiry(self):
+        """Test that a validation older than the TTL is a miss"""
+        cache = CredentialValidationCache(ttl=0.01)
+        cache.mark_valid("https://wiki", "user", "secret")
+        time.sleep(0.02)
+        self.assertFalse(cache.is_valid("https://wiki", "user", "secret"))
+
+    def test_invalidate(self):
+        """Test that invalidate drops the cached validation"""
+        self.cache.mark_valid("https://wiki", "user", "secret")
+        self.cache.invalidate("https://wiki/", "user")
+        self.assertFalse(self.cache.is_valid("https://wiki", "user", "secret"))
+
+
+class TestSessionAuthentication(unittest.TestCase):
+    """Test suite for ensure_authenticated against the stub server."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        cls.state.add_page("1", "Home", "<p>home</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.cache = CredentialValidationCache()
+        self.state.calls.clear()
+
+    def session(self, password: str = "secret") -> ConfluenceSession:
+        return ConfluenceSession(self.base_url, "user", password, credential_cache=self.cache,
+                                 content_cache=PageContentCache(), breakers=CircuitBreakerRegistry())
+
+    def auth_calls(self):
+        return [call for call in self.state.calls if call.startswith("/rest/api/user/current")]
+
+    def test_validation_shared_across_sessions(self):
+        """Test that later sessions with the same credentials skip the authentication request"""
+        for _ in range(3):
+            self.assertTrue(self.session().get_page_content("1")["success"])
+        self.assertEqual(len(self.auth_calls()), 1)
+
+    def test_failed_validation_not_cached(self):
+        """Test that wrong credentials are checked again on every call"""
+        for _ in range(2):
+            result = self.session("wrong").ensure_authenticated()
+            self.assertFalse(result["success"])
+            self.assertEqual(result["status_code"], 401)
+        self.assertEqual(len(self.auth_calls()), 2)
+        self.assertFalse(self.cache.is_valid(self.base_url, "user", "wrong"))
+
+    def test_forbidden_content_invalidates(self):
+        """Test that a 403 on page content drops the cached validation"""
+        session = self.session()
+        self.assertTrue(session.ensure_authenticated()["success"])
+        self.state.unreadable.add("1")
+        try:
+            self.assertFalse(session.get_page_content("1")["success"])
+        finally:
+            self.state.unreadable.clear()
+        self.assertFalse(self.cache.is_valid(self.base_url, "user", "secret"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests for deadline-bounded credential validation."""
+
+import socket
+import time
+import unittest
+from unittest.mock import patch
+
+from stub_confluence import StubState, serve
+from unit.confluence_retry import CircuitBreakerRegistry, RetryPolicy
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.credential_check import ReachabilityError, check_reachable, uses_proxy, validate_credentials
+
+
+def closed_port() -> int:
+    """A local port nothing listens on."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestCredentialCheck(unittest.TestCase):
+    """Test suite for check_reachable and validate_credentials."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.state.calls.clear()
+        self.state.latency = 0
+        self.cache = CredentialValidationCache()
+
+    def validate(self, base_url, password="secret", **kwargs):
+        return validate_credentials(base_url, "user", password, credential_cache=self.cache,
+                                    breakers=CircuitBreakerRegistry(), **kwargs)
+
+    def test_reachable(self):
+        """Test that a listening host passes the check without any HTTP request"""
+        self.assertLess(check_reachable(self.base_url), 1)
+        self.assertEqual(self.state.calls, [])
+
+    def test_invalid_urls(self):
+        """Test that URLs without scheme or host are rejected"""
+        for url in ("confluence.example.com", "ftp://host", "http://", "http://host:port"):
+            with self.subTest(url=url), self.assertRaises(ReachabilityError):
+                check_reachable(url)
+
+    def test_attempts_share_one_timeout(self):
+        """Test that resolution and every connection attempt are charged against one timeout"""
+        class BlackholeSocket:
+            def __init__(self, *args):
+                self.timeout = None
+
+            def settimeout(self, timeout):
+                self.timeout = timeout
+
+            def connect(self, address):
+                time.sleep(self.timeout)
+                raise socket.timeout("timed out")
+
+            def close(self):
+                pass
+
+        def slow_resolve(*args):
+            time.sleep(0.2)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 0, "", (f"10.0.0.{i}", 80)) for i in range(5)]
+
+        started = time.monotonic()
+        with patch('unit.credential_check.socket.getaddrinfo', slow_resolve), \
+                patch('unit.credential_check.socket.socket', BlackholeSocket):
+            with self.assertRaises(ReachabilityError):
+                check_reachable("http://wiki", timeout=0.5)
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_proxy_skips_socket_check(self):
+        """Test that a host reached through HTTP_PROXY is validated through the proxy"""
+        env = {"HTTP_PROXY": self.base_url, "http_proxy": self.base_url, "NO_PROXY": "", "no_proxy": ""}
+        with patch.dict('os.environ', env):
+            self.assertTrue(uses_proxy("http://confluence.invalid"))
+            result = self.validate("http://confluence.invalid", connect_timeout=1)
+        self.assertTrue(result["success"])
+        self.assertIn("http://confluence.invalid/rest/api/user/current", self.state.calls)
+        with patch.dict('os.environ', {**env, "NO_PROXY": "confluence.invalid", "no_proxy": "confluence.invalid"}):
+            self.assertFalse(uses_proxy("http://confluence.invalid"))
+
+    def test_refused_connection_fails_fast(self):
+        """Test that a closed port is reported before any authentication request"""
+        started = time.monotonic()
+        result = self.validate(f"http://127.0.0.1:{closed_port()}")
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(result["success"])
+        self.assertIn("无法连接", result["details"])
+        self.assertNotIn("status_code", result)
+
+    def test_unresolvable_host(self):
+        """Test that a name that does not resolve fails within the connect timeout"""
+        started = time.monotonic()
+        result = self.validate("https://confluence.invalid", connect_timeout=1)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertFalse(result["success"])
+        self.assertIn("域名解析", result["details"])
+
+    def test_slow_server_is_bounded_by_deadline(self):
+        """Test that a server that does not answer cannot hold validation past the deadline"""
+        self.state.latency = 2
+        started = time.monotonic()
+        result = self.validate(self.base_url, deadline=0.5, retry=RetryPolicy(max_attempts=1))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertFalse(result["success"])
+        self.assertFalse(self.cache.is_valid(self.base_url, "user", "secret"))
+
+    def test_success_is_reused_by_tools(self):
+        """Test that a successful validation spares the first tool call its probe"""
+        self.assertTrue(self.validate(self.base_url)["success"])
+        self.state.calls.clear()
+        session = ConfluenceSession(self.base_url, "user", "secret", credential_cache=self.cache,
+                                    breakers=CircuitBreakerRegistry())
+        self.assertTrue(session.ensure_authenticated()["success"])
+        self.assertEqual(self.state.calls, [])
+
+    def test_wrong_password(self):
+        """Test that rejected credentials report the HTTP status and are not cached"""
+        result = self.validate(self.base_url, password="wrong")
+        self.assertFalse(result["success"])
+        self.assertEqual(result["status_code"], 401)
+        self.assertFalse(self.cache.is_valid(self.base_url, "user", "wrong"))
+
+
+if __name__ == '__main__':
+    unittest.main()
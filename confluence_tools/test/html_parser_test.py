@@ -0,0 +1,68 @@
+"""Unit tests for the ConfluenceHTMLParser class."""
+
+import random
+import unittest
+
+from synthetic_pages import mixed_page
+from unit.confluence_html_parser import ConfluenceHTMLParser
+
+
+def to_markdown(html: str, **kwargs) -> str:
+    parser = ConfluenceHTMLParser(**kwargs)
+    parser.feed(html)
+    return parser.get_markdown()
+
+
+class TestConfluenceHTMLParser(unittest.TestCase):
+    """Test suite for ConfluenceHTMLParser conversion."""
+
+    def test_headings(self):
+        """Test headings with and without level marks"""
+        self.assertEqual(to_markdown("<h2>Title</h2>"), "\n## Title\n")
+        self.assertEqual(to_markdown("<h3>Title</h3>", add_level_mark=True, mark_prefix="S"),
+                         "\n### S3 Title\n")
+
+    def test_paragraphs_collapse_blank_lines(self):
+        """Test that consecutive blank lines are collapsed into one"""
+        markdown = to_markdown("<p>one</p><p></p><p>   </p><br/><p>two <code>x</code></p>")
+        self.assertEqual(markdown, "one\n\ntwo `x`\n")
+
+    def test_code_macro(self):
+        """Test code macros with language and CDATA body"""
+        html = ('<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">python</ac:parameter>'
+                '<ac:plain-text-body><![CDATA[def f():\n    return "<b>"]]></ac:plain-text-body>'
+                '</ac:structured-macro>')
+        self.assertEqual(to_markdown(html), '\n```python\ndef f():\n    return "<b>"\n```\n')
+
+    def test_table_with_spans(self):
+        """Test rowspan and colspan padding"""
+        html = ('<table><tbody><tr><th>A</th><th>B</th><th>C</th></tr>'
+                '<tr><td rowspan="2">r</td><td colspan="2">wide</td></tr>'
+                '<tr><td>x</td><td>y</td></tr></tbody></table>')
+        self.assertEqual(to_markdown(html), "\n| A | B | C |\n| --- | --- | --- |\n"
+                                            "| r | wide |     |\n|     | x | y |\n")
+
+    def test_code_macro_in_table_cell(self):
+        """Test that code inside a table cell is rendered inline"""
+        html = ('<table><tbody><tr><th>Query</th></tr><tr><td><ac:structured-macro ac:name="code">'
+                '<ac:parameter ac:name="language">sql</ac:parameter>'
+                '<ac:plain-text-body><![CDATA[select 1\nfrom t]]></ac:plain-text-body>'
+                '</ac:structured-macro></td></tr></tbody></table>')
+        self.assertIn("| `sql select 1 from t` |", to_markdown(html))
+
+    def test_drain_matches_get_markdown(self):
+        """Test that streamed output equals the one-shot conversion"""
+        html = mixed_page(blocks=200, seed=7)
+        expected = to_markdown(html, add_level_mark=True)
+
+        rnd = random.Random(7)
+        parser = ConfluenceHTMLParser(add_level_mark=True)
+        parts = []
+        position = 0
+        while position < len(html):
+            step = rnd.randint(1, 500)
+            parser.feed(html[position:position + step])
+            parts.append(parser.drain_markdown())
+            position += step
+        parts.append(parser.drain_markdown(final=True))
+        self.assertEqual("".join(parts), expected)
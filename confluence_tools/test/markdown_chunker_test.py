@@ -0,0 +1,89 @@
+"""Unit tests for chunked output of ConfluenceHTMLParser."""
+
+import re
+import unittest
+
+from synthetic_pages import code_macro_page, large_table_page, mixed_page
+from unit.confluence_html_parser import ConfluenceHTMLParser
+from unit.markdown_chunker import MarkdownChunker, approx_tokens
+
+
+def to_chunks(html: str, max_size: int = 2000, unit: str = "chars", overlap: int = 0, **kwargs) -> list:
+    parser = ConfluenceHTMLParser(chunker=MarkdownChunker(max_size, unit, overlap), **kwargs)
+    parser.feed(html)
+    return parser.drain_chunks(final=True)
+
+
+def fence_lines(content: str) -> list:
+    return [line for line in content.split('\n') if re.fullmatch(r'```\w*', line)]
+
+
+class TestMarkdownChunker(unittest.TestCase):
+    """Test suite for MarkdownChunker driven by the parser."""
+
+    def test_heading_boundaries_and_paths(self):
+        """Test that every heading starts a chunk carrying its heading path"""
+        html = ("<h1>Guide</h1><p>intro</p><h2>Install</h2><p>pip install</p>"
+                "<h3>Linux</h3><p>apt</p><h2>Usage</h2><p>run it</p>")
+        chunks = to_chunks(html, add_level_mark=True)
+        self.assertEqual([c["heading_path"] for c in chunks],
+                         [["Guide"], ["Guide", "Install"], ["Guide", "Install", "Linux"], ["Guide", "Usage"]])
+        self.assertEqual(chunks[1]["content"], "## L_2 Install\n\npip install")
+        self.assertEqual([c["index"] for c in chunks], [0, 1, 2, 3])
+
+    def test_heading_without_body_is_skipped(self):
+        """Test that a heading directly followed by a sub-heading yields no chunk"""
+        chunks = to_chunks("<h1>Top</h1><h2>Sub</h2><p>text</p>")
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["heading_path"], ["Top", "Sub"])
+
+    def test_size_limit_and_overlap(self):
+        """Test that long sections are split at paragraph boundaries with overlap"""
+        paragraphs = "".join(f"<p>paragraph {i} " + "x" * 80 + "</p>" for i in range(20))
+        chunks = to_chunks(f"<h2>Long</h2>{paragraphs}", max_size=400, overlap=100)
+        self.assertGreater(len(chunks), 3)
+        for chunk in chunks:
+            self.assertLessEqual(chunk["chars"], 400)
+            self.assertEqual(chunk["heading_path"], ["Long"])
+        # 续接分段以上一分段的最后一个段落开头
+        last_paragraph = chunks[0]["content"].split("\n\n")[-1]
+        self.assertTrue(chunks[1]["content"].startswith(last_paragraph))
+
+    def test_oversized_paragraph_is_split(self):
+        """Test that a single huge paragraph is split at word boundaries"""
+        chunks = to_chunks("<p>" + "word " * 1000 + "</p>", max_size=300)
+        self.assertTrue(all(c["chars"] <= 300 for c in chunks))
+        self.assertEqual(sum(c["content"].count("word") for c in chunks), 1000)
+
+    def test_tables_and_code_are_never_split(self):
+        """Test that tables and code blocks stay whole even when oversized"""
+        table = large_table_page(rows=50)
+        chunks = to_chunks(f"<h2>Data</h2>{table}<p>after</p>", max_size=200)
+        table_chunks = [c for c in chunks if "| --- |" in c["content"]]
+        self.assertEqual(len(table_chunks), 1)
+        self.assertEqual(table_chunks[0]["content"].count("\n| "), 52)
+
+        for html in (code_macro_page(macros=10, lines=40), mixed_page(blocks=200)):
+            for chunk in to_chunks(html, max_size=200, overlap=50):
+                self.assertEqual(len(fence_lines(chunk["content"])) % 2, 0, chunk["content"])
+
+    def test_token_unit(self):
+        """Test approximate token counting and token-based limits"""
+        self.assertEqual(approx_tokens("abcdefgh"), 2)
+        self.assertEqual(approx_tokens("中文内容"), 4)
+        chunks = to_chunks("<p>" + "中文 " * 600 + "</p>", max_size=200, unit="tokens")
+        self.assertTrue(all(c["tokens"] <= 200 for c in chunks))
+
+    def test_chunks_cover_markdown(self):
+        """Test that chunk contents add up to the Markdown output without overlap"""
+        html = mixed_page(blocks=150)
+        parser = ConfluenceHTMLParser()
+        parser.feed(html)
+        markdown = parser.get_markdown()
+        chunks = to_chunks(html, max_size=500)
+        self.assertEqual(re.sub(r'\s+', '', "".join(c["content"] for c in chunks)),
+                         re.sub(r'\s+', '', markdown))
+
+
+if __name__ == '__main__':
+    unittest.main()
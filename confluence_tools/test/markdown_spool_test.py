@@ -0,0 +1,100 @@
+"""Tests for the bounded-memory Markdown spool."""
+
+import hashlib
+import tracemalloc
+import unittest
+
+from unit.confluence_html_parser import ConfluenceHTMLParser
+from unit.markdown_spool import MarkdownSpool, iter_converted
+
+
+def log_page_chunks(lines: int = 30000, chunk_size: int = 64 * 1024):
+    """A large exported-log page, produced piece by piece like a streamed response."""
+    buffer = []
+    size = 0
+    for i in range(lines):
+        if i % 500 == 0:
+            buffer.append(f"<h2>Batch {i // 500}</h2>")
+        buffer.append(f"<p>2024-01-01 00:{i % 60:02d}:00 INFO worker-{i % 16} request {i} "
+                      f"handled in <code>{i % 997}ms</code> status=200 path=/api/v1/items/{i}</p>")
+        size += len(buffer[-1])
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    yield "".join(buffer)
+
+
+class TestMarkdownSpool(unittest.TestCase):
+    """Test suite for MarkdownSpool fed by iter_converted."""
+
+    def test_small_output_stays_in_memory(self):
+        """Test that output below the threshold is kept in memory"""
+        with MarkdownSpool(threshold=1024) as spool:
+            spool.write("# 标题\n")
+            spool.write("")
+            spool.write("正文")
+            self.assertFalse(spool.spilled)
+            self.assertEqual(spool.text(), "# 标题\n正文")
+            self.assertEqual(spool.size, len("# 标题\n正文".encode('utf-8')))
+
+    def test_spills_past_threshold(self):
+        """Test that output moves to a temporary file once the threshold is exceeded"""
+        with MarkdownSpool(threshold=10) as spool:
+            spool.write("first ")
+            spool.write("second ")
+            self.assertTrue(spool.spilled)
+            spool.write("third")
+            self.assertEqual(spool.getvalue(), b"first second third")
+            # 读取后仍可继续写入
+            spool.write("!")
+            self.assertEqual(spool.getvalue(), b"first second third!")
+
+    def test_same_output_as_get_markdown(self):
+        """Test that the spooled output equals the in-memory conversion"""
+        parser = ConfluenceHTMLParser()
+        parser.feed("".join(log_page_chunks(lines=2000)))
+        expected = parser.get_markdown()
+        with MarkdownSpool(threshold=4096) as spool:
+            for markdown in iter_converted(ConfluenceHTMLParser(), log_page_chunks(lines=2000, chunk_size=1000)):
+                spool.write(markdown)
+            self.assertTrue(spool.spilled)
+            self.assertEqual(spool.text(), expected)
+
+    def test_peak_memory_is_bounded(self):
+        """Test that spooling keeps peak memory well below the output size"""
+        def measure(convert):
+            tracemalloc.start()
+            try:
+                digest, size = convert()
+                return digest, size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def in_memory():
+            parser = ConfluenceHTMLParser()
+            for chunk in log_page_chunks():
+                parser.feed(chunk)
+            data = parser.get_markdown().encode('utf-8')
+            return hashlib.sha256(data).hexdigest(), len(data)
+
+        def spooled():
+            digest = hashlib.sha256()
+            with MarkdownSpool(threshold=256 * 1024) as spool:
+                for markdown in iter_converted(ConfluenceHTMLParser(), log_page_chunks()):
+                    digest.update(markdown.encode('utf-8'))
+                    spool.write(markdown)
+                self.assertTrue(spool.spilled)
+                return digest.hexdigest(), spool.size
+
+        expected_digest, output_size, baseline_peak = measure(in_memory)
+        digest, size, peak = measure(spooled)
+        self.assertEqual((digest, size), (expected_digest, output_size))
+        self.assertGreater(output_size, 2 * 1024 * 1024)
+        # 整体转换时 md_lines、拼接结果与编码结果同时存在
+        self.assertGreater(baseline_peak, 2 * output_size)
+        self.assertLess(peak, output_size / 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
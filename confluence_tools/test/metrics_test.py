@@ -0,0 +1,122 @@
+"""Tests for per-invocation metrics and their recording by the session and converters."""
+
+import json
+import time
+import unittest
+
+from stub_confluence import StubState, serve
+from unit.confluence_html_parser import ConfluenceHTMLParser
+from unit.confluence_retry import CircuitBreakerRegistry, RetryPolicy
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.markdown_spool import iter_converted
+from unit.metrics import InvocationMetrics, timed_iter
+from unit.page_cache import BoundedLruCache, PageContentCache
+from unit.page_markdown import fetch_page_markdown
+
+
+class TestInvocationMetrics(unittest.TestCase):
+    """Test suite for InvocationMetrics."""
+
+    def test_stages_and_counters(self):
+        """Test that stages accumulate time and occurrences and counters add up"""
+        metrics = InvocationMetrics("tool")
+        for _ in range(2):
+            with metrics.stage("parse"):
+                time.sleep(0.01)
+        metrics.incr("retries")
+        metrics.incr("bytes_downloaded", 100)
+        summary = metrics.summary()
+        self.assertEqual(summary["stages"]["parse"]["count"], 2)
+        self.assertGreaterEqual(summary["stages"]["parse"]["ms"], 20)
+        self.assertEqual(summary["counters"], {"retries": 1, "bytes_downloaded": 100})
+        self.assertGreaterEqual(summary["total_ms"], summary["stages"]["parse"]["ms"])
+
+    def test_log_record(self):
+        """Test that the log record is a single JSON line with the extra fields"""
+        metrics = InvocationMetrics("html_md_api")
+        metrics.incr("requests", 2)
+        with self.assertLogs("unit.metrics", level="INFO") as logs:
+            record = metrics.log(page_id="42")
+        logged = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logged["event"], "tool_metrics")
+        self.assertEqual(logged["tool"], "html_md_api")
+        self.assertEqual(logged["page_id"], "42")
+        self.assertEqual(logged["counters"], {"requests": 2})
+        self.assertEqual(record["counters"], logged["counters"])
+
+    def test_timed_iter_excludes_consumer_time(self):
+        """Test that only the time spent producing items is counted"""
+        def slow_source():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        metrics = InvocationMetrics()
+        for _ in timed_iter(slow_source(), metrics, "download"):
+            time.sleep(0.03)
+        stage = metrics.summary()["stages"]["download"]
+        self.assertGreaterEqual(stage["ms"], 30)
+        self.assertLess(stage["ms"], 90)
+        self.assertEqual(stage["count"], 0)
+
+    def test_iter_converted_records_parse(self):
+        """Test that streaming conversion records the parse stage"""
+        metrics = InvocationMetrics()
+        parts = list(iter_converted(ConfluenceHTMLParser(), ["<h1>A</h1><p>", "b</p>"], metrics))
+        parser = ConfluenceHTMLParser()
+        parser.feed("<h1>A</h1><p>b</p>")
+        self.assertEqual("".join(parts), parser.get_markdown())
+        self.assertIn("parse", metrics.summary()["stages"])
+
+
+class TestSessionMetrics(unittest.TestCase):
+    """Test suite for the metrics recorded by ConfluenceSession against the stub server."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        cls.state.add_page("1", "Page", "<h1>Title</h1><p>body</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def session(self, metrics):
+        return ConfluenceSession(self.base_url, "user", "secret", credential_cache=CredentialValidationCache(),
+                                 content_cache=PageContentCache(), breakers=CircuitBreakerRegistry(),
+                                 retry=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01),
+                                 metrics=metrics)
+
+    def test_stages_cache_hits_and_retries(self):
+        """Test that auth, probe, download, parse, cache hits and retries are recorded"""
+        metrics = InvocationMetrics()
+        session = self.session(metrics)
+        cache = BoundedLruCache(1024 * 1024)
+        self.state.failures = [(429, {"Retry-After": "0"})]
+        self.assertTrue(fetch_page_markdown(session, "1", cache=cache)["success"])
+        self.assertTrue(fetch_page_markdown(session, "1", cache=cache)["from_cache"])
+        self.assertTrue(session.get_page_content("1")["from_cache"])
+
+        summary = metrics.summary()
+        self.assertTrue({"auth", "probe", "download", "parse"} <= set(summary["stages"]))
+        self.assertEqual(summary["stages"]["download"]["count"], 1)
+        counters = summary["counters"]
+        self.assertEqual(counters["retries"], 1)
+        # 认证一次（含一次重试）、首次直接下载、之后探测两次
+        self.assertEqual(counters["requests"], 5)
+        self.assertEqual(counters["render_cache_hits"], 1)
+        self.assertEqual(counters["content_cache_hits"], 1)
+        self.assertEqual(counters["auth_cache_hits"], 2)
+        self.assertGreater(counters["bytes_downloaded"], len("<h1>Title</h1><p>body</p>"))
+
+    def test_streamed_download_bytes(self):
+        """Test that a streamed download counts the bytes read from the response"""
+        metrics = InvocationMetrics()
+        wiki = self.session(metrics).stream_page_content("1")
+        self.assertEqual("".join(wiki["chunks"]), "<h1>Title</h1><p>body</p>")
+        self.assertGreater(metrics.counter("bytes_downloaded"), 0)
+        self.assertIn("download", metrics.summary()["stages"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+"""Tests for attachment resolution and the content-addressed attachment store."""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from stub_confluence import StubState, serve
+from unit.attachment_store import AttachmentStore, attachment_extension
+from unit.confluence_retry import CircuitBreakerRegistry
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_attachments import (build_attachment_archive, fetch_page_with_attachments, referenced_attachments,
+                                   release_attachments)
+from unit.page_cache import PageContentCache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"diagram" * 5000
+PDF = b"%PDF-1.4 spec"
+
+PAGE = ('<h1>Design</h1>'
+        '<p><ac:image ac:alt="Architecture"><ri:attachment ri:filename="arch.png" /></ac:image></p>'
+        '<p>See <ac:link><ri:attachment ri:filename="spec &amp; notes.pdf" />'
+        '<ac:plain-text-link-body><![CDATA[the spec]]></ac:plain-text-link-body></ac:link>.</p>'
+        '<p><ac:image><ri:attachment ri:filename="logo.png"><ri:page ri:content-title="Home" /></ri:attachment>'
+        '</ac:image></p>'
+        '<table><tbody><tr><th>Figure</th></tr><tr><td><ac:image><ri:attachment ri:filename="missing.png" />'
+        '</ac:image></td></tr></tbody></table>')
+
+
+class TestAttachmentStore(unittest.TestCase):
+    """Resolution of page attachments against the stub server."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        cls.state.add_page("10", "Design", PAGE)
+        cls.state.add_attachment("10", "att1", "arch.png", PNG, "image/png")
+        cls.state.add_attachment("10", "att2", "spec & notes.pdf", PDF, "application/pdf")
+        cls.state.add_attachment("10", "att3", "unused.bin", b"x" * 100)
+        # 另一个页面上内容相同的附件
+        cls.state.add_page("20", "Copy", '<p><ac:image><ri:attachment ri:filename="copy.png" /></ac:image></p>')
+        cls.state.add_attachment("20", "att4", "copy.png", PNG, "image/png")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = AttachmentStore(self.tmp.name)
+        self.state.calls.clear()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def session(self):
+        return ConfluenceSession(self.base_url, "user", "secret", credential_cache=CredentialValidationCache(),
+                                 content_cache=PageContentCache(), breakers=CircuitBreakerRegistry())
+
+    def downloads(self):
+        return [call for call in self.state.calls if call.startswith("/download/")]
+
+    def test_referenced_attachments(self):
+        """Test that only this page's attachments are collected, unescaped and deduplicated"""
+        self.assertEqual(referenced_attachments(PAGE + PAGE), ["arch.png", "spec & notes.pdf", "missing.png"])
+
+    def test_extension(self):
+        """Test extensions from file names with a media type fallback"""
+        self.assertEqual(attachment_extension("Diagram.PNG"), ".png")
+        self.assertEqual(attachment_extension("README", "application/pdf"), ".pdf")
+        self.assertEqual(attachment_extension("weird.ext with space"), "")
+
+    def test_markdown_links_stored_files(self):
+        """Test that images and links point at content-addressed files"""
+        result = fetch_page_with_attachments(self.session(), "10", store=self.store)
+        self.assertTrue(result["success"], result)
+        png_name = hashlib.sha256(PNG).hexdigest() + ".png"
+        pdf_name = hashlib.sha256(PDF).hexdigest() + ".pdf"
+        markdown = result["markdown"]
+        self.assertIn(f"![Architecture](attachments/{png_name})", markdown)
+        self.assertIn(f"[spec & notes.pdf](attachments/{pdf_name})", markdown)
+        # 其他页面的附件与缺失的附件保留文件名
+        self.assertIn("![logo.png](logo.png)", markdown)
+        self.assertIn("| ![missing.png](missing.png) |", markdown)
+        self.assertEqual([entry["filename"] for entry in result["attachments"]], ["arch.png", "spec & notes.pdf"])
+        self.assertEqual(result["failed"], [{"filename": "missing.png", "message": "附件不存在"}])
+        with open(self.store.path_for(png_name), 'rb') as f:
+            self.assertEqual(f.read(), PNG)
+        # 未被引用的附件不下载
+        self.assertEqual(len(self.downloads()), 2)
+
+    def test_downloads_once(self):
+        """Test that a stored attachment version is not downloaded again, also by a new store instance"""
+        fetch_page_with_attachments(self.session(), "10", store=self.store)
+        result = fetch_page_with_attachments(self.session(), "10", store=self.store)
+        self.assertTrue(all(entry["from_store"] for entry in result["attachments"]))
+        restarted = AttachmentStore(self.tmp.name)
+        result = fetch_page_with_attachments(self.session(), "10", store=restarted)
+        self.assertTrue(all(entry["from_store"] for entry in result["attachments"]))
+        self.assertEqual(len(self.downloads()), 2)
+
+    def test_identical_content_is_stored_once(self):
+        """Test that equal bytes attached to different pages share one file"""
+        first = fetch_page_with_attachments(self.session(), "10", store=self.store)
+        second = fetch_page_with_attachments(self.session(), "20", store=self.store)
+        self.assertEqual(second["attachments"][0]["path"], first["attachments"][0]["path"])
+        files = [name for _, _, names in os.walk(self.tmp.name) for name in names if name.endswith(".png")]
+        self.assertEqual(len(files), 1)
+
+    def test_concurrent_requests_share_download(self):
+        """Test that concurrent fetches of one attachment download it once"""
+        session = self.session()
+        attachment = next(item for item in session.iter_attachments("10") if item["filename"] == "arch.png")
+        self.state.latency = 0.05
+        try:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(self.store.fetch(session, attachment)))
+                       for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.state.latency = 0
+        self.assertEqual(len({entry["path"] for entry in results}), 1)
+        self.assertEqual(len(self.downloads()), 1)
+
+    def test_size_limits(self):
+        """Test the per-file limit and eviction once the store exceeds its size"""
+        small = AttachmentStore(self.tmp.name, max_file_bytes=1000)
+        result = fetch_page_with_attachments(self.session(), "10", store=small)
+        self.assertIn("arch.png", [entry["filename"] for entry in result["failed"]])
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if name.endswith(".tmp")], [])
+
+        tiny = AttachmentStore(os.path.join(self.tmp.name, "tiny"), max_bytes=len(PNG))
+        result = fetch_page_with_attachments(self.session(), "10", store=tiny)
+        release_attachments(result, tiny)
+        self.assertLessEqual(tiny.stats()["bytes"], len(PNG))
+
+    def test_pinned_files_survive_eviction(self):
+        """Test that files returned to an invocation are not evicted until released"""
+        tiny = AttachmentStore(self.tmp.name, max_bytes=len(PNG))
+        first = fetch_page_with_attachments(self.session(), "10", store=tiny)
+        # 另一次调用写入新文件，触发淘汰
+        self.state.add_attachment("20", "att5", "other.png", b"other" * 100, "image/png")
+        try:
+            attachment = next(item for item in self.session().iter_attachments("20") if item["filename"] == "other.png")
+            tiny.fetch(self.session(), attachment)
+        finally:
+            self.state.attachments["20"].pop()
+        self.assertTrue(all(os.path.exists(entry["path"]) for entry in first["attachments"]))
+        blob = build_attachment_archive("Design.md", first["markdown"], first["attachments"])
+        with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+            self.assertEqual(len(archive.namelist()), 3)
+
+        release_attachments(first, tiny)
+        self.assertLessEqual(tiny.stats()["bytes"], len(PNG))
+        self.assertFalse(all(os.path.exists(entry["path"]) for entry in first["attachments"]))
+
+    def test_index_files_evicted(self):
+        """Test that the index mirror counts toward the store size and is evicted with the files"""
+        tiny = AttachmentStore(self.tmp.name, max_bytes=len(PNG))
+        release_attachments(fetch_page_with_attachments(self.session(), "10", store=tiny), tiny)
+        release_attachments(fetch_page_with_attachments(self.session(), "20", store=tiny), tiny)
+        on_disk = sum(os.path.getsize(os.path.join(directory, name))
+                      for directory, _, names in os.walk(self.tmp.name) for name in names)
+        self.assertEqual(tiny.stats()["bytes"], on_disk)
+        self.assertLessEqual(on_disk, len(PNG))
+        self.assertEqual(AttachmentStore(self.tmp.name).stats()["bytes"], on_disk)
+
+    def test_pins_released_on_unexpected_error(self):
+        """Test that files already pinned are released when the conversion raises"""
+        store = self.store
+        fetch = store.fetch
+
+        def failing_fetch(session, attachment):
+            if attachment["filename"] == "arch.png":
+                raise RuntimeError("boom")
+            return fetch(session, attachment)
+
+        store.fetch = failing_fetch
+        with self.assertRaises(RuntimeError):
+            fetch_page_with_attachments(self.session(), "10", store=store)
+        self.assertEqual(store._pins, {})
+
+        store.fetch = fetch
+        with patch('unit.page_attachments.create_parser', side_effect=RuntimeError("parse")):
+            with self.assertRaises(RuntimeError):
+                fetch_page_with_attachments(self.session(), "10", store=store)
+        self.assertEqual(store._pins, {})
+
+    def test_missing_file_reported(self):
+        """Test that an attachment file removed behind the store is reported instead of failing the archive"""
+        result = fetch_page_with_attachments(self.session(), "10", store=self.store)
+        os.remove(result["attachments"][1]["path"])
+        failed = []
+        blob = build_attachment_archive("Design.md", result["markdown"], result["attachments"], failed)
+        with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+        self.assertEqual([item["filename"] for item in failed], ["spec & notes.pdf"])
+
+    def test_archive(self):
+        """Test that the archive holds the Markdown and the linked files"""
+        result = fetch_page_with_attachments(self.session(), "10", store=self.store)
+        blob = build_attachment_archive("Design.md", result["markdown"], result["attachments"])
+        with zipfile.ZipFile(io.BytesIO(blob)) as archive:
+            names = archive.namelist()
+            self.assertEqual(names[0], "Design.md")
+            png = next(name for name in names if name.endswith(".png"))
+            self.assertIn(f"]({png})", archive.read("Design.md").decode('utf-8'))
+            self.assertEqual(archive.read(png), PNG)
+            self.assertEqual(archive.getinfo(png).compress_type, zipfile.ZIP_STORED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""Unit tests for the page content caches and their use by ConfluenceSession."""
+
+import os
+import tempfile
+import time
+import unittest
+
+from stub_confluence import StubState, serve
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import BoundedLruCache, PageContentCache
+
+URL = "https://wiki"
+
+
+class TestBoundedLruCache(unittest.TestCase):
+    """Test suite for the size-bounded LRU."""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entries go first once the size is exceeded"""
+        cache = BoundedLruCache(10)
+        cache.put("a", "aaaa", 4)
+        cache.put("b", "bbbb", 4)
+        self.assertEqual(cache.get("a"), "aaaa")
+        cache.put("c", "cccc", 4)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ("aaaa", "cccc"))
+        self.assertEqual((cache.size, len(cache)), (8, 2))
+
+    def test_replace_and_oversized(self):
+        """Test that replacing a key keeps the size right and oversized values are not stored"""
+        cache = BoundedLruCache(10)
+        cache.put("a", "x" * 6, 6)
+        cache.put("a", "x" * 2, 2)
+        self.assertEqual(cache.size, 2)
+        cache.put("big", "x" * 11, 11)
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        cache.clear()
+        self.assertEqual((cache.size, len(cache)), (0, 0))
+
+
+class TestPageContentCache(unittest.TestCase):
+    """Test suite for the two-tier page content cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_entries_are_per_version(self):
+        """Test that a body is only served for the version it was stored under"""
+        cache = PageContentCache()
+        cache.put(URL, "1", 3, "Home", "<p>v3</p>")
+        self.assertEqual(cache.get(URL, "1", 3), {"title": "Home", "body": "<p>v3</p>"})
+        self.assertIsNone(cache.get(URL, "1", 4))
+        self.assertIsNone(cache.get("https://other", "1", 3))
+        self.assertEqual(cache.known_version(URL, "1"), 3)
+        self.assertIsNone(cache.known_version(URL, "2"))
+
+    def test_memory_tier_is_bounded(self):
+        """Test that the memory tier evicts by total body size"""
+        cache = PageContentCache(memory_max_size=10)
+        cache.put(URL, "1", 1, "A", "x" * 6)
+        cache.put(URL, "2", 1, "B", "y" * 6)
+        self.assertIsNone(cache.get(URL, "1", 1))
+        self.assertIsNotNone(cache.get(URL, "2", 1))
+        self.assertEqual(cache.stats()["memory_size"], 6)
+
+    def test_disk_tier_survives_memory_eviction_and_restart(self):
+        """Test that the disk tier serves pages evicted from memory and pages of a previous process"""
+        cache = PageContentCache(memory_max_size=10, disk_dir=self.tmp.name)
+        cache.put(URL, "1", 1, "A", "x" * 6)
+        cache.put(URL, "2", 1, "B", "y" * 6)
+        self.assertEqual(cache.get(URL, "1", 1)["body"], "x" * 6)
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        restarted = PageContentCache(disk_dir=self.tmp.name)
+        self.assertEqual(restarted.get(URL, "2", 1)["title"], "B")
+        self.assertGreater(restarted.stats()["disk_bytes"], 0)
+
+    def test_version_index_rebuilt_from_disk(self):
+        """Test that a fresh cache over an existing directory knows the stored versions"""
+        PageContentCache(disk_dir=self.tmp.name).put(URL, "1", 4, "A", "<p>v4</p>")
+        restarted = PageContentCache(disk_dir=self.tmp.name)
+        self.assertEqual(restarted.known_version(URL, "1"), 4)
+        self.assertEqual(restarted.get(URL, "1", 4), {"title": "A", "body": "<p>v4</p>"})
+        self.assertIsNone(restarted.known_version(URL, "2"))
+        # 新版本覆盖同一页面的旧文件
+        restarted.put(URL, "1", 5, "A", "<p>v5</p>")
+        self.assertIsNone(PageContentCache(disk_dir=self.tmp.name).get(URL, "1", 4))
+        self.assertEqual(len([name for name in os.listdir(self.tmp.name) if name.endswith(".json")]), 1)
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        """Test that the disk tier removes the oldest files once over its size"""
+        cache = PageContentCache(memory_max_size=1, disk_dir=self.tmp.name, disk_max_bytes=200)
+        for page_id in ("1", "2"):
+            cache.put(URL, page_id, 1, "T", "z" * 40)
+            time.sleep(0.02)
+        # 读取页面 1 会更新其访问时间，写入页面 3 时淘汰页面 2
+        self.assertIsNotNone(cache.get(URL, "1", 1))
+        time.sleep(0.02)
+        cache.put(URL, "3", 1, "T", "z" * 40)
+        self.assertIsNone(cache.get(URL, "2", 1))
+        self.assertIsNotNone(cache.get(URL, "1", 1))
+        self.assertLessEqual(cache.stats()["disk_bytes"], 200)
+        self.assertEqual(len([name for name in os.listdir(self.tmp.name) if name.endswith(".json")]), 2)
+
+
+class TestSessionContentCache(unittest.TestCase):
+    """Test suite for version probing around the content cache."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.state.add_page("1", "Home", "<p>v1</p>", version=1)
+        credential_cache = CredentialValidationCache()
+        credential_cache.mark_valid(self.base_url, "user", "secret")
+        self.cache = PageContentCache()
+        self.session = ConfluenceSession(self.base_url, "user", "secret", credential_cache=credential_cache,
+                                         content_cache=self.cache)
+        self.state.calls.clear()
+
+    def content_calls(self):
+        return [call for call in self.state.calls if call.startswith("/rest/api/content/1")]
+
+    def test_unseen_page_fetched_without_probe(self):
+        """Test that a page absent from the cache costs one request that seeds the cache"""
+        result = self.session.get_page_content("1")
+        self.assertEqual((result["results"], result["version"], result["from_cache"]), ("<p>v1</p>", 1, False))
+        self.assertEqual(len(self.content_calls()), 1)
+        self.assertIn("body.storage", self.content_calls()[0])
+        self.assertEqual(self.cache.known_version(self.base_url, "1"), 1)
+
+    def test_cached_page_probed_and_invalidated_by_version(self):
+        """Test that a cached page is probed, served while unchanged and refetched once changed"""
+        self.session.get_page_content("1")
+        self.assertTrue(self.session.get_page_content("1")["from_cache"])
+        self.state.add_page("1", "Home", "<p>v2</p>", version=2)
+        result = self.session.get_page_content("1")
+        self.assertEqual((result["results"], result["version"], result["from_cache"]), ("<p>v2</p>", 2, False))
+        # 首次直接获取，之后每次先探测版本：1 + 1 + 2
+        self.assertEqual(len(self.content_calls()), 4)
+
+    def test_disk_tier_used_after_restart(self):
+        """Test that a session over a fresh cache on an existing directory probes and hits the disk tier"""
+        with tempfile.TemporaryDirectory() as tmp:
+            self.session.content_cache = PageContentCache(disk_dir=tmp)
+            self.session.get_page_content("1")
+            self.session.content_cache = PageContentCache(disk_dir=tmp)
+            self.state.calls.clear()
+            result = self.session.get_page_content("1")
+        self.assertTrue(result["from_cache"])
+        self.assertEqual(result["results"], "<p>v1</p>")
+        # 只发出一次版本探测，不再下载页面内容
+        self.assertEqual(len(self.content_calls()), 1)
+        self.assertNotIn("body.storage", self.content_calls()[0])
+
+    def test_stream_reads_metadata_ahead_of_body(self):
+        """Test that an unprobed stream gets title and version from the response and seeds the cache"""
+        result = self.session.stream_page_content("1", chunk_size=4)
+        self.assertEqual((result["title"], result["version"]), ("Home", 1))
+        self.assertEqual("".join(result["chunks"]), "<p>v1</p>")
+        self.assertEqual(len(self.content_calls()), 1)
+        cached = self.session.stream_page_content("1")
+        self.assertTrue(cached["from_cache"])
+        self.assertEqual("".join(cached["chunks"]), "<p>v1</p>")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+"""Unit tests for page id parsing, concurrent page conversion and the render cache."""
+
+import unittest
+from unittest.mock import patch
+
+from stub_confluence import StubState, serve
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import BoundedLruCache, PageContentCache
+from unit.page_markdown import (MAX_WORKERS_LIMIT, fetch_page_chunks, fetch_page_markdown, iter_pages_markdown,
+                                parse_page_ids, render_cache_key)
+
+PAGE_COUNT = 12
+LATENCY = 0.05
+
+
+class TestParsePageIds(unittest.TestCase):
+    """Test suite for parse_page_ids."""
+
+    def test_separated_string(self):
+        """Test comma, full-width comma and whitespace separated ids"""
+        self.assertEqual(parse_page_ids("1, 2，3\n4  5"), ["1", "2", "3", "4", "5"])
+
+    def test_json_array(self):
+        """Test a JSON array of numbers and strings"""
+        self.assertEqual(parse_page_ids('[1, "2", 3.0]'), ["1", "2", "3"])
+        self.assertEqual(parse_page_ids("42"), ["42"])
+
+    def test_native_values(self):
+        """Test lists and numbers passed without serialization"""
+        self.assertEqual(parse_page_ids([1, "2", 3.0]), ["1", "2", "3"])
+        self.assertEqual(parse_page_ids(7), ["7"])
+
+    def test_duplicates_and_empty(self):
+        """Test that duplicates are dropped in order and empty input gives no ids"""
+        self.assertEqual(parse_page_ids("3,1,3, ,1,2"), ["3", "1", "2"])
+        self.assertEqual(parse_page_ids(None), [])
+        self.assertEqual(parse_page_ids(""), [])
+        self.assertEqual(parse_page_ids("[]"), [])
+
+
+class TestIterPagesMarkdown(unittest.TestCase):
+    """Test suite for iter_pages_markdown against the stub server."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState(latency=LATENCY))
+        for i in range(PAGE_COUNT):
+            cls.state.add_page(str(100 + i), f"Page {i}", f"<h1>Page {i}</h1><p>body {i}</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        credential_cache = CredentialValidationCache()
+        credential_cache.mark_valid(self.base_url, "user", "secret")
+        self.session = ConfluenceSession(self.base_url, "user", "secret", credential_cache=credential_cache,
+                                         content_cache=PageContentCache())
+        with self.state.lock:
+            self.state.max_in_flight = 0
+
+    def test_converts_every_page(self):
+        """Test that every page is yielded once with its Markdown"""
+        page_ids = [str(100 + i) for i in range(PAGE_COUNT)]
+        results = dict(iter_pages_markdown(self.session, page_ids, max_workers=4))
+        self.assertEqual(sorted(results), page_ids)
+        for i, page_id in enumerate(page_ids):
+            self.assertTrue(results[page_id]["success"])
+            self.assertEqual(results[page_id]["title"], f"Page {i}")
+            self.assertIn(f"body {i}", results[page_id]["markdown"])
+
+    def test_failures_are_per_page(self):
+        """Test that a missing or unreadable page fails alone"""
+        self.state.unreadable.add("101")
+        try:
+            results = dict(iter_pages_markdown(self.session, ["100", "101", "999"], max_workers=2))
+        finally:
+            self.state.unreadable.clear()
+        self.assertTrue(results["100"]["success"])
+        self.assertFalse(results["101"]["success"])
+        self.assertFalse(results["999"]["success"])
+        self.assertIn("message", results["999"])
+
+    def test_workers_bound_concurrency(self):
+        """Test that no more than max_workers requests are in flight"""
+        page_ids = [str(100 + i) for i in range(PAGE_COUNT)]
+        list(iter_pages_markdown(self.session, page_ids, max_workers=3))
+        self.assertGreater(self.state.max_in_flight, 1)
+        self.assertLessEqual(self.state.max_in_flight, 3)
+
+    def test_workers_clamped(self):
+        """Test that out-of-range max_workers values are clamped"""
+        results = list(iter_pages_markdown(self.session, ["100", "101"], max_workers=0))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.state.max_in_flight, 1)
+        list(iter_pages_markdown(self.session, [str(100 + i) for i in range(PAGE_COUNT)],
+                                 max_workers=MAX_WORKERS_LIMIT * 10))
+        self.assertLessEqual(self.state.max_in_flight, MAX_WORKERS_LIMIT)
+
+
+class TestRenderCache(unittest.TestCase):
+    """Test suite for the Markdown render cache and its invalidation."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.state.add_page("1", "Home", "<h1>Home</h1><p>v1</p>", version=1)
+        credential_cache = CredentialValidationCache()
+        credential_cache.mark_valid(self.base_url, "user", "secret")
+        self.session = ConfluenceSession(self.base_url, "user", "secret", credential_cache=credential_cache,
+                                         content_cache=PageContentCache(memory_max_size=0))
+        self.cache = BoundedLruCache(1024 * 1024)
+        self.state.calls.clear()
+
+    def body_calls(self):
+        return [call for call in self.state.calls if "body.storage" in call]
+
+    def test_hit_skips_download(self):
+        """Test that an unchanged page is served from the render cache after the version probe"""
+        first = fetch_page_markdown(self.session, "1", cache=self.cache)
+        second = fetch_page_markdown(self.session, "1", cache=self.cache)
+        self.assertEqual((first["from_cache"], second["from_cache"]), (False, True))
+        self.assertEqual(first["markdown"], second["markdown"])
+        self.assertEqual(len(self.body_calls()), 1)
+
+    def test_cold_page_single_request(self):
+        """Test that a page never rendered is fetched without a separate version probe"""
+        result = fetch_page_markdown(self.session, "1", cache=self.cache)
+        self.assertTrue(result["success"])
+        self.assertEqual(len(self.state.calls), 1)
+        self.assertEqual(len(self.body_calls()), 1)
+
+    def test_listing_version_skips_probe(self):
+        """Test that a version passed from a listing serves a rendered page without any request"""
+        fetch_page_markdown(self.session, "1", cache=self.cache)
+        self.state.calls.clear()
+        result = fetch_page_markdown(self.session, "1", cache=self.cache, version=1, title="Home")
+        self.assertTrue(result["from_cache"])
+        self.assertEqual(result["title"], "Home")
+        self.assertEqual(self.state.calls, [])
+        chunks = fetch_page_chunks(self.session, "1", cache=self.cache, version=2, title="Home")
+        self.assertFalse(chunks["from_cache"])
+
+    def test_new_version_rerendered(self):
+        """Test that a new page version misses the render cache"""
+        fetch_page_markdown(self.session, "1", cache=self.cache)
+        self.state.add_page("1", "Home", "<h1>Home</h1><p>v2</p>", version=2)
+        result = fetch_page_markdown(self.session, "1", cache=self.cache)
+        self.assertFalse(result["from_cache"])
+        self.assertIn("v2", result["markdown"])
+
+    def test_options_are_part_of_key(self):
+        """Test that other conversion options are rendered separately"""
+        fetch_page_markdown(self.session, "1", cache=self.cache)
+        marked = fetch_page_markdown(self.session, "1", add_level_mark=True, cache=self.cache)
+        self.assertFalse(marked["from_cache"])
+        self.assertTrue(fetch_page_chunks(self.session, "1", cache=self.cache)["success"])
+        self.assertTrue(fetch_page_chunks(self.session, "1", cache=self.cache)["from_cache"])
+        self.assertFalse(fetch_page_chunks(self.session, "1", max_size=50, cache=self.cache)["from_cache"])
+
+    def test_parser_version_invalidates(self):
+        """Test that bumping PARSER_VERSION discards Markdown rendered by the old parser"""
+        key = render_cache_key(self.session, "1", 1, False, "L_")
+        fetch_page_markdown(self.session, "1", cache=self.cache)
+        with patch('unit.page_markdown.PARSER_VERSION', 10 ** 6):
+            self.assertNotEqual(render_cache_key(self.session, "1", 1, False, "L_"), key)
+            self.assertFalse(fetch_page_markdown(self.session, "1", cache=self.cache)["from_cache"])
+            self.assertTrue(fetch_page_markdown(self.session, "1", cache=self.cache)["from_cache"])
+        self.assertTrue(fetch_page_markdown(self.session, "1", cache=self.cache)["from_cache"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Tests for CQL search pagination, prefetching and conversion of the top hits."""
+
+import time
+import unittest
+
+from stub_confluence import StubState, serve
+from unit.confluence_retry import CircuitBreakerRegistry, RetryPolicy
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache
+from unit.page_search import CqlSearch, SearchError, search_and_convert
+
+
+class TestCqlSearch(unittest.TestCase):
+    """Test suite for CqlSearch and search_and_convert against the stub server."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        for i in range(60):
+            cls.state.add_page(str(1000 + i), f"Doc {i}", f"<h1>Doc {i}</h1><p>body {i}</p>")
+        cls.state.add_page("2000", "Other", "<p>other</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.state.calls.clear()
+        self.state.latency = 0
+        self.session = ConfluenceSession(self.base_url, "user", "secret",
+                                         credential_cache=CredentialValidationCache(),
+                                         content_cache=PageContentCache(), breakers=CircuitBreakerRegistry(),
+                                         retry=RetryPolicy(max_attempts=1))
+
+    def search_calls(self):
+        return [call for call in self.state.calls if "/content/search" in call]
+
+    def test_search_shape(self):
+        """Test that the sync search returns results and the next link"""
+        page = self.session.search('title ~ "Doc"', limit=10)
+        self.assertTrue(page["success"])
+        self.assertEqual(len(page["results"]), 10)
+        self.assertIn("start=10", page["next"])
+        self.assertEqual(self.session.search('title ~ "Doc"', next_url=page["next"])["results"][0]["title"],
+                         "Doc 10")
+
+    def test_pages_through_all_results(self):
+        """Test that every result is yielded once, following next links"""
+        search = CqlSearch(self.session, 'title ~ "Doc"', page_size=10)
+        hits = list(search)
+        self.assertEqual([hit["title"] for hit in hits], [f"Doc {i}" for i in range(60)])
+        self.assertEqual(search.pages, 6)
+        self.assertFalse(search.truncated)
+        self.assertEqual(hits[0]["space"], "DEV")
+        self.assertEqual(hits[0]["excerpt"], "Doc Doc 0")
+        self.assertTrue(hits[0]["url"].endswith("pageId=1000"))
+
+    def test_budget_stops_paging(self):
+        """Test that paging stops at the result budget without requesting further pages"""
+        search = CqlSearch(self.session, 'title ~ "Doc"', page_size=10, max_results=15)
+        self.assertEqual(len(list(search)), 15)
+        self.assertTrue(search.truncated)
+        self.assertEqual(len(self.search_calls()), 2)
+
+        small = CqlSearch(self.session, 'title ~ "Doc"', page_size=25, max_results=5)
+        self.assertEqual(len(list(small)), 5)
+        self.assertIn("limit=5", self.search_calls()[-1])
+
+    def test_next_page_is_prefetched(self):
+        """Test that the next page is requested while the current page is consumed"""
+        self.state.latency = 0.05
+        hits = iter(CqlSearch(self.session, 'title ~ "Doc"', page_size=10))
+        next(hits)
+        deadline = time.monotonic() + 2
+        while len(self.search_calls()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.search_calls()), 2)
+        hits.close()
+
+    def test_search_error(self):
+        """Test that a failing search page raises SearchError"""
+        self.state.failures = [(500, {})]
+        with self.assertRaises(SearchError):
+            list(CqlSearch(self.session, 'title ~ "Doc"'))
+
+    def test_convert_top_hits(self):
+        """Test that the top hits are converted concurrently and reported once each"""
+        events = list(search_and_convert(self.session, 'title ~ "Doc"', page_size=10, max_results=20,
+                                         convert_top=5, max_workers=3))
+        hits = [event for event in events if event["event"] == "hit"]
+        pages = [event for event in events if event["event"] == "page"]
+        self.assertEqual(len(hits), 20)
+        self.assertEqual(sorted(event["hit"]["title"] for event in pages), [f"Doc {i}" for i in range(5)])
+        self.assertTrue(all(event["result"]["success"] for event in pages))
+        self.assertIn("# Doc 0", next(e for e in pages if e["hit"]["id"] == "1000")["result"]["markdown"])
+        self.assertEqual(events[-1], {"event": "done", "total": 20, "converted": 5, "truncated": True})
+
+    def test_early_exit(self):
+        """Test that closing the stream early stops paging"""
+        events = search_and_convert(self.session, 'title ~ "Doc"', page_size=10, convert_top=2)
+        for event in events:
+            if event["event"] == "hit" and event["hit"]["title"] == "Doc 3":
+                break
+        events.close()
+        time.sleep(0.05)
+        self.assertLessEqual(len(self.search_calls()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
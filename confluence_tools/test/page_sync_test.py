@@ -0,0 +1,204 @@
+"""Tests for the incremental page sync and its persisted checkpoints."""
+
+import unittest
+from unittest.mock import Mock
+
+from stub_confluence import StubState, serve
+from unit.confluence_retry import CircuitBreakerRegistry, RetryPolicy
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache
+from unit.page_sync import (CheckpointError, PageSync, checkpoint_key, cql_time, load_checkpoint,
+                            save_checkpoint)
+
+
+class MemoryStorage:
+    """Plugin storage stand-in; ``get`` raises for missing keys like the real one."""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def get(self, key):
+        if key not in self.data:
+            raise KeyError(key)
+        return self.data[key]
+
+
+class TestPageSync(unittest.TestCase):
+    """Test suite for PageSync against the stub server."""
+
+    def setUp(self):
+        self.server, self.state, self.base_url = serve(StubState())
+        for i in range(10):
+            self.state.add_page(str(100 + i), f"Page {i}", f"<h1>Page {i}</h1>",
+                                modified=f"2024-01-01T10:{i:02d}:00.000+08:00")
+        self.session = ConfluenceSession(self.base_url, "user", "secret",
+                                         credential_cache=CredentialValidationCache(),
+                                         content_cache=PageContentCache(), breakers=CircuitBreakerRegistry(),
+                                         retry=RetryPolicy(max_attempts=1))
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def run_sync(self, checkpoint=None, **kwargs):
+        sync = PageSync(self.session, "space = DEV ORDER BY title", checkpoint, **kwargs)
+        events = list(sync.run())
+        return sync, events
+
+    def content_calls(self):
+        return [call for call in self.state.calls if "/content/search" not in call and "/user/" not in call]
+
+    def test_first_run_returns_everything(self):
+        """Test that a run without checkpoint converts every page and records their versions"""
+        sync, events = self.run_sync()
+        self.assertEqual(len(events), 10)
+        self.assertTrue(all(event["change"] == "created" and event["result"]["success"] for event in events))
+        self.assertEqual(sync.checkpoint["pages"]["100"], 1)
+        self.assertEqual(sync.checkpoint["watermark"], "2024-01-01T10:09:00.000+08:00")
+        self.assertNotIn("lastmodified >=", sync.changes_cql())
+
+    def test_unchanged_space_converts_nothing(self):
+        """Test that a second run over an unchanged space fetches no page bodies"""
+        first, _ = self.run_sync()
+        self.state.calls.clear()
+        sync, events = self.run_sync(first.checkpoint)
+        self.assertEqual(events, [])
+        self.assertEqual(self.content_calls(), [])
+        self.assertIn('lastmodified >= "2024-01-01 09:39"', sync.changes_cql())
+
+    def test_created_updated_deleted(self):
+        """Test that only the changes since the previous run are returned"""
+        first, _ = self.run_sync(detect_deletes=True)
+        self.state.add_page("103", "Page 3", "<h1>Page 3 v2</h1>", version=2,
+                            modified="2024-01-02T09:00:00.000+08:00")
+        self.state.add_page("200", "New", "<p>new</p>", modified="2024-01-02T09:05:00.000+08:00")
+        self.state.remove_page("105")
+        self.state.calls.clear()
+        sync, events = self.run_sync(first.checkpoint, detect_deletes=True)
+        changes = sorted((event["change"], event["page_id"]) for event in events)
+        self.assertEqual(changes, [("created", "200"), ("deleted", "105"), ("updated", "103")])
+        updated = next(event for event in events if event["page_id"] == "103")
+        self.assertIn("Page 3 v2", updated["result"]["markdown"])
+        self.assertEqual(next(event for event in events if event["page_id"] == "105")["title"], "Page 5")
+        self.assertEqual(sync.checkpoint["pages"]["103"], 2)
+        self.assertNotIn("105", sync.checkpoint["pages"])
+        self.assertEqual(sync.checkpoint["watermark"], "2024-01-02T09:05:00.000+08:00")
+        # 只获取变更页面的内容
+        touched = {call.split("?")[0].rsplit("/", 1)[-1] for call in self.content_calls()}
+        self.assertEqual(touched, {"103", "200"})
+
+    def test_deletes_are_opt_in(self):
+        """Test that the scope is only listed when delete detection is requested"""
+        first, _ = self.run_sync()
+        self.state.remove_page("105")
+        self.state.calls.clear()
+        sync, events = self.run_sync(first.checkpoint)
+        self.assertEqual(events, [])
+        self.assertEqual(len([call for call in self.state.calls if "/content/search" in call]), 1)
+        self.assertIn("105", sync.checkpoint["pages"])
+        # 不检测删除时检查点不保存标题
+        self.assertNotIn("titles", first.checkpoint)
+        self.assertNotIn("titles", sync.checkpoint)
+
+    def test_failed_delete_detection_keeps_changes(self):
+        """Test that a failing scope listing still yields a checkpoint with the returned changes"""
+        first, _ = self.run_sync()
+        self.state.add_page("103", "Page 3", "<h1>Page 3 v2</h1>", version=2,
+                            modified="2024-01-02T09:00:00.000+08:00")
+        self.state.remove_page("105")
+        sync = PageSync(self.session, "space = DEV", first.checkpoint, detect_deletes=True)
+        events = []
+        for event in sync.run():
+            events.append(event)
+            # 变更返回后，列出范围的请求失败
+            self.state.failures.append((500, {}))
+        self.assertEqual([(event["change"], event["page_id"]) for event in events], [("updated", "103")])
+        self.assertIn("500", sync.delete_error)
+        self.assertEqual(sync.checkpoint["pages"]["103"], 2)
+        self.assertIn("105", sync.checkpoint["pages"])
+
+        again, events = self.run_sync(sync.checkpoint, detect_deletes=True)
+        self.assertEqual([(event["change"], event["page_id"]) for event in events], [("deleted", "105")])
+        self.assertIsNone(again.delete_error)
+
+    def test_budget_continues_next_run(self):
+        """Test that changes beyond max_pages are returned by the following run"""
+        first, _ = self.run_sync(max_pages=4)
+        self.assertTrue(first.truncated)
+        self.assertEqual(len(first.checkpoint["pages"]), 4)
+        second, events = self.run_sync(first.checkpoint, max_pages=4)
+        third, more = self.run_sync(second.checkpoint, max_pages=4)
+        returned = [event["page_id"] for event in events + more]
+        self.assertEqual(sorted(returned), [str(100 + i) for i in range(4, 10)])
+        self.assertFalse(third.truncated)
+
+    def test_failed_pages_are_retried(self):
+        """Test that a page failing to convert is kept in the checkpoint and retried by the next run"""
+        first, _ = self.run_sync()
+        self.state.add_page("104", "Page 4", "<h1>Page 4 v2</h1>", version=2,
+                            modified="2024-01-03T09:00:00.000+08:00")
+        self.state.unreadable.add("104")
+        second, events = self.run_sync(first.checkpoint)
+        self.assertEqual([(event["change"], event["result"]["success"]) for event in events], [("updated", False)])
+        self.assertEqual(second.checkpoint["failed"], ["104"])
+        self.assertEqual(second.checkpoint["pages"]["104"], 1)
+
+        self.state.unreadable.clear()
+        third, events = self.run_sync(second.checkpoint)
+        self.assertEqual([(event["change"], event["page_id"]) for event in events], [("updated", "104")])
+        self.assertEqual(third.checkpoint["failed"], [])
+        self.assertEqual(third.checkpoint["pages"]["104"], 2)
+
+    def test_cql_time_overlap(self):
+        """Test that the CQL literal keeps the server offset and subtracts the overlap"""
+        self.assertEqual(cql_time("2024-05-01T00:10:00.000+02:00", 30), "2024-04-30 23:40")
+
+
+class TestCheckpointStorage(unittest.TestCase):
+    """Test suite for checkpoint persistence."""
+
+    def test_round_trip(self):
+        """Test that checkpoints survive storage and missing or corrupt ones read as None"""
+        storage = MemoryStorage()
+        key = checkpoint_key("https://wiki/", "user", "space = DEV")
+        self.assertIsNone(load_checkpoint(storage, key))
+        checkpoint = {"format": 1, "watermark": "2024-01-01T00:00:00.000+08:00", "pages": {"1": 3},
+                      "titles": {"1": "页面"}, "failed": []}
+        save_checkpoint(storage, key, checkpoint)
+        self.assertEqual(load_checkpoint(storage, key), checkpoint)
+        storage.set(key, b"garbage")
+        self.assertIsNone(load_checkpoint(storage, key))
+
+    def test_scope_too_large(self):
+        """Test that a checkpoint over the storage size is rejected and the previous one kept"""
+        storage = MemoryStorage()
+        key = checkpoint_key("https://wiki", "user", "space = DEV")
+        save_checkpoint(storage, key, {"format": 1, "watermark": "", "pages": {"1": 1}, "failed": []})
+        # 随机化的页面 ID 几乎无法压缩
+        pages = {str(1000003 * i % 9999991): i for i in range(20000)}
+        with self.assertRaises(CheckpointError):
+            save_checkpoint(storage, key, {"format": 1, "watermark": "", "pages": pages, "failed": []},
+                            max_bytes=64 * 1024)
+        self.assertEqual(load_checkpoint(storage, key)["pages"], {"1": 1})
+
+    def test_storage_failure(self):
+        """Test that a storage error is raised as CheckpointError"""
+        storage = Mock()
+        storage.set.side_effect = RuntimeError("storage size exceeded")
+        with self.assertRaises(CheckpointError) as context:
+            save_checkpoint(storage, "key", {"format": 1, "pages": {}, "failed": []})
+        self.assertIn("storage size exceeded", str(context.exception))
+
+    def test_key_scoping(self):
+        """Test that keys differ per site, user, scope and sync name"""
+        keys = {checkpoint_key("https://a", "u", "space = A"), checkpoint_key("https://b", "u", "space = A"),
+                checkpoint_key("https://a", "v", "space = A"), checkpoint_key("https://a", "u", "space = B"),
+                checkpoint_key("https://a", "u", "space = A", "nightly")}
+        self.assertEqual(len(keys), 5)
+        self.assertEqual(checkpoint_key("https://a/", "u", "space = A "), checkpoint_key("https://a", "u", "space = A"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Unit tests for the page tree crawler and its Markdown archive."""
+
+import io
+import unittest
+import zipfile
+
+from stub_confluence import StubState, serve
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache, render_cache
+from unit.page_tree import PageTreeCrawler, build_markdown_archive, safe_filename
+
+
+class TestSafeFilename(unittest.TestCase):
+    """Test suite for safe_filename."""
+
+    def test_unsafe_characters_replaced(self):
+        """Test that path separators and reserved characters are replaced"""
+        self.assertEqual(safe_filename('a/b\\c:d*e?"f<g>h|i', "1"), "a_b_c_d_e_f_g_h_i")
+
+    def test_fallback_and_length(self):
+        """Test the fallback for empty names and the length cap"""
+        self.assertEqual(safe_filename(" .. ", "42"), "42")
+        self.assertEqual(len(safe_filename("x" * 300, "1")), 120)
+
+
+class TestPageTreeCrawler(unittest.TestCase):
+    """Test suite for PageTreeCrawler against the stub server.
+
+    Tree used by the tests::
+
+        1 Root
+        ├── 10 Alpha
+        │   ├── 100 Leaf
+        │   │   └── 1000 Deep
+        │   └── 101 Other
+        ├── 11 Beta
+        └── 12 Alpha
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState(latency=0.01))
+        pages = [("1", "Root", None), ("10", "Alpha", "1"), ("11", "Beta", "1"), ("12", "Alpha", "1"),
+                 ("100", "Leaf", "10"), ("101", "Other", "10"), ("1000", "Deep", "100")]
+        for page_id, title, parent_id in pages:
+            cls.state.add_page(page_id, title, f"<p>{title} {page_id}</p>", parent_id=parent_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def crawler(self, **kwargs) -> PageTreeCrawler:
+        # 子页面列表带有版本号，已渲染的页面不再发请求，每个用例从空的渲染缓存开始
+        render_cache.clear()
+        credential_cache = CredentialValidationCache()
+        credential_cache.mark_valid(self.base_url, "user", "secret")
+        session = ConfluenceSession(self.base_url, "user", "secret", credential_cache=credential_cache,
+                                    content_cache=PageContentCache())
+        return PageTreeCrawler(session, **kwargs)
+
+    def test_full_tree(self):
+        """Test that every page is exported with its depth and hierarchical path"""
+        pages = {page["id"]: page for page in self.crawler(max_depth=5).crawl("1")}
+        self.assertEqual(sorted(pages), ["1", "10", "100", "1000", "101", "11", "12"])
+        self.assertTrue(all(page["success"] for page in pages.values()))
+        self.assertEqual(pages["1"]["path"], "Root")
+        self.assertEqual(pages["11"]["path"], "Root/Beta")
+        self.assertEqual(pages["1000"]["depth"], 3)
+        self.assertEqual(pages["1000"]["path"], pages["10"]["path"] + "/Leaf/Deep")
+        self.assertIn("Deep 1000", pages["1000"]["markdown"])
+
+    def test_sibling_names_made_unique(self):
+        """Test that siblings with the same title get distinct paths"""
+        pages = {page["id"]: page for page in self.crawler(max_depth=1).crawl("1")}
+        # 先完成的页面使用原名，另一个追加页面 ID
+        first, second = sorted([pages["10"]["path"], pages["12"]["path"]])
+        self.assertEqual(first, "Root/Alpha")
+        self.assertIn(second, ("Root/Alpha_10", "Root/Alpha_12"))
+
+    def test_max_depth(self):
+        """Test that pages below max_depth are not exported"""
+        pages = self.crawler(max_depth=1).crawl("1")
+        self.assertEqual(sorted(page["id"] for page in pages), ["1", "10", "11", "12"])
+        self.assertEqual([page["id"] for page in self.crawler(max_depth=0).crawl("1")], ["1"])
+
+    def test_max_pages_truncates(self):
+        """Test that max_pages caps the export and marks the parent as truncated"""
+        pages = {page["id"]: page for page in self.crawler(max_depth=5, max_pages=3).crawl("1")}
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(pages["1"]["truncated"])
+
+    def test_unreadable_page_fails_alone(self):
+        """Test that an unreadable page is reported and its subtree skipped"""
+        self.state.unreadable.add("10")
+        try:
+            pages = {page["id"]: page for page in self.crawler(max_depth=5).crawl("1")}
+        finally:
+            self.state.unreadable.clear()
+        self.assertEqual(sorted(pages), ["1", "10", "11", "12"])
+        self.assertFalse(pages["10"]["success"])
+        self.assertIn("message", pages["10"])
+
+
+class TestBuildMarkdownArchive(unittest.TestCase):
+    """Test suite for build_markdown_archive."""
+
+    def test_layout_and_failures(self):
+        """Test that converted pages are stored by path and failed pages are left out"""
+        pages = [
+            {"id": "2", "depth": 1, "path": "Root/Child", "success": True, "markdown": "child"},
+            {"id": "1", "depth": 0, "path": "Root", "success": True, "markdown": "root"},
+            {"id": "3", "depth": 1, "path": "Root/Broken", "success": False, "message": "404"},
+        ]
+        with zipfile.ZipFile(io.BytesIO(build_markdown_archive(pages))) as archive:
+            self.assertEqual(archive.namelist(), ["Root.md", "Root/Child.md"])
+            self.assertEqual(archive.read("Root/Child.md").decode("utf-8"), "child")
+
+
+if __name__ == '__main__':
+    unittest.main()
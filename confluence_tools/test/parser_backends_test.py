@@ -0,0 +1,139 @@
+"""Equivalence tests for the storage-format parser backends."""
+
+import glob
+import os
+import random
+import unittest
+from unittest import mock
+
+from synthetic_pages import SCENARIOS
+from unit.markdown_chunker import MarkdownChunker
+from unit.parser_backends import create_parser, lxml_available, resolve_backend
+from unit.table_grid import TABLE_FORMATS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+
+def golden_pages():
+    """(name, storage, expected Markdown) for every document in the golden corpus."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(GOLDEN_DIR, "*.xml"))):
+        with open(path, encoding="utf-8") as f:
+            storage = f.read()
+        with open(path[:-len(".xml")] + ".md", encoding="utf-8") as f:
+            expected = f.read()
+        pages.append((os.path.basename(path), storage, expected))
+    return pages
+
+
+def convert(html: str, backend: str, pieces: int = 1, **kwargs) -> str:
+    """Convert ``html`` fed in ``pieces`` random slices, joining the streamed output."""
+    parser = create_parser(backend=backend, **kwargs)
+    rng = random.Random(pieces)
+    cuts = sorted(rng.sample(range(1, len(html)), pieces - 1)) if pieces > 1 else []
+    parts = []
+    for start, end in zip([0] + cuts, cuts + [len(html)]):
+        parser.feed(html[start:end])
+        parts.append(parser.drain_markdown())
+    parts.append(parser.drain_markdown(final=True))
+    return "".join(parts)
+
+
+class TestPythonBackend(unittest.TestCase):
+    """The pure-Python backend against the golden corpus."""
+
+    def test_golden_corpus(self):
+        """Test that every golden document converts to its recorded Markdown"""
+        for name, storage, expected in golden_pages():
+            with self.subTest(page=name):
+                self.assertEqual(convert(storage, "python", add_level_mark=True), expected)
+
+    def test_entities_are_decoded(self):
+        """Test that named and numeric references are decoded and unknown entities are dropped"""
+        markdown = convert("<p>a &amp; b &copy; &#x263A; &#8364; &unknown; c</p>", "python")
+        self.assertEqual(markdown.strip(), "a & b © ☺ €  c")
+
+    def test_backend_resolution(self):
+        """Test explicit, environment and invalid backend names"""
+        self.assertEqual(resolve_backend("python"), "python")
+        with mock.patch.dict(os.environ, {"CONFLUENCE_PARSER_BACKEND": "python"}):
+            self.assertEqual(resolve_backend(), "python")
+        self.assertEqual(resolve_backend("auto"), "python")
+        with self.assertRaises(ValueError):
+            resolve_backend("html5lib")
+
+
+@unittest.skipUnless(lxml_available(), "lxml is not installed")
+class TestLxmlBackend(unittest.TestCase):
+    """The lxml backend must produce the same output as the pure-Python backend."""
+
+    def test_golden_corpus(self):
+        """Test that every golden document converts to its recorded Markdown"""
+        for name, storage, expected in golden_pages():
+            for pieces in (1, 7, 50):
+                with self.subTest(page=name, pieces=pieces):
+                    self.assertEqual(convert(storage, "lxml", pieces, add_level_mark=True), expected)
+
+    def test_synthetic_scenarios(self):
+        """Test identical output on the benchmark pages in every table format"""
+        for name, build in SCENARIOS.items():
+            html = build(0.05)
+            for table_format in TABLE_FORMATS:
+                with self.subTest(scenario=name, table_format=table_format):
+                    self.assertEqual(convert(html, "lxml", 5, table_format=table_format),
+                                     convert(html, "python", table_format=table_format))
+
+    def test_malformed_input_matches_python(self):
+        """Test that markup libxml2 rejects is replayed through the pure-Python parser"""
+        def whole(html: str, backend: str, pieces: int = 1) -> str:
+            parser = create_parser(backend=backend)
+            step = max(1, len(html) // pieces)
+            for start in range(0, len(html), step):
+                parser.feed(html[start:start + step])
+            return parser.get_markdown()
+
+        pages = [
+            "<p>A & B</p>",
+            "<table><tbody><tr><td colspan=2>x</td></tr><tr><td>a</td><td>b</td></tr></tbody></table>",
+            "<p>a<br>b</p><p>c</p>",
+            "<h1>T</h1><p>before</p>" + "<p>x &amp; y</p>" * 50 + "<p>tail & end</p>",
+            "<p>unclosed<p>next</p>",
+        ]
+        for html in pages:
+            for pieces in (1, 3, 11):
+                with self.subTest(html=html[:40], pieces=pieces):
+                    self.assertEqual(whole(html, "lxml", pieces), whole(html, "python"))
+
+    def test_malformed_chunked_output(self):
+        """Test that the fallback restarts chunking from a clean chunker"""
+        html = SCENARIOS["mixed"](0.3) + "<p>R & D</p>"
+        results = []
+        for backend in ("python", "lxml"):
+            parser = create_parser(backend=backend, chunker=MarkdownChunker(max_size=400, overlap=80))
+            parser.feed(html)
+            results.append(parser.drain_chunks(final=True))
+        self.assertEqual(results[0], results[1])
+
+    def test_error_after_drained_output(self):
+        """Test that malformed input after streamed output raises instead of losing content"""
+        parser = create_parser(backend="lxml")
+        parser.feed("<h1>T</h1><p>first</p><p>second</p>")
+        self.assertTrue(parser.drain_markdown())
+        with self.assertRaises(ValueError):
+            parser.feed("<p>A & B</p>")
+            parser.drain_markdown(final=True)
+
+    def test_chunked_output(self):
+        """Test identical chunks from both backends"""
+        html = SCENARIOS["mixed"](0.3)
+        results = []
+        for backend in ("python", "lxml"):
+            parser = create_parser(backend=backend, chunker=MarkdownChunker(max_size=400, overlap=80))
+            parser.feed(html)
+            results.append(parser.drain_chunks(final=True))
+        self.assertGreater(len(results[0]), 1)
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
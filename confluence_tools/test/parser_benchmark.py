@@ -0,0 +1,119 @@
+"""Benchmark suite for ConfluenceHTMLParser.
+
+Run from the plugin root:
+
+    python test/parser_benchmark.py                      # print results
+    python test/parser_benchmark.py --save bench.json    # record a baseline
+    python test/parser_benchmark.py --compare bench.json # fail on regressions
+    python test/parser_benchmark.py --backend python     # pure-Python parser only
+
+Each scenario parses a synthetic page and reports throughput (MB of storage
+HTML per second) and peak traced memory during conversion.
+"""
+
+from typing import Callable, Dict
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# 以脚本方式运行时，将插件根目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_pages import SCENARIOS  # noqa: E402
+from unit.parser_backends import PARSER_BACKENDS, create_parser  # noqa: E402
+from unit.table_grid import TABLE_FORMATS  # noqa: E402
+
+
+def convert(html: str, table_format: str = "markdown", backend: str = "auto") -> str:
+    """Convert one page with the default parser settings."""
+    parser = create_parser(add_level_mark=True, table_format=table_format, backend=backend)
+    parser.feed(html)
+    return parser.get_markdown()
+
+
+def measure(html: str, repeat: int = 3, converter: Callable[[str], str] = convert) -> Dict[str, float]:
+    """Measure best-of-``repeat`` throughput and the peak memory of one run."""
+    size_mb = len(html.encode('utf-8')) / (1024 * 1024)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        converter(html)
+        best = min(best, time.perf_counter() - start)
+
+    # tracemalloc 会拖慢执行，峰值内存单独测量一次
+    tracemalloc.start()
+    converter(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size_mb": round(size_mb, 3),
+        "seconds": round(best, 4),
+        "mb_per_s": round(size_mb / best, 2) if best else float('inf'),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def run(scale: float = 1.0, repeat: int = 3, scenarios=None,
+        table_format: str = "markdown", backend: str = "auto") -> Dict[str, Dict[str, float]]:
+    """Run the selected scenarios and return their measurements."""
+    results = {}
+    for name, build in SCENARIOS.items():
+        if scenarios and name not in scenarios:
+            continue
+        results[name] = measure(build(scale), repeat=repeat,
+                                converter=lambda html: convert(html, table_format, backend))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> list:
+    """List regressions beyond ``tolerance`` (relative) against a baseline."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['mb_per_s']} MB/s < baseline {base['mb_per_s']} MB/s")
+        if current["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {current['peak_mb']} MB > baseline {base['peak_mb']} MB")
+    return regressions
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="page size multiplier")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario")
+    arg_parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these")
+    arg_parser.add_argument("--table-format", default="markdown", choices=TABLE_FORMATS,
+                            help="table output format")
+    arg_parser.add_argument("--backend", default="auto", choices=PARSER_BACKENDS, help="parser backend")
+    arg_parser.add_argument("--save", help="write results to this JSON file")
+    arg_parser.add_argument("--compare", help="baseline JSON file to compare against")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = arg_parser.parse_args(argv)
+
+    results = run(scale=args.scale, repeat=args.repeat, scenarios=args.scenario, table_format=args.table_format,
+                  backend=args.backend)
+    print(f"{'scenario':<16}{'size MB':>10}{'seconds':>10}{'MB/s':>10}{'peak MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['size_mb']:>10}{r['seconds']:>10}{r['mb_per_s']:>10}{r['peak_mb']:>10}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
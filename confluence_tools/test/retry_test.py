@@ -0,0 +1,173 @@
+"""Tests for the Confluence retry, backoff and circuit breaker layer."""
+
+import time
+import unittest
+from email.utils import formatdate
+
+import requests
+
+from stub_confluence import StubState, serve
+from unit.confluence_retry import (CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, Deadline,
+                                   DeadlineExceeded, RetryPolicy, parse_retry_after, send_with_retry)
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache
+from unit.page_markdown import iter_pages_markdown
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, retry_after: str = None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if retry_after else {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def scripted(*outcomes):
+    """A send function returning (or raising) the given outcomes in order."""
+    queue = list(outcomes)
+
+    def send(timeout):
+        outcome = queue.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send
+
+
+class TestRetryLayer(unittest.TestCase):
+    """Test suite for send_with_retry and its helpers."""
+
+    def setUp(self):
+        self.sleeps = []
+        self.policy = RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=1.0)
+
+    def send(self, send, breaker=None, deadline=None, **kwargs):
+        return send_with_retry(send, self.policy, breaker or CircuitBreaker(), deadline or Deadline(None),
+                               (5, 60), sleep=self.sleeps.append, **kwargs)
+
+    def test_parse_retry_after(self):
+        """Test seconds, HTTP dates and malformed values"""
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 10, usegmt=True)), 10, delta=1.5)
+
+    def test_retries_throttled_requests(self):
+        """Test that 429/503 are retried with backoff and Retry-After is honored"""
+        first = FakeResponse(429, retry_after="2")
+        response = self.send(scripted(first, FakeResponse(503), FakeResponse(200)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(first.closed)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertGreaterEqual(self.sleeps[0], 2)
+        self.assertLessEqual(self.sleeps[1], 0.2)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that the last throttled response is returned when attempts run out"""
+        response = self.send(scripted(*[FakeResponse(429) for _ in range(4)]))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(self.sleeps), 3)
+
+    def test_non_retryable_status_is_returned(self):
+        """Test that 404 is returned without retrying"""
+        self.assertEqual(self.send(scripted(FakeResponse(404))).status_code, 404)
+        self.assertEqual(self.sleeps, [])
+
+    def test_retries_connection_errors(self):
+        """Test that transport errors are retried and re-raised when attempts run out"""
+        response = self.send(scripted(requests.ConnectionError("reset"), FakeResponse(200)),
+                             retry_exceptions=(requests.ConnectionError,))
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(requests.ConnectionError):
+            self.send(scripted(*[requests.ConnectionError("reset") for _ in range(4)]),
+                      retry_exceptions=(requests.ConnectionError,))
+
+    def test_deadline(self):
+        """Test that a Retry-After beyond the deadline stops retrying and an expired deadline fails fast"""
+        response = self.send(scripted(FakeResponse(429, retry_after="30")), deadline=Deadline(5))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.sleeps, [])
+
+        expired = Deadline(0.001)
+        time.sleep(0.01)
+        with self.assertRaises(DeadlineExceeded):
+            self.send(scripted(FakeResponse(200)), deadline=expired)
+
+    def test_circuit_breaker(self):
+        """Test that the breaker opens after repeated failures and recovers after a trial"""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+        self.policy = RetryPolicy(max_attempts=1)
+        for _ in range(3):
+            self.send(scripted(FakeResponse(503)), breaker=breaker)
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.send(scripted(FakeResponse(200)), breaker=breaker)
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half-open")
+        self.assertEqual(self.send(scripted(FakeResponse(200)), breaker=breaker).status_code, 200)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_breakers_are_per_host(self):
+        """Test that the registry keys breakers by host"""
+        registry = CircuitBreakerRegistry()
+        self.assertIs(registry.get("https://wiki.example.com"), registry.get("https://wiki.example.com/confluence"))
+        self.assertIsNot(registry.get("https://wiki.example.com"), registry.get("https://other.example.com"))
+
+
+class TestSessionRetry(unittest.TestCase):
+    """Throttled bursts against the stub server resolve inside the session."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        cls.state.add_page("100", "Page", "<p>body</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def session_kwargs(self):
+        return {
+            "credential_cache": CredentialValidationCache(),
+            "content_cache": PageContentCache(),
+            "retry": RetryPolicy(max_attempts=5, base_delay=0.02),
+            "breakers": CircuitBreakerRegistry(),
+        }
+
+    def test_sync_session_rides_out_throttling(self):
+        """Test that the sync session retries 429/503 and returns the page"""
+        self.state.failures = [(429, {"Retry-After": "0.05"}), (503, {}), (429, {})]
+        session = ConfluenceSession(self.base_url, "user", "secret", **self.session_kwargs())
+        result = session.get_page_content("100")
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["results"], "<p>body</p>")
+        self.assertEqual(self.state.failures, [])
+
+    def test_deadline_reports_error(self):
+        """Test that an exhausted deadline surfaces as a failed result"""
+        session = ConfluenceSession(self.base_url, "user", "secret", deadline=0.001, **self.session_kwargs())
+        time.sleep(0.01)
+        result = session.get_page_content("100")
+        self.assertFalse(result["success"])
+        self.assertIn("时限", result["details"])
+
+    def test_operations_get_their_own_deadline(self):
+        """Test that each page of a multi-page run gets a fresh budget instead of sharing the session one"""
+        session = ConfluenceSession(self.base_url, "user", "secret", deadline=0.001, **self.session_kwargs())
+        time.sleep(0.01)
+        results = dict(iter_pages_markdown(session, ["100", "100", "100"], max_workers=2))
+        self.assertTrue(results["100"]["success"], results)
+        with session.operation(0.001) as deadline:
+            time.sleep(0.01)
+            self.assertIs(session.current_deadline, deadline)
+            with session.operation(60) as nested:
+                self.assertIs(nested, deadline)
+                self.assertFalse(session.get_page_version("100")["success"])
+        self.assertIs(session.current_deadline, session.deadline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Unit tests for the pooled session registry."""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from stub_confluence import StubState, serve
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+from unit.page_cache import PageContentCache
+from unit.session_registry import ConfluenceSessionRegistry
+
+
+class TestConfluenceSessionRegistry(unittest.TestCase):
+    """Test suite for session sharing, keying and keep-alive recycling."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.state, cls.base_url = serve(StubState())
+        cls.state.add_page("1", "Home", "<p>home</p>")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.registry = ConfluenceSessionRegistry(pool_connections=2, pool_maxsize=4, keep_alive=60)
+
+    def tearDown(self):
+        self.registry.close_all()
+
+    def session(self, password: str = "secret") -> ConfluenceSession:
+        return ConfluenceSession(self.base_url, "user", password, registry=self.registry,
+                                 credential_cache=CredentialValidationCache(),
+                                 content_cache=PageContentCache())
+
+    def test_session_shared(self):
+        """Test that the same credentials share one pooled session"""
+        first = self.registry.get_session(self.base_url + "/", "user", "secret")
+        self.assertIs(self.registry.get_session(self.base_url, "user", "secret"), first)
+        self.assertEqual(first.auth, ("user", "secret"))
+        adapter = first.get_adapter(self.base_url)
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_password_change_does_not_touch_shared_session(self):
+        """Test that another password gets its own session and the old one keeps its auth"""
+        old = self.registry.get_session(self.base_url, "user", "secret")
+        new = self.registry.get_session(self.base_url, "user", "changed")
+        self.assertIsNot(new, old)
+        self.assertEqual(old.auth, ("user", "secret"))
+        self.assertEqual(new.auth, ("user", "changed"))
+        key = self.registry.session_key(self.base_url, "user", "secret")
+        self.assertNotIn("secret", key)
+
+    def test_idle_session_recycled(self):
+        """Test that a session idle past keep_alive is closed and rebuilt"""
+        self.registry.keep_alive = 0
+        session = self.registry.get_session(self.base_url, "user", "secret")
+        time.sleep(0.01)
+        with patch.object(session, 'close') as close:
+            self.assertIsNot(self.registry.get_session(self.base_url, "user", "secret"), session)
+        close.assert_called_once()
+
+    def test_requests_refresh_last_used(self):
+        """Test that every request keeps the session alive, not only the checkout"""
+        self.registry.keep_alive = 0.2
+        confluence = self.session()
+        for _ in range(4):
+            time.sleep(0.08)
+            self.assertTrue(confluence.get_page_content("1")["success"])
+        # 取出后已过 0.3 秒以上，但最近一次请求刚刚发生
+        self.assertIs(self.registry.get_session(self.base_url, "user", "secret"), confluence.session)
+
+    def test_from_env(self):
+        """Test that the registry is configured from CONFLUENCE_* variables"""
+        env = {"CONFLUENCE_POOL_MAXSIZE": "32", "CONFLUENCE_KEEP_ALIVE": "5", "CONFLUENCE_READ_TIMEOUT": "9"}
+        with patch.dict('os.environ', env):
+            registry = ConfluenceSessionRegistry.from_env()
+        self.assertEqual((registry.pool_maxsize, registry.keep_alive, registry.timeout), (32, 5.0, (5.0, 9.0)))
+
+    def test_concurrent_checkout_shares_session(self):
+        """Test that threads checking out the same credentials get one session"""
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(
+            self.registry.get_session(self.base_url, "user", "secret"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(session) for session in sessions}), 1)
+
+    def test_idle_session_of_old_password_closed(self):
+        """Test that checking out new credentials closes other sessions idle past keep_alive"""
+        old = self.registry.get_session(self.base_url, "user", "secret")
+        self.registry.keep_alive = 0
+        time.sleep(0.01)
+        with patch.object(old, 'close') as close:
+            self.registry.get_session(self.base_url, "user", "changed")
+        close.assert_called_once()
+
+    def test_close_all(self):
+        """Test that close_all closes and forgets every session"""
+        session = self.registry.get_session(self.base_url, "user", "secret")
+        with patch.object(session, 'close') as close:
+            self.registry.close_all()
+        close.assert_called_once()
+        self.assertIsNot(self.registry.get_session(self.base_url, "user", "secret"), session)
+
+    def test_discard(self):
+        """Test that discard closes every session of the user"""
+        first = self.registry.get_session(self.base_url, "user", "secret")
+        second = self.registry.get_session(self.base_url, "user", "changed")
+        with patch.object(first, 'close') as close_first, patch.object(second, 'close') as close_second:
+            self.registry.discard(self.base_url, "user")
+        close_first.assert_called_once()
+        close_second.assert_called_once()
+        self.assertIsNot(self.registry.get_session(self.base_url, "user", "secret"), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Unit tests for the incremental storage value extractor."""
+
+import json
+import unittest
+
+from unit.storage_stream import StorageStream, StorageValueExtractor, parse_page_metadata
+
+HTML = '<p class="x">引号 \\ 反斜杠\n换行\t制表 😀 </p><ac:link/>'
+
+
+def content_json(html: str = HTML, ensure_ascii: bool = True, title: str = "页面 \"A\"", version: int = 7) -> bytes:
+    document = {
+        "id": "1",
+        "type": "page",
+        "title": title,
+        "version": {"by": {"displayName": "x"}, "number": version},
+        "body": {"storage": {"representation": "storage", "value": html}},
+        "_links": {"self": "https://wiki/rest/api/content/1"},
+    }
+    return json.dumps(document, ensure_ascii=ensure_ascii).encode("utf-8")
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestStorageValueExtractor(unittest.TestCase):
+    """Test suite for StorageValueExtractor, driven directly and through StorageStream."""
+
+    def test_every_chunk_size(self):
+        """Test that escapes and multi-byte characters split anywhere decode the same"""
+        for ensure_ascii in (True, False):
+            data = content_json(ensure_ascii=ensure_ascii)
+            for size in range(1, 40):
+                with self.subTest(ensure_ascii=ensure_ascii, size=size):
+                    self.assertEqual("".join(StorageStream(chunked(data, size))), HTML)
+
+    def test_surrogate_pair_not_split(self):
+        """Test that a \\uD83D\\uDE00 pair fed apart is decoded as one character"""
+        extractor = StorageValueExtractor()
+        pieces = [extractor.feed(text) for text in ('{"body":{"storage":{"value":"a\\uD83D', '\\uDE00b"}}}')]
+        self.assertEqual(pieces, ["a", "😀b"])
+        self.assertTrue(extractor.finished)
+
+    def test_incomplete_escape_carried(self):
+        """Test that an escape cut after the backslash is completed by the next piece"""
+        extractor = StorageValueExtractor()
+        self.assertEqual(extractor.feed('{"storage": {"value": "x\\'), "x")
+        self.assertEqual(extractor.feed('u00e9\\'), "é")
+        self.assertEqual(extractor.feed('n"'), "\n")
+        self.assertEqual(extractor.feed('ignored'), "")
+
+    def test_missing_value(self):
+        """Test that a response without body.storage.value raises ValueError"""
+        with self.assertRaises(ValueError):
+            list(StorageStream([b'{"id": "1", "title": "x"}']))
+        with self.assertRaises(ValueError):
+            list(StorageStream([b'{"body": {"storage": {"value": "unterminated']))
+
+
+class TestStorageStream(unittest.TestCase):
+    """Test suite for StorageStream metadata read-ahead."""
+
+    def test_metadata_before_body(self):
+        """Test that title and version are read before the body and the body is still complete"""
+        for size in (1, 7, 4096):
+            with self.subTest(size=size):
+                stream = StorageStream(chunked(content_json(), size))
+                self.assertEqual(stream.read_metadata(), {"title": "页面 \"A\"", "version": 7})
+                self.assertEqual("".join(stream), HTML)
+
+    def test_metadata_without_read_ahead(self):
+        """Test that iterating without read_metadata yields the body"""
+        self.assertEqual("".join(StorageStream(chunked(content_json(), 5))), HTML)
+
+    def test_parse_page_metadata(self):
+        """Test that the version number is taken from the version object only"""
+        text = '{"number": 3, "title": "T", "version": {"when": "x", "number": 9}}'
+        self.assertEqual(parse_page_metadata(text), {"title": "T", "version": 9})
+        self.assertEqual(parse_page_metadata('{"id": "1"}'), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+"""In-process stub of the Confluence REST API for tests and benchmarks."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlparse
+from datetime import datetime
+import base64
+import json
+import re
+import threading
+import time
+
+
+class StubState:
+    """Pages, children and behaviour knobs served by the stub."""
+
+    def __init__(self, username: str = "user", password: str = "secret", latency: float = 0.0):
+        self.username = username
+        self.password = password
+        # 每个请求的模拟网络延迟（秒）
+        self.latency = latency
+        self.pages: Dict[str, Dict] = {}
+        self.children: Dict[str, List[str]] = {}
+        # 页面附件：page_id -> [{id, title, data, media_type, version}]
+        self.attachments: Dict[str, List[Dict]] = {}
+        # 搜索可见但获取内容返回 403 的页面
+        self.unreadable: set = set()
+        self.calls: List[str] = []
+        # 依次返回的故障响应 (status, headers)，用完后恢复正常
+        self.failures: List[Tuple[int, Dict[str, str]]] = []
+        # 正在处理的请求数及其峰值，用于检查客户端的并发上限
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def add_page(self, page_id: str, title: str, body: str, version: int = 1,
+                 parent_id: Optional[str] = None, modified: str = "2024-01-01T00:00:00.000+08:00") -> None:
+        self.pages[str(page_id)] = {"id": str(page_id), "title": title, "body": body, "version": version,
+                                    "modified": modified}
+        if parent_id is not None:
+            self.children.setdefault(str(parent_id), []).append(str(page_id))
+
+    def remove_page(self, page_id: str) -> None:
+        self.pages.pop(str(page_id), None)
+
+    def add_attachment(self, page_id: str, attachment_id: str, filename: str, data: bytes,
+                       media_type: str = "application/octet-stream", version: int = 1) -> None:
+        self.attachments.setdefault(str(page_id), []).append({
+            "id": str(attachment_id), "title": filename, "data": data, "media_type": media_type,
+            "version": version})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        expected = base64.b64encode(f"{self.state.username}:{self.state.password}".encode()).decode()
+        return self.headers.get("Authorization") == f"Basic {expected}"
+
+    def do_GET(self):
+        state = self.state
+        with state.lock:
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            self._get()
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def _get(self):
+        state = self.state
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with state.lock:
+            state.calls.append(self.path)
+            failure = state.failures.pop(0) if state.failures else None
+        if state.latency:
+            time.sleep(state.latency)
+        if failure is not None:
+            return self._send(failure[0], {"message": "injected failure"}, failure[1])
+        if not self._authorized():
+            return self._send(401, {"message": "Unauthorized"})
+
+        parts = url.path.rstrip('/').split('/')
+        if url.path.endswith("/rest/api/user/current"):
+            return self._send(200, {"username": state.username})
+        if url.path.endswith("/rest/api/content/search"):
+            return self._search(query)
+        if len(parts) >= 2 and parts[-2:] == ["child", "page"]:
+            return self._children(parts[-3], query)
+        if len(parts) >= 2 and parts[-2:] == ["child", "attachment"]:
+            return self._attachments(parts[-3], query)
+        if len(parts) >= 4 and parts[-4] == "download":
+            return self._download(parts[-2], unquote(parts[-1]))
+        if len(parts) >= 2 and parts[-2] == "content":
+            page = state.pages.get(parts[-1])
+            if page is None:
+                return self._send(404, {"message": "Not found"})
+            if page["id"] in state.unreadable:
+                return self._send(403, {"message": "Forbidden"})
+            payload = {"id": page["id"], "title": page["title"], "version": {"number": page["version"]}}
+            if "body.storage" in query.get("expand", ""):
+                payload["body"] = {"storage": {"value": page["body"], "representation": "storage"}}
+            return self._send(200, payload)
+        return self._send(404, {"message": "Not found"})
+
+    def _paginate(self, items: List[Dict], path: str, query: Dict[str, str]) -> Dict:
+        start = int(query.get("start", 0))
+        limit = int(query.get("limit", 25))
+        payload = {"results": items[start:start + limit], "start": start, "limit": limit, "_links": {}}
+        if start + limit < len(items):
+            rest = urlencode({k: v for k, v in query.items() if k != "start"})
+            payload["_links"]["next"] = f"{path}?{rest}&start={start + limit}"
+        return payload
+
+    def _children(self, page_id: str, query: Dict[str, str]):
+        state = self.state
+        items = [{"id": child, "title": state.pages[child]["title"],
+                  "version": {"number": state.pages[child]["version"]}}
+                 for child in state.children.get(page_id, [])]
+        self._send(200, self._paginate(items, urlparse(self.path).path, query))
+
+    def _attachments(self, page_id: str, query: Dict[str, str]):
+        items = [{"id": item["id"], "type": "attachment", "title": item["title"],
+                  "version": {"number": item["version"]},
+                  "extensions": {"mediaType": item["media_type"], "fileSize": len(item["data"])},
+                  "_links": {"download": f"/download/attachments/{page_id}/{quote(item['title'])}"
+                                         f"?version={item['version']}"}}
+                 for item in self.state.attachments.get(page_id, [])]
+        self._send(200, self._paginate(items, urlparse(self.path).path, query))
+
+    def _download(self, page_id: str, filename: str):
+        item = next((item for item in self.state.attachments.get(page_id, []) if item["title"] == filename), None)
+        if item is None:
+            return self._send(404, {"message": "Not found"})
+        self.send_response(200)
+        self.send_header("Content-Type", item["media_type"])
+        self.send_header("Content-Length", str(len(item["data"])))
+        self.end_headers()
+        self.wfile.write(item["data"])
+
+    def _search(self, query: Dict[str, str]):
+        # 仅支持 title ~ "xxx"、lastmodified >= "yyyy-MM-dd HH:mm" 与 ORDER BY lastmodified，
+        # 其余 CQL 条件返回全部页面
+        cql = query.get("cql", "")
+        title = re.search(r'title ~ "([^"]*)"', cql)
+        needle = title.group(1) if title else ""
+        pages = [page for page in self.state.pages.values() if needle in page["title"]]
+        since = re.search(r'lastmodified >= "([^"]+)"', cql)
+        if since:
+            since_time = datetime.strptime(since.group(1), "%Y-%m-%d %H:%M")
+            pages = [page for page in pages
+                     if datetime.fromisoformat(page["modified"]).replace(tzinfo=None) >= since_time]
+        if "order by lastmodified" in cql.lower():
+            pages.sort(key=lambda page: page["modified"])
+        items = [{"id": page["id"], "type": "page", "title": page["title"],
+                  "space": {"key": "DEV"}, "version": {"number": page["version"], "when": page["modified"]},
+                  "excerpt": f"@@@hl@@@{needle}@@@endhl@@@ {page['title']}" if needle else page["title"],
+                  "_links": {"webui": f"/pages/viewpage.action?pageId={page['id']}"}}
+                 for page in pages]
+        self._send(200, self._paginate(items, urlparse(self.path).path, query))
+
+
+def serve(state: Optional[StubState] = None) -> Tuple[ThreadingHTTPServer, StubState, str]:
+    """Start the stub on a free local port.
+
+    Returns:
+        (server, state, base_url); call ``server.shutdown()`` when done
+    """
+    state = state or StubState()
+    handler = type("StubHandler", (_Handler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
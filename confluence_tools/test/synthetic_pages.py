@@ -0,0 +1,137 @@
+"""Synthetic Confluence storage-format pages for tests and benchmarks."""
+
+import random
+
+
+def prose_page(paragraphs: int = 2000, seed: int = 0) -> str:
+    """Long prose: headings every few paragraphs, inline markup and line breaks."""
+    rnd = random.Random(seed)
+    words = ["confluence", "markdown", "parser", "release", "matrix", "cluster",
+             "deploy", "service", "config", "latency", "budget", "page"]
+    parts = []
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            parts.append(f"<h{1 + i // 10 % 3}>Section {i}</h{1 + i // 10 % 3}>")
+        sentence = " ".join(rnd.choice(words) for _ in range(40))
+        parts.append(f"<p>{sentence} <strong>bold</strong> <code>inline_{i}</code><br/>{sentence}</p>")
+    return "".join(parts)
+
+
+def large_table_page(rows: int = 2000, cols: int = 8, seed: int = 0) -> str:
+    """A single wide table with occasional rowspan/colspan cells."""
+    rnd = random.Random(seed)
+    header = "".join(f"<th>Column {c}</th>" for c in range(cols))
+    body = []
+    for r in range(rows):
+        cells = []
+        c = 0
+        while c < cols:
+            if r % 7 == 0 and c == 0:
+                cells.append(f'<td rowspan="2">group {r}</td>')
+            elif rnd.random() < 0.05 and c < cols - 1:
+                cells.append(f'<td colspan="2">span {r}-{c}</td>')
+                c += 1
+            else:
+                cells.append(f"<td>cell {r}-{c} <code>v{rnd.randint(0, 999)}</code></td>")
+            c += 1
+        body.append(f"<tr>{''.join(cells)}</tr>")
+    return f"<table><tbody><tr>{header}</tr>{''.join(body)}</tbody></table>"
+
+
+def release_matrix_page(rows: int = 5000, cols: int = 24, seed: int = 0) -> str:
+    """A release matrix: wide table with overlapping rowspan/colspan blocks."""
+    rnd = random.Random(seed)
+    header = "".join(f"<th>Release {c}</th>" for c in range(cols))
+    # 每列仍被上方跨行单元格占用的行数
+    covered = [0] * cols
+    body = []
+    for r in range(rows):
+        cells = []
+        c = 0
+        while c < cols:
+            if covered[c]:
+                covered[c] -= 1
+                c += 1
+                continue
+            rowspan = rnd.choice((1, 1, 1, 2, 3))
+            colspan = min(rnd.choice((1, 1, 1, 2)), cols - c)
+            if any(covered[c:c + colspan]):
+                colspan = 1
+            for k in range(c, c + colspan):
+                covered[k] = rowspan - 1
+            attrs = (f' rowspan="{rowspan}"' if rowspan > 1 else "") + (f' colspan="{colspan}"' if colspan > 1 else "")
+            cells.append(f"<td{attrs}>{'yes' if rnd.random() < 0.7 else 'no'} {r}.{c}</td>")
+            c += colspan
+        body.append(f"<tr>{''.join(cells)}</tr>")
+    return f"<table><tbody><tr>{header}</tr>{''.join(body)}</tbody></table>"
+
+
+def nested_table_page(tables: int = 200) -> str:
+    """Tables whose cells contain tables and code macros."""
+    parts = []
+    for t in range(tables):
+        inner = ("<table><tbody><tr><th>k</th><th>v</th></tr>"
+                 f"<tr><td>key {t}</td><td>value {t}</td></tr></tbody></table>")
+        code = ('<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">sql</ac:parameter>'
+                f'<ac:plain-text-body><![CDATA[select {t}\nfrom dual]]></ac:plain-text-body></ac:structured-macro>')
+        parts.append(f"<h2>Table {t}</h2><table><tbody><tr><th>Name</th><th>Detail</th><th>Query</th></tr>"
+                     f"<tr><td>row {t}</td><td>{inner}</td><td>{code}</td></tr></tbody></table>")
+    return "".join(parts)
+
+
+def code_macro_page(macros: int = 300, lines: int = 200) -> str:
+    """Many code macros with large CDATA bodies."""
+    parts = []
+    for m in range(macros):
+        body = "\n".join(f"    value_{m}_{i} = compute({i}) # <tag> & comment" for i in range(lines))
+        parts.append(f"<h3>Snippet {m}</h3><p>Example {m}</p>"
+                     '<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">python</ac:parameter>'
+                     f"<ac:plain-text-body><![CDATA[def snippet_{m}():\n{body}\n]]></ac:plain-text-body>"
+                     "</ac:structured-macro>")
+    return "".join(parts)
+
+
+def mixed_page(blocks: int = 300, seed: int = 0) -> str:
+    """A realistic mix of every block type the parser handles."""
+    rnd = random.Random(seed)
+    parts = []
+    for i in range(blocks):
+        kind = rnd.randint(0, 6)
+        if kind == 0:
+            parts.append(f"<h2>Heading {i}</h2>")
+        elif kind == 1:
+            parts.append('<ac:structured-macro ac:name="code"><ac:parameter ac:name="language">java</ac:parameter>'
+                         f'<ac:plain-text-body><![CDATA[class A{i} {{\n  int x = {i};\n}}]]></ac:plain-text-body>'
+                         '</ac:structured-macro>')
+        elif kind == 2:
+            rows = "".join(f'<tr><td rowspan="{1 + j % 2}">r{j}</td><td>c <code>x</code></td></tr>'
+                           for j in range(rnd.randint(1, 5)))
+            parts.append(f"<table><tbody><tr><th>A</th><th>B</th></tr>{rows}</tbody></table>")
+        elif kind == 3:
+            parts.append(f"<pre>preformatted {i}\n  indented line</pre>")
+        elif kind == 4:
+            parts.append('<table data-macro-name="code" data-macro-parameters="language=js">'
+                         f"<tbody><tr><td><pre>var a{i} = 1;\nvar b = 2;</pre></td></tr></tbody></table>")
+        elif kind == 5:
+            parts.append("<p></p><p>   </p><br/>")
+        parts.append(f"<p>Paragraph {i} with <em>emphasis</em> and <code>inline</code> text.</p>")
+    return "".join(parts)
+
+
+def fragmented_text_page(lines: int = 50000) -> str:
+    """A huge <pre> block and table cell whose text arrives as many small data events."""
+    pre = "".join(f"line {i} &lt; x\n" for i in range(lines))
+    cell = "".join(f"v{i} &amp; " for i in range(lines))
+    return f"<pre>{pre}</pre><table><tbody><tr><td>{cell}</td></tr></tbody></table>"
+
+
+# 基准测试使用的全部场景，scale 用于整体放大或缩小页面规模
+SCENARIOS = {
+    "prose": lambda scale: prose_page(paragraphs=int(2000 * scale)),
+    "large_table": lambda scale: large_table_page(rows=int(2000 * scale)),
+    "release_matrix": lambda scale: release_matrix_page(rows=int(5000 * scale)),
+    "nested_tables": lambda scale: nested_table_page(tables=int(200 * scale)),
+    "code_macros": lambda scale: code_macro_page(macros=int(300 * scale)),
+    "mixed": lambda scale: mixed_page(blocks=int(300 * scale)),
+    "fragmented": lambda scale: fragmented_text_page(lines=int(50000 * scale)),
+}
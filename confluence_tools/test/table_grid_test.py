@@ -0,0 +1,130 @@
+"""Unit tests for the occupancy-grid table model."""
+
+import json
+import time
+import unittest
+
+from synthetic_pages import release_matrix_page
+from unit.confluence_html_parser import ConfluenceHTMLParser
+from unit.table_grid import MAX_COLSPAN, MAX_ROWSPAN, TableGrid, parse_span
+
+
+def to_markdown(html: str, **kwargs) -> str:
+    parser = ConfluenceHTMLParser(**kwargs)
+    parser.feed(html)
+    return parser.get_markdown()
+
+
+def cell(text: str, rowspan: int = 1, colspan: int = 1, cell_type: str = "td") -> dict:
+    return {"text": text, "cell_type": cell_type, "rowspan": rowspan, "colspan": colspan}
+
+
+class TestTableGrid(unittest.TestCase):
+    """Test suite for TableGrid placement and rendering."""
+
+    def test_parse_span(self):
+        """Test that invalid and zero spans count as 1"""
+        self.assertEqual([parse_span(v) for v in (None, "1", "3", "0", "x", "-2")], [1, 1, 3, 1, 1, 1])
+        self.assertEqual(parse_span("3000000"), MAX_ROWSPAN)
+        self.assertEqual(parse_span("3000000", MAX_COLSPAN), MAX_COLSPAN)
+
+    def test_overlapping_spans(self):
+        """Test that a cell below a rowspan+colspan block lands right of it"""
+        grid = TableGrid.from_rows([
+            [cell("A"), cell("B"), cell("C"), cell("D")],
+            [cell("big", rowspan=2, colspan=2), cell("r1", rowspan=3), cell("x")],
+            [cell("y")],
+            [cell("p"), cell("q"), cell("z")],
+        ])
+        self.assertEqual(grid.to_markdown(),
+                         "| A | B | C | D |\n| --- | --- | --- | --- |\n"
+                         "| big |     | r1 | x |\n"
+                         "|     |     |     | y |\n"
+                         "| p | q |     | z |\n")
+
+    def test_rows_are_padded_to_width(self):
+        """Test that short rows are padded so every row has the same columns"""
+        grid = TableGrid.from_rows([[cell("A"), cell("B")], [cell("only")]])
+        self.assertEqual(grid.to_markdown(), "| A | B |\n| --- | --- |\n| only |  |\n")
+
+    def test_rowspan_past_last_row_is_clipped(self):
+        """Test that a rowspan reaching past the table end adds no rows"""
+        grid = TableGrid.from_rows([[cell("A")], [cell("tall", rowspan=50)]])
+        self.assertEqual(grid.to_markdown().count("\n"), 3)
+
+    def test_huge_spans_are_cheap(self):
+        """Test that a huge rowspan/colspan builds no rows past the table end"""
+        start = time.perf_counter()
+        grid = TableGrid.from_rows([[cell("h")], [cell("huge", rowspan=3000000, colspan=20)], [cell("x")]])
+        markdown, html = grid.to_markdown(), grid.to_html()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(len(grid.grid), 3)
+        self.assertEqual(grid.width, 21)
+        self.assertEqual(markdown.count("\n"), 4)
+        self.assertIn('<td rowspan="2" colspan="20">huge</td>', html)
+
+    def test_covered_rows_kept_in_html(self):
+        """Test that a row fully covered by a rowspan stays as an empty row"""
+        grid = TableGrid.from_rows([[cell("A", rowspan=2), cell("B", rowspan=2)], [], [cell("x"), cell("y")]])
+        self.assertEqual(grid.to_html(compact=True),
+                         '<table><tr><td rowspan="2">A</td><td rowspan="2">B</td></tr><tr></tr>'
+                         '<tr><td>x</td><td>y</td></tr></table>')
+
+    def test_pipes_are_escaped(self):
+        """Test that pipes in cell text do not split Markdown cells"""
+        self.assertIn("| a\\|b |", TableGrid.from_rows([[cell("h")], [cell("a|b")]]).to_markdown())
+
+    def test_alternative_formats(self):
+        """Test HTML, CSV and JSON rendering"""
+        rows = [[cell("Name", cell_type="th"), cell("Value", cell_type="th")],
+                [cell("a & b", colspan=2)], [cell("x"), cell("1")]]
+        grid = TableGrid.from_rows(rows)
+        self.assertEqual(grid.to_html(), '<table>\n<tr><th>Name</th><th>Value</th></tr>\n'
+                                         '<tr><td colspan="2">a &amp; b</td></tr>\n'
+                                         '<tr><td>x</td><td>1</td></tr>\n</table>\n')
+        self.assertEqual(grid.to_csv(), "```csv\nName,Value\na & b,\nx,1\n```\n")
+        records = json.loads(grid.to_json()[len("```json\n"):-len("```\n")])
+        self.assertEqual(records, [{"Name": "a & b", "Value": ""}, {"Name": "x", "Value": "1"}])
+
+    def test_auto_format_uses_html_for_wide_tables(self):
+        """Test that auto keeps Markdown for narrow tables and switches to HTML for wide ones"""
+        narrow = TableGrid.from_rows([[cell(str(c)) for c in range(3)]] * 2)
+        wide = TableGrid.from_rows([[cell(str(c)) for c in range(30)]] * 2)
+        self.assertTrue(narrow.render("auto").startswith("| 0 |"))
+        self.assertTrue(wide.render("auto").startswith("<table>"))
+
+    def test_nested_table_keeps_outer_rows(self):
+        """Test that a nested table is kept inside its cell as inline HTML"""
+        html = ('<table><tbody><tr><th>Name</th><th>Detail</th></tr>'
+                '<tr><td>row</td><td><table><tbody><tr><th>k</th></tr><tr><td>v</td></tr></tbody></table></td></tr>'
+                '<tr><td>last</td><td>end</td></tr></tbody></table>')
+        self.assertEqual(to_markdown(html), "\n| Name | Detail |\n| --- | --- |\n"
+                                            "| row | <table><tr><th>k</th></tr><tr><td>v</td></tr></table> |\n"
+                                            "| last | end |\n")
+
+    def test_table_format_option(self):
+        """Test that the parser renders tables in the requested format"""
+        html = '<table><tbody><tr><th>A</th></tr><tr><td>1</td></tr></tbody></table>'
+        self.assertIn("```csv\nA\n1\n```", to_markdown(html, table_format="csv"))
+        with self.assertRaises(ValueError):
+            ConfluenceHTMLParser(table_format="xml")
+
+    def test_large_table_is_linear(self):
+        """Test that placement time grows linearly with the number of rows"""
+        def timed(rows):
+            parser = ConfluenceHTMLParser()
+            parser.feed(release_matrix_page(rows=rows).replace("</tbody></table>", ""))
+            table = parser.current_table
+            best = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                TableGrid.from_rows(table).to_markdown()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        small, large = timed(500), timed(4000)
+        self.assertLess(large, small * 8 * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
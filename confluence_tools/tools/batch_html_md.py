@@ -0,0 +1,49 @@
+from collections.abc import Generator
+from typing import Any
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from unit.confluence_session import ConfluenceSession
+from unit.page_markdown import iter_pages_markdown, parse_page_ids
+
+
+class BatchHtmlMdTool(Tool):
+    """Tool for converting several Confluence pages to Markdown concurrently."""
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # Get required parameters
+        page_ids = parse_page_ids(tool_parameters.get("pageIds"))
+        base_url = self.runtime.credentials.get('baseUrl')
+        username = self.runtime.credentials.get('userName')
+        password = self.runtime.credentials.get('password')
+        add_level_mark = tool_parameters.get("add_level_mark", False)
+        mark_prefix = tool_parameters.get("mark_prefix") or "L_"
+        max_workers = int(tool_parameters.get("max_workers") or 4)
+
+        if not page_ids:
+            yield self.create_text_message(text="Page IDs are required")
+            return
+
+        if not all([base_url, username, password]):
+            yield self.create_text_message(text="Missing required credentials")
+            return
+
+        session = ConfluenceSession(base_url, username, password)
+
+        # Stream one result per page as soon as it completes
+        for page_id, result in iter_pages_markdown(session, page_ids, max_workers=max_workers,
+                                                   add_level_mark=add_level_mark,
+                                                   mark_prefix=mark_prefix):
+            if result["success"]:
+                yield self.create_json_message({
+                    "pageId": page_id,
+                    "success": True,
+                    "title": result["title"],
+                    "content": result["markdown"]
+                })
+            else:
+                yield self.create_json_message({
+                    "pageId": page_id,
+                    "success": False,
+                    "title": result["title"],
+                    "content": result["message"]
+                })
@@ -1,11 +1,30 @@
-import io
+import json
+import logging
 from collections.abc import Generator
 from typing import Any
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from unit.confluence_html_parser import ConfluenceHTMLParser
+from unit.blob_output import OUTPUT_COMPRESSIONS, BlobOutput
 from unit.confluence_session import ConfluenceSession
+from unit.page_cache import render_cache
+from unit.markdown_chunker import chunk_options
+from unit.markdown_spool import iter_converted
+from unit.metrics import InvocationMetrics
+from unit.parser_backends import create_parser
+from unit.page_attachments import (ATTACHMENT_DIR, build_attachment_archive, fetch_page_with_attachments,
+                                   read_stored_attachment, release_attachments)
+from unit.page_markdown import (fetch_page_chunks, fetch_page_markdown, probe_rendered, remember_rendered,
+                                render_cache_key)
+from unit.page_tree import safe_filename
+from unit.table_grid import TABLE_FORMATS
+
+# 流式转换时，不超过该长度的 Markdown 会写入渲染缓存
+STREAM_RENDER_CACHE_LIMIT = 1024 * 1024
+# 附件返回方式：none 不处理附件；blobs 逐个返回文件；archive 与 Markdown 一起打包
+ATTACHMENT_MODES = ("none", "blobs", "archive")
+
+logger = logging.getLogger(__name__)
 
 
 class HtmlMdTool(Tool):
@@ -19,46 +38,248 @@ class HtmlMdTool(Tool):
         result_type = tool_parameters.get("result_type")
         add_level_mark = tool_parameters.get("add_level_mark", False)
         mark_prefix = tool_parameters.get("mark_prefix", "L_")
+        stream_output = tool_parameters.get("stream_output", False)
+        output_format = tool_parameters.get("output_format") or "markdown"
+        table_format = tool_parameters.get("table_format") or "markdown"
+        attachment_mode = tool_parameters.get("attachment_mode") or "none"
+        compression = tool_parameters.get("compression") or "none"
         
         # Validate required parameters
-        if not all([base_url, page_id, username, password]):
+        if (not all([base_url, page_id, username, password]) or table_format not in TABLE_FORMATS
+                or attachment_mode not in ATTACHMENT_MODES or compression not in OUTPUT_COMPRESSIONS):
             yield self.create_text_message(text="参数错误")
             return
 
         # Initialize session and get page content
-        session = ConfluenceSession(base_url, username, password)
-        wiki = session.get_page_content(page_id)
+        metrics = InvocationMetrics("html_md_api")
+        session = ConfluenceSession(base_url, username, password, metrics=metrics)
+        completed = False
+        try:
+            yield from self._convert(session, page_id, result_type, add_level_mark, mark_prefix, stream_output,
+                                     output_format, table_format, attachment_mode, compression, tool_parameters)
+            completed = True
+        finally:
+            # 每次调用输出一条结构化耗时记录
+            record = metrics.log(page_id=str(page_id), output_format=output_format, result_type=result_type,
+                                 stream_output=bool(stream_output), completed=completed)
+        if tool_parameters.get("include_metrics", False):
+            yield self.create_json_message({"metrics": record})
+
+    def _convert(self, session: ConfluenceSession, page_id: Any, result_type: str, add_level_mark: bool,
+                 mark_prefix: str, stream_output: bool, output_format: str, table_format: str,
+                 attachment_mode: str, compression: str,
+                 tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """Convert the page in the requested output mode."""
+        if output_format == "chunks":
+            yield from self._invoke_chunks(session, page_id, result_type, add_level_mark, mark_prefix,
+                                           table_format, compression, tool_parameters)
+            return
+
+        if attachment_mode != "none":
+            yield from self._invoke_attachments(session, page_id, result_type, add_level_mark, mark_prefix,
+                                                table_format, attachment_mode, compression,
+                                                tool_parameters.get("attachment_workers") or 4)
+            return
+
+        if stream_output:
+            yield from self._invoke_streaming(session, page_id, result_type, add_level_mark, mark_prefix,
+                                              table_format, compression)
+            return
+
+        # Fetch and convert, reusing the rendered Markdown of an unchanged page
+        wiki = fetch_page_markdown(session, page_id, add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                   table_format=table_format)
 
         if not wiki.get('success'):
             yield self.create_text_message(text=wiki.get('message', '未知错误'))
             return
 
-        wiki_content = wiki.get('results', '')
+        markdown_output = wiki['markdown']
         wiki_title = wiki.get('title', 'untitled')
-
-        print(f'success get wiki content: {wiki_title} length: {len(wiki_content)}')
-
-        # Convert HTML to Markdown
-        parser = ConfluenceHTMLParser(add_level_mark=add_level_mark, mark_prefix=mark_prefix)
-        parser.feed(wiki_content)
-        markdown_output = parser.get_markdown()
-        print(f'success convert wiki content to markdown: {wiki_title}')
+        logger.info("success convert wiki content to markdown: %s cached: %s", wiki_title, wiki["from_cache"])
 
         # Return result based on requested type
         if result_type == 'file':
-            buffer = io.BytesIO()
-            buffer.write(markdown_output.encode('utf-8'))
-            buffer.seek(0)
+            with BlobOutput(wiki_title, ".md", "text/markdown", compression) as output:
+                with session.metrics.stage("encode"):
+                    output.write(markdown_output)
+                yield self._blob_message(session, output)
+            return
+        else:
+            yield self._text_message(session, markdown_output)
+            return
+
+    def _text_message(self, session: ConfluenceSession, text: str) -> ToolInvokeMessage:
+        session.metrics.incr("output_chars", len(text))
+        return self.create_text_message(text=text)
+
+    def _blob_message(self, session: ConfluenceSession, output: BlobOutput) -> ToolInvokeMessage:
+        """Finish the file output and wrap it in a blob message."""
+        with session.metrics.stage("encode"):
+            blob = output.finish()
+        session.metrics.incr("output_bytes", len(blob))
+        return self.create_blob_message(blob=blob, meta=output.meta())
+
+    def _invoke_attachments(self, session: ConfluenceSession, page_id: Any, result_type: str,
+                            add_level_mark: bool, mark_prefix: str, table_format: str,
+                            attachment_mode: str, compression: str, max_workers: int) -> Generator[ToolInvokeMessage]:
+        """Convert the page with its images and attachments resolved into the attachment store."""
+        wiki = fetch_page_with_attachments(session, page_id, add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                           table_format=table_format, max_workers=max_workers)
+        if not wiki.get('success'):
+            yield self.create_text_message(text=wiki.get('message', '未知错误'))
+            return
+
+        try:
+            yield from self._attachment_messages(session, page_id, result_type, wiki, attachment_mode, compression)
+        finally:
+            # 输出完成后解除固定，附件文件才可以被淘汰
+            release_attachments(wiki)
+
+    def _attachment_messages(self, session: ConfluenceSession, page_id: Any, result_type: str,
+                             wiki: dict[str, Any], attachment_mode: str,
+                             compression: str) -> Generator[ToolInvokeMessage]:
+        """Messages of the converted page and its stored attachments."""
+        wiki_title = wiki.get('title', 'untitled')
+        name = safe_filename(wiki_title, str(page_id))
+        attachments = wiki['attachments']
+        failed = list(wiki['failed'])
+        logger.info("success convert wiki content with %d attachments: %s", len(attachments), wiki_title)
+
+        if attachment_mode == "archive":
+            with session.metrics.stage("encode"):
+                archive = build_attachment_archive(f"{name}.md", wiki['markdown'], attachments, failed)
+            session.metrics.incr("output_bytes", len(archive))
             yield self.create_blob_message(
-                blob=buffer.getvalue(),
+                blob=archive,
                 meta={
-                    'mime_type': 'text/markdown',
-                    'filename': f"{wiki_title}.md",
-                    'original_filename': wiki_title,
-                    'save_as': f"{wiki_title}.md",
+                    'mime_type': 'application/zip',
+                    'filename': f"{name}.zip",
+                    'original_filename': name,
+                    'save_as': f"{name}.zip",
                 },
             )
-            return
         else:
-            yield self.create_text_message(text=markdown_output)
+            if result_type == 'file':
+                with BlobOutput(name, ".md", "text/markdown", compression) as output:
+                    output.write(wiki['markdown'])
+                    yield self._blob_message(session, output)
+            else:
+                yield self._text_message(session, wiki['markdown'])
+            sent = set()
+            for entry in attachments:
+                # 文件名与 Markdown 中的链接一致；同一内容只返回一次
+                if entry['name'] in sent:
+                    continue
+                sent.add(entry['name'])
+                blob = read_stored_attachment(entry, failed)
+                if blob is None:
+                    continue
+                session.metrics.incr("output_bytes", len(blob))
+                yield self.create_blob_message(
+                    blob=blob,
+                    meta={
+                        'mime_type': entry['media_type'] or 'application/octet-stream',
+                        'filename': entry['name'],
+                        'original_filename': entry['filename'],
+                        'save_as': entry['name'],
+                    },
+                )
+
+        missing = {item['filename'] for item in failed[len(wiki['failed']):]}
+        yield self.create_json_message({
+            "success": True,
+            "title": wiki_title,
+            "attachments": [{"filename": entry['filename'], "link": f"{ATTACHMENT_DIR}/{entry['name']}",
+                             "sha256": entry['sha256'], "size": entry['size'], "from_store": entry['from_store']}
+                            for entry in attachments if entry['filename'] not in missing],
+            "failed": failed
+        })
+
+    def _invoke_streaming(self, session: ConfluenceSession, page_id: Any, result_type: str,
+                          add_level_mark: bool, mark_prefix: str, table_format: str,
+                          compression: str) -> Generator[ToolInvokeMessage]:
+        """Feed the parser from the HTTP response and emit finished blocks right away."""
+        # 仅当渲染缓存中有该页面时才探测版本，未渲染过的页面直接下载
+        probe = probe_rendered(session, page_id, render_cache)
+        if probe is not None and not probe.get('success'):
+            yield self.create_text_message(text=probe.get('message', '未知错误'))
+            return
+
+        cached = None
+        if probe is not None:
+            cached = render_cache.get(render_cache_key(session, page_id, probe['version'], add_level_mark,
+                                                       mark_prefix, table_format))
+        wiki = None
+        if cached is None:
+            wiki = session.stream_page_content(page_id, probe=probe)
+            if not wiki.get('success'):
+                yield self.create_text_message(text=wiki.get('message', '未知错误'))
+                return
+
+        wiki_title = (probe if wiki is None else wiki).get('title', 'untitled')
+        # 文件输出边转换边压缩写入 BlobOutput，超过阈值后落盘，内存中不保留完整结果
+        with BlobOutput(wiki_title, ".md", "text/markdown", compression) as output:
+            if cached is not None:
+                session.metrics.incr("render_cache_hits")
+                if result_type == 'file':
+                    output.write(cached)
+                else:
+                    yield self._text_message(session, cached)
+            else:
+                parser = create_parser(add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                       table_format=table_format)
+                # 只保留不超过缓存上限的部分用于写入缓存
+                parts = []
+                size = 0
+                try:
+                    for markdown_part in iter_converted(parser, wiki['chunks'], session.metrics):
+                        size += len(markdown_part)
+                        if size <= STREAM_RENDER_CACHE_LIMIT:
+                            parts.append(markdown_part)
+                        if result_type == 'file':
+                            with session.metrics.stage("encode"):
+                                output.write(markdown_part)
+                        else:
+                            yield self._text_message(session, markdown_part)
+                except Exception as e:
+                    yield self.create_text_message(text=f"获取文档异常！{str(e)}")
+                    return
+                if size <= STREAM_RENDER_CACHE_LIMIT and wiki.get('version') is not None:
+                    cache_key = render_cache_key(session, page_id, wiki['version'], add_level_mark, mark_prefix,
+                                                 table_format)
+                    remember_rendered(session, page_id, render_cache, cache_key, "".join(parts), size)
+                logger.info("success stream wiki content to markdown: %s spilled: %s", wiki_title, output.spool.spilled)
+
+            if result_type == 'file':
+                yield self._blob_message(session, output)
+
+    def _invoke_chunks(self, session: ConfluenceSession, page_id: Any, result_type: str,
+                       add_level_mark: bool, mark_prefix: str, table_format: str, compression: str,
+                       tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """Return the page as a JSON array of heading-aware chunks."""
+        try:
+            options = chunk_options(tool_parameters.get("chunk_max_size"),
+                                    tool_parameters.get("chunk_size_unit"),
+                                    tool_parameters.get("chunk_overlap"))
+        except ValueError:
+            yield self.create_text_message(text="参数错误")
+            return
+
+        wiki = fetch_page_chunks(session, page_id, add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                 table_format=table_format, **options)
+        if not wiki.get('success'):
+            yield self.create_text_message(text=wiki.get('message', '未知错误'))
             return
+
+        wiki_title = wiki.get('title', 'untitled')
+        chunks_json = json.dumps(wiki['chunks'], ensure_ascii=False)
+        logger.info("success split wiki content into %d chunks: %s cached: %s",
+                    len(wiki["chunks"]), wiki_title, wiki["from_cache"])
+        if result_type == 'file':
+            with BlobOutput(wiki_title, ".json", "application/json", compression) as output:
+                with session.metrics.stage("encode"):
+                    output.write(chunks_json)
+                yield self._blob_message(session, output)
+        else:
+            yield self._text_message(session, chunks_json)
@@ -1,10 +1,11 @@
 from collections.abc import Generator
 from typing import Any
 
-import io
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
+from unit.blob_output import OUTPUT_COMPRESSIONS, BlobOutput
 from unit.confluence_session import ConfluenceSession
+from unit.metrics import InvocationMetrics
 
 
 class PageContentTool(Tool):
@@ -21,14 +22,35 @@ class PageContentTool(Tool):
         username = self.runtime.credentials.get('userName')
         password = self.runtime.credentials.get('password')
         result_type = tool_parameters.get("result_type")
+        compression = tool_parameters.get("compression") or "none"
 
         if not all([base_url, username, password]):
             yield self.create_text_message(text="Missing required credentials")
             return
 
+        if compression not in OUTPUT_COMPRESSIONS:
+            yield self.create_text_message(text="参数错误")
+            return
+
         # Initialize session and fetch content
-        session = ConfluenceSession(base_url, username, password)
-        result = session.get_page_content(str(page_id))
+        metrics = InvocationMetrics("page_content_api")
+        session = ConfluenceSession(base_url, username, password, metrics=metrics)
+        completed = False
+        try:
+            if result_type == 'file':
+                yield from self._invoke_file(session, str(page_id), compression)
+            else:
+                yield from self._invoke_json(session, str(page_id))
+            completed = True
+        finally:
+            # 每次调用输出一条结构化耗时记录
+            record = metrics.log(page_id=str(page_id), result_type=result_type, completed=completed)
+        if tool_parameters.get("include_metrics", False):
+            yield self.create_json_message({"metrics": record})
+
+    def _invoke_json(self, session: ConfluenceSession, page_id: str) -> Generator[ToolInvokeMessage]:
+        """Return the storage HTML in a JSON message."""
+        result = session.get_page_content(page_id)
         
         # Return single JSON response with success/failure info
         if not result["success"]:
@@ -39,27 +61,38 @@ class PageContentTool(Tool):
             })
             return
         
-        fileTitle = result["title"]
-        content = result["results"]
-        
-        if result_type == 'file':
-            buffer = io.BytesIO()
-            buffer.write(content.encode('utf-8'))
-            buffer.seek(0)
-            yield self.create_blob_message(
-                blob=buffer.getvalue(),
-                meta={
-                    'mime_type': 'text/markdown',
-                    'filename': f"{fileTitle}",
-                    'original_filename': fileTitle,
-                    'save_as': f"{fileTitle}.md",
-                },
-            )
-            return
-        else:
-            # Return content as JSON
+        # Return content as JSON
+        yield self.create_json_message({
+            "success": True,
+            "title": result["title"],
+            "content": result["results"]
+        })
+
+    def _invoke_file(self, session: ConfluenceSession, page_id: str,
+                     compression: str) -> Generator[ToolInvokeMessage]:
+        """Return the storage HTML as a file, compressed while it downloads."""
+        result = session.stream_page_content(page_id)
+        if not result["success"]:
             yield self.create_json_message({
-                "success": True,
-                "title": fileTitle,
-                "content": content
-            })
\ No newline at end of file
+                "success": False,
+                "content": result["message"],
+                "title": result.get("title", "获取文档异常！")
+            })
+            return
+
+        with BlobOutput(result["title"], ".html", "text/html", compression) as output:
+            try:
+                for chunk in result["chunks"]:
+                    with session.metrics.stage("encode"):
+                        output.write(chunk)
+            except Exception as e:
+                yield self.create_json_message({
+                    "success": False,
+                    "content": f"获取文档异常！{str(e)}",
+                    "title": result["title"]
+                })
+                return
+            with session.metrics.stage("encode"):
+                blob = output.finish()
+            session.metrics.incr("output_bytes", len(blob))
+            yield self.create_blob_message(blob=blob, meta=output.meta())
@@ -0,0 +1,67 @@
+from collections.abc import Generator
+from typing import Any
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from unit.confluence_session import ConfluenceSession
+from unit.page_tree import PageTreeCrawler, build_markdown_archive, safe_filename
+
+
+class PageTreeExportTool(Tool):
+    """Tool for exporting a Confluence page subtree as a Markdown archive."""
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # Get required parameters
+        page_id = tool_parameters.get("pageId")
+        base_url = self.runtime.credentials.get('baseUrl')
+        username = self.runtime.credentials.get('userName')
+        password = self.runtime.credentials.get('password')
+
+        if not page_id:
+            yield self.create_text_message(text="Page ID is required")
+            return
+
+        if not all([base_url, username, password]):
+            yield self.create_text_message(text="Missing required credentials")
+            return
+
+        session = ConfluenceSession(base_url, username, password)
+        crawler = PageTreeCrawler(
+            session,
+            max_depth=tool_parameters.get("max_depth", 3),
+            max_pages=tool_parameters.get("max_pages", 200),
+            max_workers=tool_parameters.get("max_workers", 4),
+            add_level_mark=tool_parameters.get("add_level_mark", False),
+            mark_prefix=tool_parameters.get("mark_prefix") or "L_",
+        )
+        root_id = str(int(page_id)) if isinstance(page_id, float) else str(page_id)
+        pages = crawler.crawl(root_id)
+
+        root = next(page for page in pages if page["id"] == root_id)
+        if not root["success"]:
+            yield self.create_json_message({
+                "success": False,
+                "title": root["title"],
+                "content": root["message"]
+            })
+            return
+
+        archive_name = safe_filename(root["title"], root_id)
+        yield self.create_blob_message(
+            blob=build_markdown_archive(pages),
+            meta={
+                'mime_type': 'application/zip',
+                'filename': f"{archive_name}.zip",
+                'original_filename': archive_name,
+                'save_as': f"{archive_name}.zip",
+            },
+        )
+
+        failed = [{"pageId": page["id"], "title": page["title"], "message": page["message"]}
+                  for page in pages if not page["success"]]
+        yield self.create_json_message({
+            "success": True,
+            "title": root["title"],
+            "exported": len(pages) - len(failed),
+            "failed": failed,
+            "truncated": any(page.get("truncated") for page in pages)
+        })
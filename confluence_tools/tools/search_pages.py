@@ -0,0 +1,82 @@
+from collections.abc import Generator
+from typing import Any
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from unit.confluence_session import ConfluenceSession
+from unit.page_search import SearchError, search_and_convert
+from unit.table_grid import TABLE_FORMATS
+
+
+class SearchPagesTool(Tool):
+    """Tool for searching Confluence with CQL and optionally converting the top hits."""
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # Get required parameters
+        cql = (tool_parameters.get("cql") or "").strip()
+        base_url = self.runtime.credentials.get('baseUrl')
+        username = self.runtime.credentials.get('userName')
+        password = self.runtime.credentials.get('password')
+        table_format = tool_parameters.get("table_format") or "markdown"
+
+        if not cql:
+            yield self.create_text_message(text="CQL is required")
+            return
+
+        if not all([base_url, username, password]):
+            yield self.create_text_message(text="Missing required credentials")
+            return
+
+        if table_format not in TABLE_FORMATS:
+            yield self.create_text_message(text="参数错误")
+            return
+
+        session = ConfluenceSession(base_url, username, password)
+        auth_result = session.ensure_authenticated()
+        if not auth_result["success"]:
+            yield self.create_text_message(text=auth_result["message"])
+            return
+
+        events = search_and_convert(
+            session, cql,
+            page_size=int(tool_parameters.get("page_size") or 25),
+            max_results=int(tool_parameters.get("max_results") or 50),
+            convert_top=int(tool_parameters.get("convert_top") or 0),
+            max_workers=int(tool_parameters.get("max_workers") or 4),
+            add_level_mark=tool_parameters.get("add_level_mark", False),
+            mark_prefix=tool_parameters.get("mark_prefix") or "L_",
+            table_format=table_format,
+        )
+        # Stream every hit as it arrives, and every converted page as soon as it completes
+        try:
+            for event in events:
+                if event["event"] == "hit":
+                    hit = event["hit"]
+                    yield self.create_json_message({
+                        "pageId": hit["id"],
+                        "type": hit["type"],
+                        "title": hit["title"],
+                        "space": hit["space"],
+                        "version": hit["version"],
+                        "url": hit["url"],
+                        "excerpt": hit["excerpt"]
+                    })
+                elif event["event"] == "page":
+                    result = event["result"]
+                    yield self.create_json_message({
+                        "pageId": event["hit"]["id"],
+                        "success": result["success"],
+                        "title": result["title"],
+                        "content": result["markdown"] if result["success"] else result["message"]
+                    })
+                else:
+                    yield self.create_json_message({
+                        "success": True,
+                        "total": event["total"],
+                        "converted": event["converted"],
+                        "truncated": event["truncated"]
+                    })
+        except SearchError as e:
+            yield self.create_json_message({
+                "success": False,
+                "message": str(e)
+            })
@@ -0,0 +1,103 @@
+from collections.abc import Generator
+from typing import Any
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from unit.confluence_session import ConfluenceSession
+from unit.page_search import SearchError
+from unit.page_sync import CheckpointError, PageSync, checkpoint_key, load_checkpoint, save_checkpoint
+from unit.table_grid import TABLE_FORMATS
+
+
+class SyncPagesTool(Tool):
+    """Tool for returning the pages created, updated or deleted since the previous sync."""
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # Get required parameters
+        cql = (tool_parameters.get("cql") or "").strip()
+        base_url = self.runtime.credentials.get('baseUrl')
+        username = self.runtime.credentials.get('userName')
+        password = self.runtime.credentials.get('password')
+        table_format = tool_parameters.get("table_format") or "markdown"
+
+        if not cql:
+            yield self.create_text_message(text="CQL is required")
+            return
+
+        if not all([base_url, username, password]):
+            yield self.create_text_message(text="Missing required credentials")
+            return
+
+        if table_format not in TABLE_FORMATS:
+            yield self.create_text_message(text="参数错误")
+            return
+
+        session = ConfluenceSession(base_url, username, password)
+        auth_result = session.ensure_authenticated()
+        if not auth_result["success"]:
+            yield self.create_text_message(text=auth_result["message"])
+            return
+
+        key = checkpoint_key(base_url, username, cql, tool_parameters.get("sync_key") or "")
+        checkpoint = None if tool_parameters.get("reset", False) else load_checkpoint(self.session.storage, key)
+        sync = PageSync(
+            session, cql, checkpoint,
+            max_pages=int(tool_parameters.get("max_pages") or 200),
+            detect_deletes=tool_parameters.get("detect_deletes", False),
+            max_workers=int(tool_parameters.get("max_workers") or 4),
+            add_level_mark=tool_parameters.get("add_level_mark", False),
+            mark_prefix=tool_parameters.get("mark_prefix") or "L_",
+            table_format=table_format,
+        )
+        counts = {"created": 0, "updated": 0, "deleted": 0, "failed": 0}
+        # Stream every change as soon as it is known
+        try:
+            for event in sync.run():
+                if event["change"] == "deleted":
+                    counts["deleted"] += 1
+                    yield self.create_json_message({
+                        "pageId": event["page_id"],
+                        "change": "deleted",
+                        "title": event["title"]
+                    })
+                    continue
+                result = event["result"]
+                counts[event["change"] if result["success"] else "failed"] += 1
+                yield self.create_json_message({
+                    "pageId": event["page_id"],
+                    "change": event["change"],
+                    "success": result["success"],
+                    "title": event["title"],
+                    "version": event["version"],
+                    "content": result["markdown"] if result["success"] else result["message"]
+                })
+        except SearchError as e:
+            # 查询失败时保留原检查点，下次运行重新计算变更
+            yield self.create_json_message({
+                "success": False,
+                "message": str(e)
+            })
+            return
+
+        try:
+            save_checkpoint(self.session.storage, key, sync.checkpoint)
+            save_error = None
+        except CheckpointError as e:
+            # 变更已经返回，但水位线未前进，下次运行会再次返回这些变更
+            save_error = str(e)
+        summary = {
+            "success": save_error is None,
+            "firstRun": checkpoint is None,
+            **counts,
+            "unchanged": sync.unchanged,
+            "truncated": sync.truncated,
+            "tracked": len(sync.checkpoint["pages"]),
+            "since": checkpoint["watermark"] if checkpoint else None,
+            "watermark": sync.checkpoint["watermark"] if save_error is None else (
+                checkpoint["watermark"] if checkpoint else None)
+        }
+        if save_error:
+            summary["message"] = save_error
+        if sync.delete_error:
+            # 删除检测失败不影响已返回的变更
+            summary["deleteError"] = sync.delete_error
+        yield self.create_json_message(summary)
@@ -0,0 +1,283 @@
+"""Content-addressed on-disk store for Confluence attachments."""
+
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, Iterable, Optional
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+
+from unit.confluence_session import STREAM_CHUNK_SIZE, ConfluenceSession
+
+# 存储文件扩展名允许的字符
+_EXTENSION_RE = re.compile(r'^\.[A-Za-z0-9]{1,10}$')
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when an attachment exceeds the per-file size limit."""
+
+
+def attachment_extension(filename: str, media_type: str = "") -> str:
+    """File extension of a stored attachment, taken from its name or media type."""
+    extension = os.path.splitext(filename)[1]
+    if not _EXTENSION_RE.match(extension):
+        extension = ""
+        if media_type:
+            extension = mimetypes.guess_extension(media_type.split(';')[0].strip()) or ""
+    return extension.lower()
+
+
+class AttachmentStore:
+    """Stores attachment bodies once per content hash.
+
+    Files are named ``<sha256><ext>`` and spread over ``<sha256[:2]>/``
+    subdirectories. Downloads are streamed to a temporary file while being
+    hashed, then moved into place, so an attachment is never held in memory.
+    An index keyed by (base_url, attachment id, version), kept in memory and
+    mirrored under ``index/``, lets repeated requests skip the download, also
+    after a restart; concurrent requests for the same attachment share a
+    single download. The least recently used files, index entries included,
+    are evicted once ``max_bytes`` is exceeded, except files pinned by an
+    invocation: every
+    entry returned by ``fetch`` stays pinned until it is passed to
+    ``release``, so the store may exceed its size while files are in use.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 1024 * 1024,
+                 max_file_bytes: int = 100 * 1024 * 1024):
+        """Initialize the store.
+
+        Args:
+            root: Directory holding the stored files
+            max_bytes: Maximum total size of the store in bytes
+            max_file_bytes: Maximum size of a single attachment in bytes
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.downloads = 0
+        self.hits = 0
+        self._index: Dict[Hashable, Dict[str, Any]] = {}
+        self._inflight: Dict[Hashable, Future] = {}
+        # 文件路径 -> 正在使用该文件的调用数，被固定的文件不会被淘汰
+        self._pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "index"), exist_ok=True)
+        self._size = sum(size for _, size in self._iter_files())
+
+    @classmethod
+    def from_env(cls) -> "AttachmentStore":
+        """Build a store from CONFLUENCE_ATTACHMENT_* environment variables."""
+        return cls(
+            root=os.environ.get("CONFLUENCE_ATTACHMENT_DIR")
+            or os.path.join(tempfile.gettempdir(), "confluence_attachments"),
+            max_bytes=int(os.environ.get("CONFLUENCE_ATTACHMENT_STORE_BYTES", 1024 * 1024 * 1024)),
+            max_file_bytes=int(os.environ.get("CONFLUENCE_ATTACHMENT_MAX_BYTES", 100 * 1024 * 1024)),
+        )
+
+    def _index_path(self, key: Hashable) -> str:
+        digest = hashlib.sha256("|".join(str(part) for part in key).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, "index", digest)
+
+    def _lookup(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Stored entry of an attachment version whose file still exists (lock held)."""
+        entry = self._index.get(key)
+        if entry is None:
+            try:
+                with open(self._index_path(key), 'r', encoding='utf-8') as f:
+                    name, size = f.read().split()
+            except (OSError, ValueError):
+                return None
+            entry = {"sha256": os.path.splitext(name)[0], "name": name, "path": self.path_for(name),
+                     "size": int(size)}
+        try:
+            # 更新访问时间，淘汰时按最近使用排序
+            os.utime(entry["path"])
+        except OSError:
+            self._index.pop(key, None)
+            return None
+        try:
+            os.utime(self._index_path(key))
+        except OSError:
+            # 索引文件已被淘汰，内存中的条目仍然有效
+            pass
+        self._index[key] = entry
+        return entry
+
+    def _remember(self, key: Hashable, entry: Dict[str, Any]) -> None:
+        self._index[key] = entry
+        path = self._index_path(key)
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"{entry['name']} {entry['size']}")
+            # 索引文件计入存储大小，与附件一起按最近使用淘汰
+            self._size += os.path.getsize(path) - previous
+        except OSError:
+            # 索引写入失败只影响重启后的去重
+            pass
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _pin(self, path: str) -> None:
+        """Protect a file from eviction until it is released (lock held)."""
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def release(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Unpin entries returned by ``fetch`` once their files are no longer read.
+
+        If pinned files kept the store over its size, eviction runs again.
+        """
+        with self._lock:
+            for entry in entries:
+                count = self._pins.get(entry["path"], 0) - 1
+                if count > 0:
+                    self._pins[entry["path"]] = count
+                else:
+                    self._pins.pop(entry["path"], None)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def path_for(self, name: str) -> str:
+        """Absolute path of a stored file name (``<sha256><ext>``)."""
+        return os.path.join(self.root, name[:2], name)
+
+    def fetch(self, session: ConfluenceSession, attachment: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the stored entry of an attachment, downloading it if needed.
+
+        Args:
+            session: Session used for the download
+            attachment: Attachment dict as yielded by ``ConfluenceSession.iter_attachments``
+
+        Returns:
+            Dict with sha256, name (stored file name), path, size and
+            from_store; the file is pinned until the entry is passed to
+            ``release``
+
+        Raises:
+            requests.RequestException, RetryError: If the download fails
+            AttachmentTooLarge: If the attachment exceeds ``max_file_bytes``
+        """
+        key = (session.base_url, attachment["id"], attachment.get("version"))
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                self._pin(entry["path"])
+                return {**entry, "from_store": True}
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            # 其他线程正在下载同一个附件，等待其结果
+            entry = future.result()
+            with self._lock:
+                if os.path.exists(entry["path"]):
+                    self._pin(entry["path"])
+                    return {**entry, "from_store": True}
+            # 下载完成后、固定之前已被淘汰，重新获取
+            return self.fetch(session, attachment)
+
+        try:
+            entry = self._download(session, attachment)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        with self._lock:
+            self._remember(key, entry)
+        future.set_result(entry)
+        return {**entry, "from_store": False}
+
+    def _download(self, session: ConfluenceSession, attachment: Dict[str, Any]) -> Dict[str, Any]:
+        """Stream an attachment into the store while hashing it."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                response = session.open_download(attachment["download_url"])
+                try:
+                    for block in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                        size += len(block)
+                        if size > self.max_file_bytes:
+                            raise AttachmentTooLarge(f"附件超过大小限制 {self.max_file_bytes} 字节")
+                        digest.update(block)
+                        f.write(block)
+                finally:
+                    response.close()
+            with self._lock:
+                self.downloads += 1
+
+            name = digest.hexdigest() + attachment_extension(attachment.get("filename", ""),
+                                                             attachment.get("media_type", ""))
+            path = self.path_for(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._lock:
+                if os.path.exists(path):
+                    # 相同内容已存在（例如被多个页面引用），只更新访问时间
+                    os.remove(tmp_path)
+                    os.utime(path)
+                    self._pin(path)
+                else:
+                    os.replace(tmp_path, path)
+                    self._size += size
+                    # 在淘汰之前固定，新文件不会被删除
+                    self._pin(path)
+                    if self._size > self.max_bytes:
+                        self._evict()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"sha256": digest.hexdigest(), "name": name, "path": path, "size": size}
+
+    def _iter_files(self):
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.is_file():
+                    yield entry, entry.stat().st_size
+
+    def _evict(self) -> None:
+        """Remove least recently used unpinned files until the store fits again (lock held)."""
+        files = sorted(self._iter_files(), key=lambda item: item[0].stat().st_mtime)
+        removed = set()
+        for entry, size in files:
+            if self._size <= self.max_bytes:
+                break
+            if entry.path in self._pins:
+                continue
+            try:
+                os.remove(entry.path)
+                self._size -= size
+                removed.add(entry.path)
+            except OSError:
+                continue
+        if removed:
+            self._index = {key: item for key, item in self._index.items() if item["path"] not in removed}
+
+    def stats(self) -> Dict[str, int]:
+        """Download/hit counters and the current store size."""
+        with self._lock:
+            return {"downloads": self.downloads, "hits": self.hits, "bytes": self._size}
+
+
+_attachment_store: Optional[AttachmentStore] = None
+_attachment_store_lock = threading.Lock()
+
+
+def get_attachment_store() -> AttachmentStore:
+    """Process-wide attachment store, created on first use rather than at import."""
+    global _attachment_store
+    with _attachment_store_lock:
+        if _attachment_store is None:
+            _attachment_store = AttachmentStore.from_env()
+        return _attachment_store
@@ -1,32 +1,54 @@
+from html.entities import name2codepoint
 from html.parser import HTMLParser
+from urllib.parse import quote
+import html
 import re
 
+from unit.table_grid import MAX_COLSPAN, TABLE_FORMATS, TableGrid, parse_span
+
+# 解析器输出格式版本，转换结果发生变化时递增，用于使 Markdown 渲染缓存失效
+PARSER_VERSION = 3
+
+# XHTML 实体集合（HTML 4 实体加 apos），与 lxml 后端声明的实体一致
+XHTML_ENTITIES = {**name2codepoint, "apos": 0x27}
+
 def extract_language(parameters):
     """从 data-macro-parameters 中提取语言信息"""
     match = re.search(r'language=(\w+)', parameters)
     lang = match.group(1) if match else 'plaintext'
-    if lang == 'js':
-        print(lang)
     return lang
 
 
 class ConfluenceHTMLParser(HTMLParser):
     """HTML parser for converting Confluence page content to Markdown format."""
-    def __init__(self, add_level_mark: bool = False, mark_prefix: str = "L_"):
+    def __init__(self, add_level_mark: bool = False, mark_prefix: str = "L_", chunker=None,
+                 table_format: str = "markdown", attachment_links=None):
         # 设置convert_charrefs=False以确保CDATA内容被正确处理
         super().__init__(convert_charrefs=False)
-        super().__init__(convert_charrefs=False)
-        # 存储最终 Markdown 的各行
+        if table_format not in TABLE_FORMATS:
+            raise ValueError(f"不支持的表格格式: {table_format}")
+        # 表格输出格式：markdown / html / csv / json / auto
+        self.table_format = table_format
+        # 分段输出：设置 MarkdownChunker 后，输出行交给分段器而不再写入 md_lines
+        self.chunker = chunker
+        # 附件文件名到链接地址的映射；为 None 时图片和附件引用不输出
+        self.attachment_links = attachment_links
+        # 正在处理的 ac:image / ac:link 引用：{kind, alt, filename, url, foreign, text, mark}
+        self.reference = None
+        self.in_attachment = False
+        # 存储最终 Markdown 的各物理行（写入时即已合并连续空行）
         self.md_lines = []
-        # 当前累积的普通文本（或单元格内容）
-        self.current_text = ""
+        # 上一输出行是否为空行
+        self.prev_line_empty = False
+        # 当前累积的普通文本片段（使用列表拼接，避免字符串反复 += 带来的二次复制）
+        self.current_text = []
         # 是否添加层级标记
         self.add_level_mark = add_level_mark
         self.mark_prefix = mark_prefix
         
         # 代码块相关
         self.in_pre = False
-        self.current_code_text = ""
+        self.current_code_text = []
         # 内联代码标记
         self.in_inline_code = False
         # 表格中的pre标签标识
@@ -40,9 +62,12 @@ class ConfluenceHTMLParser(HTMLParser):
         self.in_table = False
         self.current_table = []   # 每一项为一行：列表中存放 cell 字典
         # 当前行（列表），每个 cell 为字典 {text, cell_type, rowspan, colspan}
+        # 单元格构造期间 text 为片段列表，单元格结束时拼接为字符串
         self.current_row = []
         self.in_cell = False      # 正在处理表格单元格
         self.cell_info = None     # 正在构造的单元格信息
+        # 嵌套表格开始时保存外层表格的状态 (current_table, current_row, in_cell, cell_info)
+        self.table_stack = []
 
         # 代码宏相关（独立的代码块）
         self.in_code_macro = False
@@ -58,6 +83,11 @@ class ConfluenceHTMLParser(HTMLParser):
         self.in_cdata = False
         # 标识是否处于ac:parameter标签中
         self.in_parameter = False
+        # 标识是否处于代码宏的 language 参数中（流式输入时参数值可能被分多次传入）
+        self.in_language_parameter = False
+
+        # 流式输出相关：是否已输出过内容
+        self.drained_any = False
 
     def handle_starttag(self, tag, attrs):
         attr_dict = dict(attrs)
@@ -75,6 +105,12 @@ class ConfluenceHTMLParser(HTMLParser):
             else:
                 # 普通表格
                 self.flush_current_text()
+                if self.in_table:
+                    # 嵌套表格：保存外层表格状态，内层结束后恢复
+                    self.table_stack.append((self.current_table, self.current_row, self.in_cell, self.cell_info))
+                    self.current_row = []
+                    self.in_cell = False
+                    self.cell_info = None
                 self.in_table = True
                 self.current_table = []
                 return
@@ -89,13 +125,14 @@ class ConfluenceHTMLParser(HTMLParser):
             self.in_parameter = True
             if self.in_code_cell and attr_dict.get("ac:name") == "language":
                 self.code_macro_language = None  # 等待handle_data设置语言
+                self.in_language_parameter = True
             return
 
         # 处理代码宏的文本体
         if self.in_code_cell and tag == "ac:plain-text-body":
             self.in_code_text_body = True
             if self.in_table and self.in_cell:
-                self.cell_info["text"] += f"`{self.code_macro_language} "
+                self.cell_info["text"].append(f"`{self.code_macro_language} ")
             else:
                 self.add_line(f"\n```{self.code_macro_language}")
             return
@@ -104,6 +141,11 @@ class ConfluenceHTMLParser(HTMLParser):
         if self.in_code_table and tag != "pre":
             return
 
+        if self.attachment_links is not None and tag in ('ac:image', 'ac:link', 'ri:attachment',
+                                                         'ri:url', 'ri:page', 'ri:blog-post'):
+            self.start_reference(tag, attr_dict)
+            return
+
         if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
             self.flush_current_text()
             self.in_heading = True
@@ -111,27 +153,27 @@ class ConfluenceHTMLParser(HTMLParser):
         elif tag == 'p':
             self.flush_current_text()
         elif tag == 'br':
-            self.current_text += "\n"
+            self.current_text.append("\n")
         elif tag == 'pre':
             self.flush_current_text()
             # 若当前处于代码块宏 table，则按代码块处理
             if self.in_code_table:
                 self.in_pre = True
-                self.current_code_text = ""
+                self.current_code_text = []
                 # 如果嵌套在普通表格单元格中，代码块将追加到 cell 文本中
                 if self.in_table and self.in_cell:
-                    self.cell_info["text"] += f"`{self.code_macro_language} "
+                    self.cell_info["text"].append(f"`{self.code_macro_language} ")
                 else:
                     self.add_line(f"\n```{self.code_macro_language}")
                 return
             # 普通 pre 标签（可能在表格中或页面中）
             elif self.in_table and self.in_cell:
                 self.in_pre = True
-                self.current_code_text = ""
+                self.current_code_text = []
                 self.table_pre = True
             else:
                 self.in_pre = True
-                self.current_code_text = ""
+                self.current_code_text = []
                 if self.in_code_macro and self.code_macro_language:
                     self.add_line(f"\n```{self.code_macro_language}")
                 else:
@@ -139,7 +181,7 @@ class ConfluenceHTMLParser(HTMLParser):
         elif tag == 'code':
             # 内联代码
             if not self.in_pre:
-                self.current_text += "`"
+                self.current_text.append("`")
                 self.in_inline_code = True
         elif tag == 'tr':
             if self.in_table:
@@ -148,27 +190,109 @@ class ConfluenceHTMLParser(HTMLParser):
             if self.in_table:
                 self.in_cell = True
                 # 初始化单元格数据，提取 rowspan 与 colspan 属性
-                rowspan = int(attr_dict.get("rowspan", "1"))
-                colspan = int(attr_dict.get("colspan", "1"))
+                rowspan = parse_span(attr_dict.get("rowspan"))
+                colspan = parse_span(attr_dict.get("colspan"), MAX_COLSPAN)
                 self.cell_info = {
-                    "text": "",
+                    "text": [],
                     "cell_type": tag,
                     "rowspan": rowspan,
                     "colspan": colspan
                 }
 
+    def _inline_target(self):
+        """当前内联文本的写入位置：表格单元格或普通文本"""
+        if self.in_table and self.in_cell:
+            return self.cell_info["text"]
+        return self.current_text
+
+    def start_reference(self, tag, attr_dict):
+        """记录图片（ac:image）与附件链接（ac:link + ri:attachment）的引用信息"""
+        if tag in ('ac:image', 'ac:link'):
+            text = self._inline_target()
+            self.reference = {
+                "kind": "image" if tag == 'ac:image' else "link",
+                "alt": attr_dict.get("ac:alt") or attr_dict.get("ac:title") or "",
+                "filename": None,
+                "url": None,
+                "foreign": False,
+                # 链接正文写入的位置与起点，结束时取出作为链接文字
+                "text": text,
+                "mark": len(text),
+            }
+        elif self.reference is None:
+            return
+        elif tag == 'ri:attachment':
+            self.in_attachment = True
+            self.reference["filename"] = attr_dict.get("ri:filename")
+        elif tag == 'ri:url':
+            self.reference["url"] = attr_dict.get("ri:value")
+        elif self.in_attachment:
+            # ri:attachment 内的 ri:page / ri:blog-post 表示其他页面的附件
+            self.reference["foreign"] = True
+
+    def end_reference(self, tag):
+        if tag == 'ri:attachment':
+            self.in_attachment = False
+            return
+        reference = self.reference
+        self.reference = None
+        if reference is None:
+            return
+        filename = reference["filename"]
+        if filename:
+            link = None if reference["foreign"] else self.attachment_links.get(filename)
+            target = link or quote(filename)
+        elif reference["url"] and reference["kind"] == "image":
+            target = reference["url"]
+        else:
+            # 非附件链接（页面、用户等）保持原有输出
+            return
+
+        text = reference["text"]
+        same_target = text is self._inline_target()
+        if reference["kind"] == "image":
+            label = reference["alt"] or filename or ""
+        else:
+            label = ""
+            if same_target:
+                label = "".join(text[reference["mark"]:]).strip()
+                del text[reference["mark"]:]
+            label = label or filename
+        label = label.replace('[', '\\[').replace(']', '\\]')
+        self._inline_target().append(f"{'!' if reference['kind'] == 'image' else ''}[{label}]({target})")
+
     def add_line(self, line):
-        """添加行到 markdown 输出中，避免连续空行"""
-        # 如果是空行
-        if not line.strip():
-            # 如果列表为空或者最后一行不是空行，才添加这个空行
-            if not self.md_lines or self.md_lines[-1].strip():
-                self.md_lines.append(line)
-            # 如果最后一行已经是空行，则跳过这个空行，避免连续空行
+        """
+        添加内容到 markdown 输出中。
+        内容按物理行展开并在写入时合并连续空行，输出时只需一次拼接。
+        """
+        for physical_line in line.split('\n'):
+            # 如果当前行是空行，只有在前一行不是空行时才添加，避免连续空行
+            if not physical_line.strip():
+                if not self.prev_line_empty:
+                    self._write_line(physical_line)
+                    self.prev_line_empty = True
+            else:
+                # 非空行直接添加
+                self._write_line(physical_line)
+                self.prev_line_empty = False
+
+    def _write_line(self, line):
+        if self.chunker is not None:
+            self.chunker.add_line(line)
+        else:
+            self.md_lines.append(line)
+
+    def end_block(self, kind="text"):
+        """
+        标记一个完整块（段落、标题、表格、代码块）的结束，分段器只在块之间切分。
+        表格或代码块内部的调用会被忽略，保证它们不会被拆开。
+        """
+        if self.chunker is None:
             return
-        
-        # 非空行直接添加
-        self.md_lines.append(line)
+        if self.in_table or self.in_pre or self.in_code_text_body or self.in_code_table:
+            return
+        self.chunker.end_block(kind)
 
     def unknown_decl(self, data):
         """
@@ -181,14 +305,25 @@ class ConfluenceHTMLParser(HTMLParser):
                 if self.in_table and self.in_cell:
                     # 在表格单元格中，将换行符替换为空格，避免破坏markdown表格格式
                     content = content.replace('\n', ' ')
-                    self.cell_info["text"] += content
+                    self.cell_info["text"].append(content)
                 else:
-                    self.current_code_text += content
+                    self.current_code_text.append(content)
+
+    def handle_entityref(self, name):
+        # convert_charrefs=False 时实体单独回调，解码后按普通文本处理；未知实体忽略
+        codepoint = XHTML_ENTITIES.get(name)
+        if codepoint is not None:
+            self.handle_data(chr(codepoint))
+
+    def handle_charref(self, name):
+        self.handle_data(html.unescape(f"&#{name};"))
 
     def handle_data(self, data):
         # 如果在parameter标签中且不是language参数，直接返回
         if self.in_parameter:
-            if self.code_macro_language is None:
+            if self.in_language_parameter:
+                self.code_macro_language = (self.code_macro_language or "") + data
+            elif self.code_macro_language is None:
                 self.code_macro_language = data
             return
 
@@ -202,30 +337,30 @@ class ConfluenceHTMLParser(HTMLParser):
                 data = data.split("]]")[0]
 
             if self.in_table and self.in_cell:
-                self.cell_info["text"] += data.replace('\n', ' ')
+                self.cell_info["text"].append(data.replace('\n', ' '))
             else:
-                self.current_code_text += data
+                self.current_code_text.append(data)
             return
 
         # 若处于代码块宏 table 中且在 pre 内，则收集代码文本
         if self.in_code_table and self.in_pre:
             if self.in_table and self.in_cell:
-                self.current_code_text += data.replace('\n', ' ')
+                self.current_code_text.append(data.replace('\n', ' '))
             else:
-                self.current_code_text += data
+                self.current_code_text.append(data)
             return
 
         # 在普通表格单元格内，将文本追加到当前 cell
         if self.in_table and self.in_cell:
-            self.cell_info["text"] += data
+            self.cell_info["text"].append(data)
         elif self.in_pre:
             # 普通 pre 标签处理
             if hasattr(self, "table_pre") and self.table_pre:
-                self.cell_info["text"] += data
+                self.cell_info["text"].append(data)
             else:
-                self.current_code_text += data
+                self.current_code_text.append(data)
         else:
-            self.current_text += data
+            self.current_text.append(data)
 
     def handle_endtag(self, tag):
         # 处理代码宏的结束标签
@@ -235,169 +370,151 @@ class ConfluenceHTMLParser(HTMLParser):
 
         if tag == "ac:parameter":
             self.in_parameter = False
+            self.in_language_parameter = False
             return
 
         if tag == "ac:plain-text-body" and self.in_code_text_body:
             self.in_code_text_body = False
             if self.in_table and self.in_cell:
-                self.cell_info["text"] += "`"
+                self.cell_info["text"].append("`")
             else:
-                self.add_line(self.current_code_text)
+                self.add_line("".join(self.current_code_text))
                 self.add_line("```\n")
-                self.current_code_text = ""
+                self.current_code_text = []
+                self.end_block("code")
             return
 
         # 如果处于代码块宏 table 中，但标签不是 pre 或 table，则忽略结束标签
         if self.in_code_table and tag not in ['pre', 'table']:
             return
 
+        if self.attachment_links is not None and tag in ('ac:image', 'ac:link', 'ri:attachment'):
+            self.end_reference(tag)
+            return
+
         if tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            heading_text = self.current_text.strip()
+            heading_text = "".join(self.current_text).strip()
+            if self.chunker is not None and not self.in_table:
+                self.chunker.start_section(self.heading_level, heading_text)
             # 根据是否添加层级标记生成标题
             if self.add_level_mark:
                 self.add_line("\n" + ("#" * self.heading_level) + " " + self.mark_prefix + str(self.heading_level) + " " + heading_text + "\n")
             else:
                 self.add_line("\n" + ("#" * self.heading_level) + " " + heading_text + "\n")
+            self.end_block("heading")
 
-            self.current_text = ""
+            self.current_text = []
             self.in_heading = False
             self.heading_level = 0
         elif tag == 'p':
-            self.add_line(self.current_text.strip() + "\n")
-            self.current_text = ""
+            self.add_line("".join(self.current_text).strip() + "\n")
+            self.current_text = []
+            self.end_block()
         elif tag == 'code':
             if self.in_inline_code:
-                self.current_text += "`"
+                self.current_text.append("`")
                 self.in_inline_code = False
         elif tag == 'pre':
             if self.in_code_table:
                 self.in_pre = False
                 if self.in_table and self.in_cell:
                     # 在表格中使用单行代码格式
-                    self.cell_info["text"] += self.current_code_text.replace(
-                        '\n', ' ') + "`"
+                    self.cell_info["text"].append("".join(self.current_code_text).replace('\n', ' '))
+                    self.cell_info["text"].append("`")
                 else:
                     # 页面中使用多行代码块格式
-                    self.add_line(self.current_code_text)
+                    self.add_line("".join(self.current_code_text))
                     self.add_line("```\n")
-                self.current_code_text = ""
+                self.current_code_text = []
             elif hasattr(self, "table_pre") and self.table_pre:
                 self.in_pre = False
                 self.table_pre = False
             else:
                 self.in_pre = False
-                self.add_line(self.current_code_text)
+                self.add_line("".join(self.current_code_text))
                 self.add_line("```\n")
-                self.current_code_text = ""
+                self.current_code_text = []
+                self.end_block("code")
         elif tag == 'table':
             if self.in_code_table:
                 # 结束代码块宏 table，不生成表格 Markdown
                 self.in_code_table = False
                 self.in_code_macro = False
                 self.code_macro_language = None
+                self.end_block("code")
                 return
             elif self.in_table:
                 self.flush_current_text()
-                table_md = self.convert_table_to_markdown(self.current_table)
-                # 如果当前在表格单元格内，将生成的表格 Markdown 追加到 cell 文本中
-                if self.in_table and self.in_cell:
-                    self.cell_info["text"] += "\n" + table_md + "\n"
-                else:
-                    self.add_line("\n" + table_md + "\n")
+                grid = TableGrid.from_rows(self.current_table)
+                if self.table_stack:
+                    # 嵌套表格渲染为单行 HTML 追加到外层单元格，避免 | 破坏外层表格
+                    self.current_table, self.current_row, self.in_cell, self.cell_info = self.table_stack.pop()
+                    if self.in_cell:
+                        self.cell_info["text"].append(grid.to_html(compact=True))
+                        self.cell_info["nested_html"] = True
+                    return
+                self.add_line("\n" + grid.render(self.table_format) + "\n")
                 self.in_table = False
                 self.current_table = []
+                self.end_block("table")
                 return
         elif tag == 'tr':
             if self.in_table:
-                if self.current_row:
-                    self.current_table.append(self.current_row)
+                # 空行同样计入行数，以保证跨行单元格对齐
+                self.current_table.append(self.current_row)
                 self.current_row = []
         elif tag in ['td', 'th']:
             if self.in_table and self.in_cell:
+                self.cell_info["text"] = "".join(self.cell_info["text"])
                 self.current_row.append(self.cell_info)
                 self.in_cell = False
                 self.cell_info = None
 
     def flush_current_text(self):
-        if self.current_text.strip():
-            self.add_line(self.current_text.strip())
-            self.current_text = ""
+        text = "".join(self.current_text).strip()
+        # 仅含空白的文本之后只会被 strip 掉，直接清空即可
+        self.current_text = []
+        if text:
+            self.add_line(text)
+            self.end_block()
 
     def convert_table_to_markdown(self, table):
         """
         将解析后的表格数据转换为 Markdown 表格。
-        支持 rowspan 与 colspan（采用简单算法逐行填充跨行单元格）。
-        对于包含代码块的单元格，会保留代码块中的换行符。
+        单元格按占位网格放置一次，重叠的 rowspan/colspan 由先放置的单元格占用。
+        """
+        return TableGrid.from_rows(table).to_markdown()
+
+    def drain_markdown(self, final=False):
+        """
+        返回自上次调用以来已经完成的 Markdown（流式输出用）。
+        已写入 md_lines 的段落、标题、表格和代码块都不会再改变，可以立即输出；
+        依次拼接每次返回的内容，结果与 get_markdown() 相同。
+        final=True 时会先输出尚未结束的普通文本。
         """
-        if not table:
+        if final:
+            self.flush_current_text()
+        if not self.md_lines:
             return ""
-        markdown_table = []
-        col_spans = []  # 每一列剩余跨行计数
-        num_cols = 0
-        for row in table:
-            markdown_row = []
-            col_index = 0
-            # 填充因跨行而空出的单元格
-            while col_index < len(col_spans) and col_spans[col_index] > 0:
-                markdown_row.append("   ")
-                col_spans[col_index] -= 1
-                col_index += 1
-            for cell in row:
-                # 填充前置空白（极端情况）
-                while col_index < len(col_spans) and col_spans[col_index] > 0:
-                    markdown_row.append("   ")
-                    col_spans[col_index] -= 1
-                    col_index += 1
-                text = cell.get("text", "").strip()
-                text = text.replace('\n', ' ')  # 将所有换行符替换为空格
-                rowspan = cell.get("rowspan", 1)
-                colspan = cell.get("colspan", 1)
-                markdown_row.append(text)
-                for _ in range(colspan - 1):
-                    markdown_row.append("   ")
-                for _ in range(colspan):
-                    if col_index < len(col_spans):
-                        col_spans[col_index] = rowspan - \
-                            1 if rowspan > 1 else 0
-                    else:
-                        col_spans.append(rowspan - 1 if rowspan > 1 else 0)
-                    col_index += 1
-            while col_index < len(col_spans) and col_spans[col_index] > 0:
-                markdown_row.append("   ")
-                col_spans[col_index] -= 1
-                col_index += 1
-            if not markdown_table:
-                num_cols = len(markdown_row)
-            row_str = "| " + " | ".join(markdown_row) + " |"
-            markdown_table.append(row_str)
-        if len(markdown_table) > 1:
-            header_sep = "| " + " | ".join(["---"] * num_cols) + " |"
-            markdown_table.insert(1, header_sep)
-        return "\n".join(markdown_table) + "\n"
+
+        text = "\n".join(self.md_lines)
+        self.md_lines = []
+        if self.drained_any:
+            text = "\n" + text
+        self.drained_any = True
+        return text
+
+    def drain_chunks(self, final=False):
+        """
+        返回自上次调用以来已完成的分段（需在构造时传入 chunker）。
+        final=True 时结束最后一个分段。
+        """
+        if final:
+            self.flush_current_text()
+            return self.chunker.finish()
+        return self.chunker.drain()
 
     def get_markdown(self):
         self.flush_current_text()
-        
-        # 先将所有行连接起来，然后按行重新分割
-        raw_content = "\n".join(self.md_lines)
-        all_lines = raw_content.split('\n')
-        
-        # 处理连续空行，保留一个空行
-        cleaned_lines = []
-        prev_line_empty = False
-        
-        for line in all_lines:
-            is_empty = not line.strip()
-            
-            # 如果当前行是空行
-            if is_empty:
-                # 只有在前一行不是空行时才添加这个空行
-                if not prev_line_empty:
-                    cleaned_lines.append(line)
-                prev_line_empty = True
-            else:
-                # 非空行直接添加
-                cleaned_lines.append(line)
-                prev_line_empty = False
-        
-        return "\n".join(cleaned_lines)
\ No newline at end of file
+        # md_lines 在写入时已按物理行合并过连续空行，直接拼接即可
+        return "\n".join(self.md_lines)
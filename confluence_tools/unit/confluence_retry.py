@@ -0,0 +1,274 @@
+"""Retry, backoff and circuit breaking for Confluence requests."""
+
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from urllib.parse import urlparse
+import datetime
+import os
+import random
+import threading
+import time
+
+# 限流与网关类错误，可以安全重试
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+
+class RetryError(Exception):
+    """Base class of errors raised by the retry layer instead of sending a request."""
+
+
+class DeadlineExceeded(RetryError):
+    """The total time budget of the invocation is used up."""
+
+
+class CircuitOpenError(RetryError):
+    """The circuit breaker of the host is open."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date.
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honors ``Retry-After``."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 deadline: float = 120.0, status_codes=RETRY_STATUS_CODES):
+        """Initialize the policy.
+
+        Args:
+            max_attempts: Maximum attempts per request, including the first one
+            base_delay: Backoff ceiling of the first retry in seconds
+            max_delay: Upper bound of a single backoff in seconds
+            deadline: Total seconds budget of one tool invocation
+            status_codes: HTTP status codes that are retried
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.status_codes = frozenset(status_codes)
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build a policy from CONFLUENCE_RETRY_* environment variables."""
+        return cls(
+            max_attempts=int(os.environ.get("CONFLUENCE_RETRY_ATTEMPTS", 4)),
+            base_delay=float(os.environ.get("CONFLUENCE_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.environ.get("CONFLUENCE_RETRY_MAX_DELAY", 20)),
+            deadline=float(os.environ.get("CONFLUENCE_REQUEST_DEADLINE", 120)),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter backoff before retry number ``attempt`` (starting at 1)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number ``attempt``.
+
+        A server-provided Retry-After is a lower bound; a little jitter is
+        added so that throttled callers do not come back in lockstep.
+        """
+        if retry_after is None:
+            return self.backoff(attempt)
+        return retry_after + random.uniform(0, self.base_delay)
+
+
+class Deadline:
+    """Total time budget shared by every request of one invocation."""
+
+    def __init__(self, seconds: Optional[float]):
+        """Initialize the deadline.
+
+        Args:
+            seconds: Budget in seconds, None or a non-positive value disables it
+        """
+        self.expires_at = time.monotonic() + seconds if seconds and seconds > 0 else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when unlimited."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def allows(self, delay: float) -> bool:
+        """Whether waiting ``delay`` seconds still leaves time for another attempt."""
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+    def clamp(self, timeout: Tuple[float, float]) -> Tuple[float, float]:
+        """Shrink a (connect, read) timeout so a request cannot outlive the deadline."""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return (min(timeout[0], remaining), min(timeout[1], remaining))
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After ``failure_threshold`` consecutive failures (throttling, gateway
+    errors or connection errors) the circuit opens and requests fail fast for
+    ``reset_timeout`` seconds. Then a single trial request is let through: a
+    success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class CircuitBreakerRegistry:
+    """One CircuitBreaker per host, shared by every session of the process."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreakerRegistry":
+        """Build a registry from CONFLUENCE_BREAKER_* environment variables."""
+        return cls(
+            failure_threshold=int(os.environ.get("CONFLUENCE_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("CONFLUENCE_BREAKER_RESET", 30)),
+        )
+
+    def get(self, base_url: str) -> CircuitBreaker:
+        """Return the breaker of the host of ``base_url``."""
+        host = urlparse(base_url).netloc or base_url
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+
+# 进程内共享的重试策略与按主机划分的熔断器
+retry_policy = RetryPolicy.from_env()
+circuit_breakers = CircuitBreakerRegistry.from_env()
+
+
+def _check_send(breaker: CircuitBreaker, deadline: Deadline) -> None:
+    if deadline.expired():
+        raise DeadlineExceeded("Confluence 请求超出总时限")
+    if not breaker.allow():
+        raise CircuitOpenError("Confluence 服务暂时不可用（熔断中），请稍后重试")
+
+
+def _retry_delay(policy: RetryPolicy, attempt: int, deadline: Deadline,
+                 response: Any = None) -> Optional[float]:
+    """Delay before the next attempt, or None when no retry should happen."""
+    if attempt >= policy.max_attempts:
+        return None
+    retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+    delay = policy.delay(attempt, retry_after)
+    return delay if deadline.allows(delay) else None
+
+
+def send_with_retry(send: Callable[[Tuple[float, float]], Any], policy: RetryPolicy,
+                    breaker: CircuitBreaker, deadline: Deadline, timeout: Tuple[float, float],
+                    retry_exceptions: Tuple[Type[BaseException], ...] = (),
+                    sleep: Callable[[float], None] = time.sleep) -> Any:
+    """Send a request, retrying throttled and transient failures.
+
+    Args:
+        send: Callable performing one attempt with the given (connect, read) timeout
+        policy: Retry policy
+        breaker: Circuit breaker of the target host
+        deadline: Invocation deadline
+        timeout: (connect, read) timeout of a single attempt
+        retry_exceptions: Transport exceptions that are retried
+        sleep: Sleep function, replaceable in tests
+
+    Returns:
+        The last response; it may still carry a retryable status once the
+        attempts or the deadline are exhausted
+
+    Raises:
+        DeadlineExceeded: If the deadline expired before an attempt
+        CircuitOpenError: If the host circuit is open
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_send(breaker, deadline)
+        try:
+            response = send(deadline.clamp(timeout))
+        except Exception as e:
+            breaker.record_failure()
+            delay = _retry_delay(policy, attempt, deadline) if isinstance(e, retry_exceptions) else None
+            if delay is None:
+                raise
+            sleep(delay)
+            continue
+
+        if response.status_code not in policy.status_codes:
+            breaker.record_success()
+            return response
+        breaker.record_failure()
+        delay = _retry_delay(policy, attempt, deadline, response)
+        if delay is None:
+            return response
+        response.close()
+        sleep(delay)
+
@@ -1,93 +1,566 @@
 """Module for managing Confluence API sessions and authentication."""
 
-from typing import Dict, Any
+from collections.abc import Generator, Iterator
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlencode
+import hashlib
+import threading
+import time
+
 import requests
 
+from unit.confluence_retry import (CircuitBreakerRegistry, Deadline, RetryError, RetryPolicy,
+                                   circuit_breakers, retry_policy, send_with_retry)
+from unit.metrics import InvocationMetrics, timed_iter
+from unit.page_cache import PageContentCache, page_cache
+from unit.session_registry import ConfluenceSessionRegistry, session_registry
+from unit.storage_stream import StorageStream
+
+# 流式读取响应时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+# 流式读取时，不超过该长度的页面内容会写入内容缓存
+STREAM_CACHE_LIMIT = 4 * 1024 * 1024
+# 请求失败时可能抛出的异常：传输层异常，或重试层的超时/熔断
+REQUEST_ERRORS = (requests.RequestException, RetryError)
+# 可以安全重试的传输层异常
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+class CredentialValidationCache:
+    """Time-bounded cache of successful credential validations.
+
+    Entries are keyed by (base_url, username) and remember a fingerprint of the
+    password, so a changed password is treated as a cache miss.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        """Initialize the cache.
+
+        Args:
+            ttl: Seconds a successful validation stays valid
+        """
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(password: str) -> str:
+        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+    def is_valid(self, base_url: str, username: str, password: str) -> bool:
+        """Check whether the credentials were validated within the TTL."""
+        key = (base_url.rstrip('/'), username)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            fingerprint, validated_at = entry
+            if fingerprint != self._fingerprint(password) or time.monotonic() - validated_at > self.ttl:
+                del self._entries[key]
+                return False
+            return True
+
+    def mark_valid(self, base_url: str, username: str, password: str) -> None:
+        """Record a successful validation."""
+        key = (base_url.rstrip('/'), username)
+        with self._lock:
+            self._entries[key] = (self._fingerprint(password), time.monotonic())
+
+    def invalidate(self, base_url: str, username: str) -> None:
+        """Drop the cached validation, e.g. after a 401/403 response."""
+        with self._lock:
+            self._entries.pop((base_url.rstrip('/'), username), None)
+
+
+# 进程内共享的认证缓存
+validation_cache = CredentialValidationCache()
+
 
 class ConfluenceSession:
     """Manages Confluence API session and authentication."""
 
-    def __init__(self, base_url: str, username: str, password: str):
+    def __init__(self, base_url: str, username: str, password: str,
+                 credential_cache: Optional[CredentialValidationCache] = None,
+                 registry: Optional[ConfluenceSessionRegistry] = None,
+                 content_cache: Optional[PageContentCache] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None,
+                 deadline: Optional[float] = None,
+                 metrics: Optional[InvocationMetrics] = None,
+                 timeout: Optional[Tuple[float, float]] = None):
         """Initialize Confluence session with credentials.
-        
+
         Args:
             base_url: Base URL of the Confluence instance
             username: Confluence username
             password: Confluence password
+            credential_cache: Validation cache, defaults to the process-wide one
+            registry: Session registry, defaults to the process-wide one
+            content_cache: Page content cache, defaults to the process-wide one
+            retry: Retry policy, defaults to the process-wide one
+            breakers: Circuit breaker registry, defaults to the process-wide one
+            deadline: Total seconds budget of the requests made through this
+                session outside an ``operation`` scope, defaults to the policy
+                deadline
+            metrics: Metrics of the invocation using this session
+            timeout: (connect, read) timeout of a single request, defaults to
+                the registry timeouts
         """
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
-        self.session = requests.Session()
-        self.session.auth = (username, password)
+        self.registry = registry or session_registry
+        self.session = self.registry.get_session(self.base_url, username, password)
+        self.session_key = self.registry.session_key(self.base_url, username, password)
+        self.timeout = timeout or self.registry.timeout
         self.headers = {'Content-Type': 'application/json'}
+        self.credential_cache = credential_cache or validation_cache
+        self.content_cache = content_cache or page_cache
+        self.retry = retry or retry_policy
+        self.breaker = (breakers or circuit_breakers).get(self.base_url)
+        # 一次工具调用创建一个会话，总时限从创建时开始计算；多页面工具按页面分别计时
+        self.deadline = Deadline(self.retry.deadline if deadline is None else deadline)
+        self._operation = threading.local()
+        # 记录请求、重试、缓存命中与各阶段耗时
+        self.metrics = metrics or InvocationMetrics()
+
+    @contextmanager
+    def operation(self, seconds: Optional[float] = None) -> Iterator[Deadline]:
+        """Give the requests of one logical operation, e.g. one page of a batch, their own deadline.
+
+        Inside the scope, requests made by the current thread use a fresh
+        deadline instead of the session one, so tools handling many pages do
+        not run out of budget partway. Nested scopes share the outer deadline.
+
+        Args:
+            seconds: Budget of the operation, defaults to the policy deadline
+        """
+        current = getattr(self._operation, "deadline", None)
+        if current is not None:
+            yield current
+            return
+        self._operation.deadline = Deadline(self.retry.deadline if seconds is None else seconds)
+        try:
+            yield self._operation.deadline
+        finally:
+            self._operation.deadline = None
+
+    @property
+    def current_deadline(self) -> Deadline:
+        """Deadline of the running operation of this thread, or the session deadline."""
+        return getattr(self._operation, "deadline", None) or self.deadline
 
     @property
     def base_api_url(self) -> str:
         """Get the base API URL for Confluence."""
         return f"{self.base_url}/rest/api"
 
+    def _get(self, url: str, stream: bool = False, stage: str = "request") -> requests.Response:
+        """GET through the retry layer.
+
+        Throttling (429) and gateway errors are retried with jittered
+        exponential backoff honoring ``Retry-After``, within the current deadline.
+        The time until the response headers arrive is recorded under ``stage``.
+        """
+        attempts = 0
+
+        def send(timeout: Tuple[float, float]) -> requests.Response:
+            nonlocal attempts
+            attempts += 1
+            # 每次请求都刷新最近使用时间，避免长时间调用中的会话被当作空闲回收
+            self.registry.touch(self.session_key)
+            return self.session.get(url, headers=self.headers, timeout=timeout, stream=stream)
+
+        try:
+            with self.metrics.stage(stage):
+                return send_with_retry(send, self.retry, self.breaker, self.current_deadline, self.timeout,
+                                       retry_exceptions=RETRY_EXCEPTIONS)
+        finally:
+            self.metrics.incr("requests", attempts)
+            if attempts > 1:
+                self.metrics.incr("retries", attempts - 1)
+
     def validate_credentials(self) -> Dict[str, Any]:
         """Validate the provided credentials by making a test API call.
-        
+
         Returns:
             Dict containing success status and message
         """
         try:
             user_url = f"{self.base_api_url}/user/current"
-            response = self.session.get(user_url, headers=self.headers)
-            
+            response = self._get(user_url, stage="auth")
+
             if response.status_code == 200:
+                self.credential_cache.mark_valid(self.base_url, self.username, self.password)
                 return {
                     "success": True,
                     "message": "认证成功"
                 }
+            self.credential_cache.invalidate(self.base_url, self.username)
             return {
                 "success": False,
                 "message": f"登录失败，错误代码: {response.status_code}",
+                "status_code": response.status_code,
                 "details": response.text
             }
-        except requests.RequestException as e:
+        except REQUEST_ERRORS as e:
             return {
                 "success": False,
                 "message": "认证请求失败",
                 "details": str(e)
             }
 
-    def get_page_content(self, page_id: str) -> Dict[str, Any]:
+    def ensure_authenticated(self) -> Dict[str, Any]:
+        """Validate credentials unless a recent validation is cached.
+
+        Returns:
+            Dict containing success status and message
+        """
+        if self.credential_cache.is_valid(self.base_url, self.username, self.password):
+            self.metrics.incr("auth_cache_hits")
+            return {
+                "success": True,
+                "message": "认证成功"
+            }
+        return self.validate_credentials()
+
+    def _content_error(self, status_code: int) -> Dict[str, Any]:
+        if status_code in (401, 403):
+            # 凭据可能已失效，下次调用重新认证
+            self.credential_cache.invalidate(self.base_url, self.username)
+        return {
+            "success": False,
+            "results": "",
+            "title": "获取文档异常！",
+            "message": f"获取文档异常！异常代码：{status_code}"
+        }
+
+    def get_page_version(self, page_id: str) -> Dict[str, Any]:
+        """Probe the current version of a page without downloading its body.
+
+        Args:
+            page_id: ID of the Confluence page
+
+        Returns:
+            Dict containing version number, title, success status and message
+        """
+        try:
+            version_url = f"{self.base_api_url}/content/{page_id}?expand=version"
+            response = self._get(version_url, stage="probe")
+
+            if response.status_code == 200:
+                res_json = response.json()
+                return {
+                    "success": True,
+                    "version": res_json['version']['number'],
+                    "title": res_json['title'],
+                    "message": "获取文档版本成功"
+                }
+            return self._content_error(response.status_code)
+        except REQUEST_ERRORS as e:
+            return {
+                "success": False,
+                "message": f"请求失败 异常：{str(e)}"
+            }
+
+    def _probe_if_cached(self, page_id: str) -> Optional[Dict[str, Any]]:
+        """Probe the page version only when the content cache holds an entry for the page.
+
+        Returns:
+            Result of get_page_version, or None when a probe cannot save a download
+        """
+        if self.content_cache.known_version(self.base_url, str(page_id)) is None:
+            return None
+        return self.get_page_version(page_id)
+
+    def get_page_content(self, page_id: str, probe: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Fetch page content from Confluence.
-        
+
+        When the content cache holds an entry for the page, a cheap version
+        probe decides whether the cached body can be served; otherwise the
+        body and version are fetched in one request and seed the cache.
+
         Args:
             page_id: ID of the Confluence page
-            
+            probe: Result of a get_page_version call made by the caller, if any
+
         Returns:
-            Dict containing page content, title, success status and message
+            Dict containing page content, title, version, success status and message
         """
-        # First validate credentials
-        auth_result = self.validate_credentials()
+        # Validate credentials only when no recent validation is cached
+        auth_result = self.ensure_authenticated()
         if not auth_result["success"]:
             return auth_result
-            
+
+        probe = probe or self._probe_if_cached(page_id)
+        if probe is not None:
+            if not probe["success"]:
+                return probe
+            cached = self.content_cache.get(self.base_url, str(page_id), probe["version"])
+            if cached is not None:
+                self.metrics.incr("content_cache_hits")
+                return {
+                    "success": True,
+                    "results": cached["body"],
+                    "title": cached["title"],
+                    "version": probe["version"],
+                    "from_cache": True,
+                    "message": "获取文档成功"
+                }
+
         try:
-            search_url = f"{self.base_api_url}/content/{page_id}?expand=body.storage"
-            response = self.session.get(search_url, headers=self.headers)
-            
+            search_url = f"{self.base_api_url}/content/{page_id}?expand=body.storage,version"
+            response = self._get(search_url, stage="download")
+
             if response.status_code == 200:
+                self.metrics.incr("bytes_downloaded", len(response.content))
                 res_json = response.json()
+                body = res_json['body']['storage']['value']
+                version = res_json['version']['number']
+                self.content_cache.put(self.base_url, str(page_id), version, res_json['title'], body)
                 return {
                     "success": True,
-                    "results": res_json['body']['storage']['value'],
+                    "results": body,
                     "title": res_json['title'],
+                    "version": version,
+                    "from_cache": False,
                     "message": "获取文档成功"
                 }
+            return self._content_error(response.status_code)
+        except REQUEST_ERRORS as e:
             return {
                 "success": False,
-                "results": "",
-                "title": "获取文档异常！",
-                "message": f"获取文档异常！异常代码：{response.status_code}"
+                "message": f"请求失败 异常：{str(e)}"
             }
-        except requests.RequestException as e:
+
+    def stream_page_content(self, page_id: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                            probe: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fetch page content as a stream of storage HTML pieces.
+
+        The body is decoded incrementally from the HTTP response instead of
+        being loaded as a whole, so callers can start converting right away.
+        As in get_page_content, the version is only probed when the content
+        cache holds an entry for the page; otherwise title and version are
+        read from the response ahead of the body.
+
+        Args:
+            page_id: ID of the Confluence page
+            chunk_size: Bytes read from the response per iteration
+            probe: Result of a get_page_version call made by the caller, if any
+
+        Returns:
+            Dict containing success status, title, version, message and
+            ``chunks``, a generator of HTML pieces (only when successful)
+        """
+        auth_result = self.ensure_authenticated()
+        if not auth_result["success"]:
+            return auth_result
+
+        probe = probe or self._probe_if_cached(page_id)
+        if probe is not None:
+            if not probe["success"]:
+                return probe
+            cached = self.content_cache.get(self.base_url, str(page_id), probe["version"])
+            if cached is not None:
+                self.metrics.incr("content_cache_hits")
+                body = cached["body"]
+                chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+                return {
+                    "success": True,
+                    "chunks": chunks,
+                    "title": cached["title"],
+                    "version": probe["version"],
+                    "from_cache": True,
+                    "message": "获取文档成功"
+                }
+
+        try:
+            content_url = f"{self.base_api_url}/content/{page_id}?expand=body.storage,version"
+            response = self._get(content_url, stream=True, stage="download")
+        except REQUEST_ERRORS as e:
             return {
                 "success": False,
                 "message": f"请求失败 异常：{str(e)}"
-            } 
\ No newline at end of file
+            }
+        if response.status_code != 200:
+            response.close()
+            return self._content_error(response.status_code)
+
+        def counted(blocks):
+            for block in blocks:
+                self.metrics.incr("bytes_downloaded", len(block))
+                yield block
+
+        stream = StorageStream(counted(response.iter_content(chunk_size=chunk_size)))
+        if probe is None:
+            # 未经探测，标题与版本号从正文之前的元数据中读取
+            try:
+                with self.metrics.stage("download"):
+                    probe = stream.read_metadata()
+            except REQUEST_ERRORS as e:
+                response.close()
+                return {
+                    "success": False,
+                    "message": f"请求失败 异常：{str(e)}"
+                }
+        title = probe.get("title") or str(page_id)
+        version = probe.get("version")
+        return {
+            "success": True,
+            "chunks": self._iter_response_storage(response, stream, str(page_id), title, version),
+            "title": title,
+            "version": version,
+            "from_cache": False,
+            "message": "获取文档成功"
+        }
+
+    def _iter_response_storage(self, response: requests.Response, stream: StorageStream, page_id: str,
+                               title: str, version: Optional[int]) -> Generator[str, None, None]:
+        """Yield storage HTML pieces from a streamed response, caching small bodies of known versions."""
+        pieces = [] if version is not None else None
+        size = 0
+        try:
+            for piece in timed_iter(stream, self.metrics, "download"):
+                if pieces is not None:
+                    size += len(piece)
+                    if size <= STREAM_CACHE_LIMIT:
+                        pieces.append(piece)
+                    else:
+                        pieces = None
+                yield piece
+        finally:
+            response.close()
+        if pieces is not None:
+            self.content_cache.put(self.base_url, page_id, version, title, "".join(pieces))
+
+    def iter_child_pages(self, page_id: str, limit: int = 100) -> Generator[Dict[str, Any], None, None]:
+        """Iterate over the direct child pages of a page, following pagination.
+
+        Args:
+            page_id: ID of the parent page
+            limit: Page size of each listing request
+
+        Yields:
+            Child page dicts with id, title and version
+
+        Raises:
+            requests.RequestException: If a listing request fails
+            RetryError: If the deadline expired or the host circuit is open
+        """
+        next_url = f"{self.base_api_url}/content/{page_id}/child/page?limit={limit}&start=0&expand=version"
+        while next_url:
+            response = self._get(next_url, stage="children")
+            if response.status_code in (401, 403):
+                self.credential_cache.invalidate(self.base_url, self.username)
+            response.raise_for_status()
+            res_json = response.json()
+            results = res_json.get('results', [])
+            for child in results:
+                yield {
+                    "id": str(child['id']),
+                    "title": child.get('title', ''),
+                    "version": child.get('version', {}).get('number')
+                }
+
+            next_url = self._next_link(res_json)
+
+    def search(self, cql: str, limit: int = 25, next_url: Optional[str] = None) -> Dict[str, Any]:
+        """Run one page of a CQL content search.
+
+        Args:
+            cql: CQL query
+            limit: Number of results per page
+            next_url: ``next`` link returned by the previous page, if any
+
+        Returns:
+            Dict containing success status, results and the next page link
+        """
+        try:
+            if next_url:
+                url = next_url if next_url.startswith('http') else f"{self.base_url}{next_url}"
+            else:
+                query = urlencode({"cql": cql, "limit": limit, "expand": "space,version"})
+                url = f"{self.base_api_url}/content/search?{query}"
+            response = self._get(url, stage="search")
+            if response.status_code != 200:
+                if response.status_code in (401, 403):
+                    self.credential_cache.invalidate(self.base_url, self.username)
+                return {
+                    "success": False,
+                    "results": [],
+                    "message": f"搜索异常！异常代码：{response.status_code}"
+                }
+            res_json = response.json()
+            return {
+                "success": True,
+                "results": res_json.get('results', []),
+                "next": res_json.get('_links', {}).get('next'),
+                "message": "搜索成功"
+            }
+        except REQUEST_ERRORS as e:
+            return {
+                "success": False,
+                "results": [],
+                "message": f"请求失败 异常：{str(e)}"
+            }
+
+    def iter_attachments(self, page_id: str, limit: int = 100) -> Generator[Dict[str, Any], None, None]:
+        """Iterate over the attachments of a page, following pagination.
+
+        Args:
+            page_id: ID of the page owning the attachments
+            limit: Page size of each listing request
+
+        Yields:
+            Attachment dicts with id, filename, media type, size, version and
+            the absolute download URL
+
+        Raises:
+            requests.RequestException: If a listing request fails
+            RetryError: If the deadline expired or the host circuit is open
+        """
+        next_url = f"{self.base_api_url}/content/{page_id}/child/attachment?limit={limit}&start=0&expand=version"
+        while next_url:
+            response = self._get(next_url, stage="attachments")
+            if response.status_code in (401, 403):
+                self.credential_cache.invalidate(self.base_url, self.username)
+            response.raise_for_status()
+            res_json = response.json()
+            for attachment in res_json.get('results', []):
+                download = attachment.get('_links', {}).get('download', '')
+                yield {
+                    "id": str(attachment['id']),
+                    "filename": attachment.get('title', ''),
+                    "media_type": attachment.get('extensions', {}).get('mediaType', ''),
+                    "size": attachment.get('extensions', {}).get('fileSize'),
+                    "version": attachment.get('version', {}).get('number'),
+                    "download_url": download if download.startswith('http') else f"{self.base_url}{download}"
+                }
+
+            next_url = self._next_link(res_json)
+
+    def open_download(self, download_url: str) -> requests.Response:
+        """Open a streamed download, e.g. of an attachment.
+
+        The caller reads the body with ``iter_content`` and must close the response.
+
+        Raises:
+            requests.RequestException: If the request fails or returns an error status
+            RetryError: If the deadline expired or the host circuit is open
+        """
+        response = self._get(download_url, stream=True, stage="attachment_download")
+        if response.status_code != 200:
+            response.close()
+            if response.status_code in (401, 403):
+                self.credential_cache.invalidate(self.base_url, self.username)
+            response.raise_for_status()
+            raise requests.HTTPError(f"下载失败，状态码: {response.status_code}", response=response)
+        return response
+
+    def _next_link(self, res_json: Dict[str, Any]) -> Optional[str]:
+        """Absolute URL of the next result page, or None on the last page."""
+        next_link = res_json.get('_links', {}).get('next')
+        if not next_link:
+            return None
+        return next_link if next_link.startswith('http') else f"{self.base_url}{next_link}"
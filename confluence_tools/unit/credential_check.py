@@ -0,0 +1,144 @@
+"""Fast, deadline-bounded validation of Confluence credentials."""
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+import os
+import socket
+import time
+
+import requests
+
+from unit.confluence_session import ConfluenceSession, CredentialValidationCache
+
+# 凭据校验的总时限（秒），包括连通性检查与认证请求
+VALIDATION_DEADLINE = float(os.environ.get("CONFLUENCE_VALIDATION_DEADLINE", 10))
+# 凭据校验时的 TCP 连接超时（秒）
+VALIDATION_CONNECT_TIMEOUT = float(os.environ.get("CONFLUENCE_VALIDATION_CONNECT_TIMEOUT", 3))
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class ReachabilityError(Exception):
+    """Raised when the Confluence host cannot be resolved or connected to."""
+
+
+def _address(base_url: str) -> Tuple[str, int]:
+    parsed = urlparse(base_url)
+    if parsed.scheme not in _DEFAULT_PORTS or not parsed.hostname:
+        raise ReachabilityError(f"无效的 Confluence 地址: {base_url}")
+    try:
+        port = parsed.port or _DEFAULT_PORTS[parsed.scheme]
+    except ValueError as e:
+        raise ReachabilityError(f"无效的 Confluence 地址: {base_url}") from e
+    return parsed.hostname, port
+
+
+def uses_proxy(base_url: str) -> bool:
+    """Whether requests sends to ``base_url`` through a proxy from HTTP(S)_PROXY/NO_PROXY."""
+    proxies = requests.utils.get_environ_proxies(base_url)
+    return requests.utils.select_proxy(base_url, proxies) is not None
+
+
+def check_reachable(base_url: str, timeout: float = VALIDATION_CONNECT_TIMEOUT) -> float:
+    """Resolve the host and open a TCP connection to it, without sending a request.
+
+    Name resolution runs on a helper thread because ``getaddrinfo`` has no
+    timeout of its own; a resolver that hangs is abandoned when the time runs
+    out. Resolution and every connection attempt share the one ``timeout``.
+
+    Args:
+        base_url: Base URL of the Confluence instance
+        timeout: Seconds allowed for resolution and all connection attempts together
+
+    Returns:
+        Seconds the check took
+
+    Raises:
+        ReachabilityError: If the URL is invalid, the name does not resolve or no address accepts a connection
+    """
+    started = time.monotonic()
+    expires = started + timeout
+    host, port = _address(base_url)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        addresses = executor.submit(socket.getaddrinfo, host, port, 0, socket.SOCK_STREAM).result(timeout=timeout)
+    except FutureTimeout as e:
+        raise ReachabilityError(f"域名解析超时: {host}") from e
+    except OSError as e:
+        raise ReachabilityError(f"域名解析失败: {host} ({e})") from e
+    finally:
+        executor.shutdown(wait=False)
+
+    error: Optional[OSError] = None
+    for family, sock_type, proto, _, address in addresses:
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            break
+        sock = socket.socket(family, sock_type, proto)
+        sock.settimeout(remaining)
+        try:
+            sock.connect(address)
+            return time.monotonic() - started
+        except OSError as e:
+            error = e
+        finally:
+            sock.close()
+    if error is None:
+        raise ReachabilityError(f"连接超时: {host}:{port}")
+    raise ReachabilityError(f"无法连接 {host}:{port} ({error})")
+
+
+def validate_credentials(base_url: str, username: str, password: str,
+                         deadline: float = VALIDATION_DEADLINE,
+                         connect_timeout: float = VALIDATION_CONNECT_TIMEOUT,
+                         credential_cache: Optional[CredentialValidationCache] = None,
+                         **session_options: Any) -> Dict[str, Any]:
+    """Validate credentials within a deadline, failing fast on unreachable hosts.
+
+    A DNS/TCP check runs first, so a wrong or unreachable base URL is
+    reported within ``connect_timeout`` instead of after the request
+    timeouts. The check is skipped when requests reaches the host through a
+    proxy, which the raw socket check cannot use. The authentication request
+    then gets what is left of the deadline.
+    A successful validation is stored in the validation cache shared with the
+    tools, so the first tool call does not validate again.
+
+    Args:
+        base_url: Base URL of the Confluence instance
+        username: Confluence username
+        password: Confluence password
+        deadline: Total seconds budget of the validation
+        connect_timeout: TCP connect timeout in seconds
+        credential_cache: Validation cache, defaults to the process-wide one
+        **session_options: Further ConfluenceSession arguments
+
+    Returns:
+        Dict containing success status and message; failures carry ``details``
+        and, for HTTP errors, ``status_code``
+    """
+    started = time.monotonic()
+    try:
+        if uses_proxy(base_url):
+            # 通过代理访问时直连检查没有意义，只校验地址格式
+            _address(base_url)
+        else:
+            check_reachable(base_url, min(connect_timeout, deadline))
+    except ReachabilityError as e:
+        return {
+            "success": False,
+            "message": "无法连接 Confluence",
+            "details": str(e)
+        }
+
+    remaining = deadline - (time.monotonic() - started)
+    if remaining <= 0:
+        return {
+            "success": False,
+            "message": "无法连接 Confluence",
+            "details": f"凭据校验超时（{deadline} 秒）"
+        }
+    session = ConfluenceSession(base_url, username, password, credential_cache=credential_cache,
+                                deadline=remaining, timeout=(min(connect_timeout, remaining), remaining),
+                                **session_options)
+    return session.validate_credentials()
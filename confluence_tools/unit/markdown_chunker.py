@@ -0,0 +1,184 @@
+"""Heading-aware, size-bounded chunking of Markdown emitted by ConfluenceHTMLParser."""
+
+from typing import Any, Dict, List, Optional, Tuple
+import math
+import re
+
+# 切分单位：字符数或近似 token 数
+CHUNK_UNITS = ("chars", "tokens")
+
+# 中日韩字符，按每字约一个 token 估算
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+
+
+def approx_tokens(text: str) -> int:
+    """Approximate token count: one per CJK character, one per four other characters."""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class MarkdownChunker:
+    """Cuts Markdown into chunks along heading and block boundaries.
+
+    The parser feeds physical lines through ``add_line`` and marks the end of
+    every block (paragraph, table, code block) with ``end_block``. Lines
+    between two block ends are never separated, so tables and code blocks are
+    kept whole even if they exceed ``max_size``. Every heading starts a new
+    chunk; chunks that grow past ``max_size`` are continued in a new chunk that
+    repeats up to ``overlap`` of the trailing blocks.
+    """
+
+    def __init__(self, max_size: int = 2000, unit: str = "chars", overlap: int = 0):
+        """Initialize the chunker.
+
+        Args:
+            max_size: Maximum chunk size, measured in ``unit``
+            unit: "chars" or "tokens" (approximate)
+            overlap: Size of trailing blocks repeated at the start of a continuation chunk
+        """
+        if unit not in CHUNK_UNITS:
+            raise ValueError(f"不支持的切分单位: {unit}")
+        self.max_size = max(1, int(max_size))
+        self.unit = unit
+        self.overlap = max(0, int(overlap))
+        self.heading_path: List[Tuple[int, str]] = []
+        # 当前块的物理行
+        self._lines: List[str] = []
+        # 当前分段中的块：(text, size, is_body)
+        self._blocks: List[Tuple[str, int, bool]] = []
+        self._size = 0
+        self._chunks: List[Dict[str, Any]] = []
+        self._count = 0
+
+    def measure(self, text: str) -> int:
+        return len(text) if self.unit == "chars" else approx_tokens(text)
+
+    def add_line(self, line: str) -> None:
+        """Append one physical Markdown line to the current block."""
+        self._lines.append(line)
+
+    def end_block(self, kind: str = "text") -> None:
+        """Close the current block; chunks may only be cut after this point.
+
+        Args:
+            kind: "text", "heading", "table" or "code"; tables and code are never split
+        """
+        if not self._lines:
+            return
+        text = "\n".join(self._lines)
+        self._lines = []
+        if not text.strip():
+            # 空行只作为块之间的分隔，保留在当前分段中
+            if self._blocks:
+                self._blocks.append((text, 0, False))
+            return
+
+        size = self.measure(text)
+        if size > self.max_size and kind == "text":
+            for piece in self._split_text(text):
+                self._add_block(piece, self.measure(piece), True)
+        else:
+            self._add_block(text, size, kind != "heading")
+
+    def start_section(self, level: int, title: str) -> None:
+        """Start a new section at a heading of the given level."""
+        self.end_block()
+        self._emit()
+        self._blocks = []
+        self._size = 0
+        while self.heading_path and self.heading_path[-1][0] >= level:
+            self.heading_path.pop()
+        self.heading_path.append((level, title))
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Return the chunks completed since the last call."""
+        chunks = self._chunks
+        self._chunks = []
+        return chunks
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Close the last block and section and return the remaining chunks."""
+        self.end_block()
+        self._emit()
+        self._blocks = []
+        self._size = 0
+        return self.drain()
+
+    def _add_block(self, text: str, size: int, is_body: bool) -> None:
+        if self._size and self._size + size > self.max_size:
+            self._emit()
+            carried = self._overlap_blocks()
+            carried_size = sum(block[1] for block in carried)
+            if carried_size + size > self.max_size:
+                carried, carried_size = [], 0
+            # 重叠部分不单独构成正文
+            self._blocks = [(block[0], block[1], False) for block in carried]
+            self._size = carried_size
+        self._blocks.append((text, size, is_body))
+        self._size += size
+
+    def _overlap_blocks(self) -> List[Tuple[str, int, bool]]:
+        carried = []
+        total = 0
+        for block in reversed(self._blocks):
+            if not block[1]:
+                continue
+            if total + block[1] > self.overlap:
+                break
+            carried.insert(0, block)
+            total += block[1]
+        return carried
+
+    def _split_text(self, text: str) -> List[str]:
+        """Split an oversized prose block at line, then word boundaries."""
+        pieces = []
+        current = ""
+        for word in re.split(r'(?<=[\n ])', text):
+            while self.measure(word) > self.max_size:
+                # 单个词本身超长时按字符硬切
+                cut = self._fit(word)
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(word[:cut])
+                word = word[cut:]
+            if current and self.measure(current + word) > self.max_size:
+                pieces.append(current)
+                current = ""
+            current += word
+        if current:
+            pieces.append(current)
+        return [piece.strip("\n") for piece in pieces if piece.strip()]
+
+    def _fit(self, word: str) -> int:
+        """Length of the longest prefix of ``word`` that fits in ``max_size``."""
+        low, high = 1, len(word)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.measure(word[:mid]) <= self.max_size:
+                low = mid
+            else:
+                high = mid - 1
+        return low
+
+    def _emit(self) -> None:
+        if not any(block[2] for block in self._blocks):
+            return
+        content = "\n".join(block[0] for block in self._blocks).strip("\n")
+        self._chunks.append({
+            "index": self._count,
+            "heading_path": [title for _, title in self.heading_path],
+            "content": content,
+            "chars": len(content),
+            "tokens": approx_tokens(content),
+        })
+        self._count += 1
+
+
+def chunk_options(max_size: Optional[Any], unit: Optional[str], overlap: Optional[Any]) -> Dict[str, Any]:
+    """Normalize chunking tool parameters."""
+    return {
+        "max_size": int(max_size) if max_size else 2000,
+        "unit": unit if unit in CHUNK_UNITS else "chars",
+        "overlap": int(overlap) if overlap else 0,
+    }
@@ -0,0 +1,116 @@
+"""Bounded-memory collection of converted Markdown."""
+
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO, List, Optional, Union
+import os
+import tempfile
+import time
+
+from unit.metrics import InvocationMetrics
+
+# 超过该字节数的输出写入临时文件，内存中只保留未完成的块
+SPOOL_THRESHOLD = int(os.environ.get("CONFLUENCE_SPOOL_THRESHOLD", 8 * 1024 * 1024))
+
+
+class MarkdownSpool:
+    """Collects Markdown pieces as UTF-8, spilling to a temporary file past a threshold.
+
+    Pieces are encoded as they are written, so the output is held once as
+    bytes instead of as a list of strings plus joined copies. Once the total
+    exceeds ``threshold`` everything written so far is moved to an anonymous
+    temporary file, which is removed by ``close``. The spool also accepts
+    bytes, so compressors can write to it like to a file.
+    """
+
+    def __init__(self, threshold: int = SPOOL_THRESHOLD, directory: Optional[str] = None):
+        """Initialize the spool.
+
+        Args:
+            threshold: Bytes kept in memory before spilling to disk
+            directory: Directory of the temporary file, None for the system default
+        """
+        self.threshold = threshold
+        self.directory = directory
+        self.size = 0
+        self._parts: List[bytes] = []
+        self._file: Optional[BinaryIO] = None
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the output was moved to a temporary file."""
+        return self._file is not None
+
+    def write(self, text: Union[str, bytes]) -> int:
+        if not text:
+            return 0
+        data = text.encode('utf-8') if isinstance(text, str) else bytes(text)
+        self.size += len(data)
+        if self._file is None and self.size > self.threshold:
+            self._file = tempfile.TemporaryFile(dir=self.directory)
+            for part in self._parts:
+                self._file.write(part)
+            self._parts = []
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._parts.append(data)
+        return len(data)
+
+    def getvalue(self) -> bytes:
+        """The collected bytes, built with a single copy."""
+        if self._file is None:
+            # 合并为一个对象后替换原列表，避免同时持有两份内容
+            data = b"".join(self._parts)
+            self._parts = [data] if data else []
+            return data
+        self._file.flush()
+        self._file.seek(0)
+        data = self._file.read()
+        self._file.seek(0, os.SEEK_END)
+        return data
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def text(self) -> str:
+        return self.getvalue().decode('utf-8')
+
+    def close(self) -> None:
+        self._parts = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "MarkdownSpool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def iter_converted(parser, chunks: Iterable[str], metrics: Optional[InvocationMetrics] = None) -> Iterator[str]:
+    """Feed storage HTML pieces to a parser, yielding finished Markdown after each piece.
+
+    Only the block being parsed stays in the parser. Joining the yielded
+    pieces gives the same result as ``get_markdown``. With ``metrics`` the
+    parsing time is recorded as the ``parse`` stage.
+    """
+    metrics = metrics or InvocationMetrics()
+    elapsed = 0.0
+    try:
+        for chunk in chunks:
+            started = time.perf_counter()
+            parser.feed(chunk)
+            markdown = parser.drain_markdown()
+            elapsed += time.perf_counter() - started
+            if markdown:
+                yield markdown
+        started = time.perf_counter()
+        markdown = parser.drain_markdown(final=True)
+        elapsed += time.perf_counter() - started
+        if markdown:
+            yield markdown
+    finally:
+        metrics.add_time("parse", elapsed)
+
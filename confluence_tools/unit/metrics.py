@@ -0,0 +1,97 @@
+"""Per-invocation timing and counters, reported as structured log records."""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InvocationMetrics:
+    """Stage durations and counters of one tool invocation.
+
+    Stages are named phases such as ``auth``, ``probe``, ``download``,
+    ``parse`` and ``encode``; a stage entered several times accumulates its
+    time and count. Counters hold byte counts, cache hits, requests and
+    retries. Recording is thread-safe, so worker pools sharing a session can
+    report into the same instance.
+    """
+
+    def __init__(self, name: str = ""):
+        """Initialize the metrics.
+
+        Args:
+            name: Name of the instrumented tool, used in the log record
+        """
+        self.name = name
+        self.started = time.perf_counter()
+        self._stages: Dict[str, List[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one occurrence of a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def summary(self) -> Dict[str, Any]:
+        """Durations in milliseconds per stage, counters and the total elapsed time."""
+        with self._lock:
+            stages = {name: {"ms": round(seconds * 1000, 2), "count": count}
+                      for name, (seconds, count) in self._stages.items()}
+            counters = dict(self._counters)
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def log(self, **fields: Any) -> Dict[str, Any]:
+        """Emit the summary as one JSON log record and return it."""
+        record = {"event": "tool_metrics", "tool": self.name, **fields, **self.summary()}
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        return record
+
+
+def timed_iter(iterable: Iterator[Any], metrics: InvocationMetrics, stage: str) -> Iterator[Any]:
+    """Yield from an iterator, counting the time spent producing items as a stage.
+
+    Time spent by the consumer between items is not counted, so a download
+    consumed by the parser is split into its download and parse shares. The
+    time is added to the stage without counting another occurrence.
+    """
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - started
+                return
+            elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        metrics.add_time(stage, elapsed, count=0)
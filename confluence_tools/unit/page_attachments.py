@@ -0,0 +1,165 @@
+"""Resolve the attachments referenced by a page and link them from its Markdown."""
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+import html
+import io
+import re
+import zipfile
+
+from unit.attachment_store import AttachmentStore, AttachmentTooLarge, get_attachment_store
+from unit.confluence_session import REQUEST_ERRORS, ConfluenceSession
+from unit.page_markdown import MAX_WORKERS_LIMIT, probe_page
+from unit.parser_backends import create_parser
+
+# Markdown 中附件链接所在的相对目录，与压缩包内的目录一致
+ATTACHMENT_DIR = "attachments"
+# 本页附件引用；紧跟 ri:page / ri:blog-post 的是其他页面的附件
+_ATTACHMENT_REF_RE = re.compile(r'<ri:attachment\b([^>]*?)(/?)>(\s*<ri:(?:page|blog-post)\b)?', re.IGNORECASE)
+_FILENAME_ATTR_RE = re.compile(r'ri:filename\s*=\s*"([^"]*)"', re.IGNORECASE)
+# 这些类型的附件本身已压缩，打包时不再压缩
+_COMPRESSIBLE_PREFIXES = ("text/", "application/json", "application/xml", "image/svg")
+
+
+def referenced_attachments(storage: str) -> List[str]:
+    """File names of this page's attachments referenced by images and links, in document order."""
+    filenames = []
+    for match in _ATTACHMENT_REF_RE.finditer(storage):
+        attrs, self_closing, foreign = match.groups()
+        filename = _FILENAME_ATTR_RE.search(attrs)
+        if not filename or (foreign and not self_closing):
+            continue
+        name = html.unescape(filename.group(1))
+        if name not in filenames:
+            filenames.append(name)
+    return filenames
+
+
+def fetch_page_with_attachments(session: ConfluenceSession, page_id: str,
+                                add_level_mark: bool = False, mark_prefix: str = "L_",
+                                table_format: str = "markdown", max_workers: int = 4,
+                                store: Optional[AttachmentStore] = None) -> Dict[str, Any]:
+    """Convert a page to Markdown with its images and attachment links resolved.
+
+    Only attachments the page actually references are downloaded. Downloads
+    run on a bounded pool and go through the content-addressed store, so an
+    attachment already stored is not downloaded again. The Markdown links
+    point at ``attachments/<sha256><ext>``. The stored files stay pinned in
+    the store until ``release_attachments`` is called with the result; if
+    the conversion raises, they are released before the error propagates.
+
+    Returns:
+        Dict containing success status, title, markdown, stored attachments,
+        failed attachments and message
+    """
+    store = store or get_attachment_store()
+    probe = probe_page(session, page_id)
+    if not probe["success"]:
+        return probe
+    wiki = session.get_page_content(str(page_id), probe=probe)
+    if not wiki.get('success'):
+        return wiki
+
+    body = wiki.get('results', '')
+    referenced = referenced_attachments(body)
+    stored: List[Dict[str, Any]] = []
+    failed: List[Dict[str, str]] = []
+    futures: Dict[Future, Dict[str, Any]] = {}
+    complete = False
+    try:
+        if referenced:
+            try:
+                listing = {item["filename"]: item for item in session.iter_attachments(str(page_id))}
+            except REQUEST_ERRORS as e:
+                listing = None
+                failed.append({"filename": "*", "message": f"获取附件列表失败 异常：{str(e)}"})
+            todo = []
+            for filename in referenced if listing is not None else []:
+                if filename in listing:
+                    todo.append(listing[filename])
+                else:
+                    failed.append({"filename": filename, "message": "附件不存在"})
+
+            workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT, len(todo) or 1))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(store.fetch, session, item): item for item in todo}
+                for future in as_completed(futures):
+                    item = futures[future]
+                    try:
+                        entry = future.result()
+                    except (*REQUEST_ERRORS, AttachmentTooLarge, OSError) as e:
+                        failed.append({"filename": item["filename"], "message": f"下载附件失败 异常：{str(e)}"})
+                        continue
+                    if entry["from_store"]:
+                        session.metrics.incr("attachment_store_hits")
+                    stored.append({"filename": item["filename"], "media_type": item["media_type"], **entry})
+            # 按文档中的引用顺序返回
+            order = {filename: i for i, filename in enumerate(referenced)}
+            stored.sort(key=lambda entry: order[entry["filename"]])
+
+        links = {entry["filename"]: f"{ATTACHMENT_DIR}/{entry['name']}" for entry in stored}
+        with session.metrics.stage("parse"):
+            parser = create_parser(add_level_mark=add_level_mark, mark_prefix=mark_prefix, table_format=table_format,
+                                   attachment_links=links)
+            parser.feed(body)
+            markdown = parser.get_markdown()
+        complete = True
+    finally:
+        if not complete:
+            # 任何异常都要释放已固定的文件，包括其他线程已下载完成、尚未取出结果的附件
+            pinned = [future.result() for future in futures
+                      if future.done() and not future.cancelled() and future.exception() is None]
+            if pinned:
+                store.release(pinned)
+    return {
+        "success": True,
+        "title": wiki.get('title', 'untitled'),
+        "version": wiki.get('version'),
+        "markdown": markdown,
+        "attachments": stored,
+        "failed": failed,
+        "message": "转换成功"
+    }
+
+
+def release_attachments(result: Dict[str, Any], store: Optional[AttachmentStore] = None) -> None:
+    """Unpin the stored attachments of a ``fetch_page_with_attachments`` result."""
+    if result.get("attachments"):
+        (store or get_attachment_store()).release(result["attachments"])
+
+
+def read_stored_attachment(entry: Dict[str, Any], failed: List[Dict[str, str]]) -> Optional[bytes]:
+    """Bytes of a stored attachment, or None after recording it in ``failed`` if its file is gone."""
+    try:
+        with open(entry["path"], 'rb') as f:
+            return f.read()
+    except OSError as e:
+        # 文件可能已被其他进程淘汰
+        failed.append({"filename": entry["filename"], "message": f"读取附件失败 异常：{str(e)}"})
+        return None
+
+
+def build_attachment_archive(markdown_name: str, markdown: str, attachments: List[Dict[str, Any]],
+                             failed: Optional[List[Dict[str, str]]] = None) -> bytes:
+    """Bundle the Markdown and its stored attachments into a zip archive.
+
+    Attachments are copied from the store file by file; already compressed
+    media is stored without recompression. A file that can no longer be read
+    is left out and recorded in ``failed`` when given.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(markdown_name, markdown)
+        written = set()
+        for entry in attachments:
+            if entry["name"] in written:
+                continue
+            written.add(entry["name"])
+            compressible = entry.get("media_type", "").startswith(_COMPRESSIBLE_PREFIXES)
+            try:
+                archive.write(entry["path"], f"{ATTACHMENT_DIR}/{entry['name']}",
+                              compress_type=zipfile.ZIP_DEFLATED if compressible else zipfile.ZIP_STORED)
+            except OSError as e:
+                if failed is not None:
+                    failed.append({"filename": entry["filename"], "message": f"读取附件失败 异常：{str(e)}"})
+    return buffer.getvalue()
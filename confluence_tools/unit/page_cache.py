@@ -0,0 +1,212 @@
+"""Version-aware caches for Confluence page content."""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import hashlib
+import json
+import os
+import threading
+
+
+class BoundedLruCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Sizes are measured in characters for strings (``len``), which is a cheap
+    and stable proxy for memory use.
+    """
+
+    def __init__(self, max_size: int):
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum total size of cached values
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value and mark it as recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """Store a value, evicting least recently used entries if needed."""
+        if size > self.max_size:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self) -> None:
+        """Drop every entry and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PageContentCache:
+    """Two-tier cache of page storage bodies keyed by page id and version.
+
+    The memory tier is an LRU bounded by total body size. The optional disk
+    tier stores one JSON file per page holding its latest stored version, and
+    evicts the least recently used files once ``disk_max_bytes`` is exceeded.
+    An in-memory index of the latest version stored per page tells callers
+    whether a version probe can pay off at all; on a miss it falls back to the
+    disk tier, so pages cached by an earlier process are found again.
+    """
+
+    def __init__(self, memory_max_size: int = 32 * 1024 * 1024,
+                 disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 256 * 1024 * 1024,
+                 max_indexed_pages: int = 100000):
+        """Initialize the cache.
+
+        Args:
+            memory_max_size: Maximum total characters kept in memory
+            disk_dir: Directory of the disk tier, None disables it
+            disk_max_bytes: Maximum total size of the disk tier in bytes
+            max_indexed_pages: Maximum pages remembered by the version index
+        """
+        self.memory = BoundedLruCache(memory_max_size)
+        # (base_url, page_id) -> 最近写入的版本号，每个条目计为 1
+        self._versions = BoundedLruCache(max_indexed_pages)
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_hits = 0
+        self._disk_lock = threading.Lock()
+        self._disk_size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in os.scandir(disk_dir)
+                                  if entry.is_file() and entry.name.endswith('.json'))
+
+    @classmethod
+    def from_env(cls) -> "PageContentCache":
+        """Build a cache from CONFLUENCE_CACHE_* environment variables."""
+        return cls(
+            memory_max_size=int(os.environ.get("CONFLUENCE_CACHE_MEMORY_SIZE", 32 * 1024 * 1024)),
+            disk_dir=os.environ.get("CONFLUENCE_CACHE_DIR") or None,
+            disk_max_bytes=int(os.environ.get("CONFLUENCE_CACHE_DISK_BYTES", 256 * 1024 * 1024)),
+        )
+
+    def _disk_path(self, base_url: str, page_id: str) -> str:
+        digest = hashlib.sha256(f"{base_url}|{page_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk(self, base_url: str, page_id: str) -> Optional[Dict[str, Any]]:
+        """Load the disk entry ({version, title, body}) of a page into the memory tier."""
+        path = self._disk_path(base_url, page_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or not isinstance(entry.get("version"), int):
+            return None
+        with self._disk_lock:
+            self.disk_hits += 1
+        self._versions.put((base_url, page_id), entry["version"], 1)
+        self.memory.put((base_url, page_id, entry["version"]),
+                        {"title": entry["title"], "body": entry["body"]}, len(entry["body"]))
+        return entry
+
+    def known_version(self, base_url: str, page_id: str) -> Optional[int]:
+        """Latest version stored for the page, looked up on disk when this process has not seen it."""
+        version = self._versions.get((base_url, str(page_id)))
+        if version is None and self.disk_dir:
+            entry = self._read_disk(base_url, str(page_id))
+            if entry is not None:
+                version = entry["version"]
+        return version
+
+    def get(self, base_url: str, page_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """Return the cached page ({title, body}) for this exact version."""
+        entry = self.memory.get((base_url, str(page_id), version))
+        if entry is not None or not self.disk_dir:
+            return entry
+        entry = self._read_disk(base_url, str(page_id))
+        if entry is None or entry["version"] != version:
+            return None
+        return {"title": entry["title"], "body": entry["body"]}
+
+    def put(self, base_url: str, page_id: str, version: int, title: str, body: str) -> None:
+        """Store a page body under its version in both tiers."""
+        entry = {"title": title, "body": body}
+        self._versions.put((base_url, str(page_id)), version, 1)
+        self.memory.put((base_url, str(page_id), version), entry, len(body))
+        if self.disk_dir:
+            # 每个页面一个文件，新版本覆盖旧版本
+            self._write_disk(self._disk_path(base_url, str(page_id)), {"version": version, **entry})
+
+    def _write_disk(self, path: str, entry: Dict[str, Any]) -> None:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            with self._disk_lock:
+                if os.path.exists(path):
+                    self._disk_size -= os.path.getsize(path)
+                os.replace(tmp_path, path)
+                self._disk_size += size
+                if self._disk_size > self.disk_max_bytes:
+                    self._evict_disk()
+        except OSError:
+            # 磁盘缓存失败不影响主流程
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict_disk(self) -> None:
+        """Remove least recently used files until the disk tier fits again."""
+        files = sorted((entry for entry in os.scandir(self.disk_dir)
+                        if entry.is_file() and entry.name.endswith('.json')),
+                       key=lambda entry: entry.stat().st_mtime)
+        for entry in files:
+            if self._disk_size <= self.disk_max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._disk_size -= size
+            except OSError:
+                continue
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters of both tiers."""
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.memory.misses - self.disk_hits,
+            "memory_entries": len(self.memory),
+            "memory_size": self.memory.size,
+            "disk_bytes": self._disk_size,
+        }
+
+
+# 进程内共享的页面内容缓存
+page_cache = PageContentCache.from_env()
+
+# 进程内共享的 Markdown 渲染结果缓存，按字符数限制内存占用
+render_cache = BoundedLruCache(int(os.environ.get("CONFLUENCE_RENDER_CACHE_SIZE", 16 * 1024 * 1024)))
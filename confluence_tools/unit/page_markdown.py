@@ -0,0 +1,252 @@
+"""Helpers for fetching Confluence pages and converting them to Markdown."""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Generator, Iterable
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import json
+
+from unit.confluence_html_parser import PARSER_VERSION
+from unit.confluence_session import ConfluenceSession
+from unit.markdown_chunker import MarkdownChunker
+from unit.page_cache import BoundedLruCache, render_cache
+from unit.parser_backends import create_parser
+
+# 单次批量调用允许的最大并发数
+MAX_WORKERS_LIMIT = 16
+
+
+def parse_page_ids(raw: Any) -> List[str]:
+    """Parse page ids from a JSON array or a comma/whitespace separated string.
+
+    Duplicates are dropped while keeping the original order.
+    """
+    if raw is None:
+        return []
+    if isinstance(raw, (int, float)):
+        items = [raw]
+    elif isinstance(raw, (list, tuple)):
+        items = list(raw)
+    else:
+        text = str(raw).strip()
+        try:
+            parsed = json.loads(text)
+            items = parsed if isinstance(parsed, list) else [parsed]
+        except ValueError:
+            items = text.replace(',', ' ').replace('，', ' ').split()
+
+    page_ids = []
+    for item in items:
+        page_id = str(int(item)) if isinstance(item, float) else str(item).strip()
+        if page_id and page_id not in page_ids:
+            page_ids.append(page_id)
+    return page_ids
+
+
+def render_cache_key(session: ConfluenceSession, page_id: str, version: int,
+                     add_level_mark: bool, mark_prefix: str, table_format: str = "markdown") -> Hashable:
+    """Key of a rendered page in the Markdown render cache."""
+    return (session.base_url, str(page_id), version, bool(add_level_mark), mark_prefix, table_format,
+            PARSER_VERSION)
+
+
+def _failure(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "title": result.get('title', '获取文档异常！'),
+        "message": result.get('message', '未知错误')
+    }
+
+
+def probe_page(session: ConfluenceSession, page_id: str) -> Dict[str, Any]:
+    """Authenticate (using the validation cache) and probe the page version."""
+    auth_result = session.ensure_authenticated()
+    if not auth_result["success"]:
+        return auth_result
+    return session.get_page_version(str(page_id))
+
+
+def _rendered_key(session: ConfluenceSession, page_id: str) -> Hashable:
+    return ("rendered", session.base_url, str(page_id))
+
+
+def probe_rendered(session: ConfluenceSession, page_id: str, cache: BoundedLruCache,
+                   version: Optional[int] = None, title: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Decide which page version to look up in the render cache.
+
+    A version already returned by a child or search listing is used as is.
+    Otherwise the version is probed only when the render cache holds an entry
+    for the page, so a page that was never rendered costs a single request.
+
+    Returns:
+        A probe result (success, version, title), or None when the page has
+        not been rendered and should be fetched directly
+    """
+    if version is not None:
+        return {"success": True, "version": version, "title": title or str(page_id)}
+    if cache.get(_rendered_key(session, page_id)) is None:
+        return None
+    return probe_page(session, page_id)
+
+
+def remember_rendered(session: ConfluenceSession, page_id: str, cache: BoundedLruCache,
+                      key: Hashable, value: Any, size: int) -> None:
+    """Store a rendered page and mark the page as present in the render cache."""
+    cache.put(key, value, size)
+    cache.put(_rendered_key(session, page_id), True, 1)
+
+
+def fetch_page_markdown(session: ConfluenceSession, page_id: str,
+                        add_level_mark: bool = False, mark_prefix: str = "L_",
+                        cache: Optional[BoundedLruCache] = None,
+                        table_format: str = "markdown",
+                        version: Optional[int] = None, title: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch a page and convert its storage body to Markdown.
+
+    The rendered Markdown is memoized by page version and conversion options.
+    A page seen before costs only the version probe, and none at all when the
+    caller passes the version from a listing; a page never rendered is
+    fetched in one request. The requests of the page share one
+    ``session.operation`` deadline.
+
+    Args:
+        version: Page version already known from a child or search listing
+        title: Page title returned by the same listing
+
+    Returns:
+        Dict containing success status, title, markdown and message
+    """
+    with session.operation():
+        cache = render_cache if cache is None else cache
+        probe = probe_rendered(session, page_id, cache, version, title)
+        if probe is not None:
+            if not probe["success"]:
+                return _failure(probe)
+            key = render_cache_key(session, page_id, probe["version"], add_level_mark, mark_prefix, table_format)
+            markdown = cache.get(key)
+            if markdown is not None:
+                session.metrics.incr("render_cache_hits")
+                return {
+                    "success": True,
+                    "title": probe["title"],
+                    "version": probe["version"],
+                    "markdown": markdown,
+                    "from_cache": True,
+                    "message": "转换成功"
+                }
+
+        wiki = session.get_page_content(str(page_id), probe=probe)
+        if not wiki.get('success'):
+            return _failure(wiki)
+
+        with session.metrics.stage("parse"):
+            parser = create_parser(add_level_mark=add_level_mark, mark_prefix=mark_prefix, table_format=table_format)
+            parser.feed(wiki.get('results', ''))
+            markdown = parser.get_markdown()
+        key = render_cache_key(session, page_id, wiki.get('version'), add_level_mark, mark_prefix, table_format)
+        remember_rendered(session, page_id, cache, key, markdown, len(markdown))
+        return {
+            "success": True,
+            "title": wiki.get('title', 'untitled'),
+            "version": wiki.get('version'),
+            "markdown": markdown,
+            "from_cache": False,
+            "message": "转换成功"
+        }
+
+
+def fetch_page_chunks(session: ConfluenceSession, page_id: str,
+                      add_level_mark: bool = False, mark_prefix: str = "L_",
+                      max_size: int = 2000, unit: str = "chars", overlap: int = 0,
+                      cache: Optional[BoundedLruCache] = None,
+                      table_format: str = "markdown",
+                      version: Optional[int] = None, title: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch a page and cut it into heading-aware chunks in a single parsing pass.
+
+    Every chunk carries the page id and title, its heading path and its size,
+    so the list can be handed to a knowledge base as is. The render cache is
+    consulted as in fetch_page_markdown, and the requests of the page share
+    one ``session.operation`` deadline.
+
+    Args:
+        version: Page version already known from a child or search listing
+        title: Page title returned by the same listing
+
+    Returns:
+        Dict containing success status, title, chunks and message
+    """
+    with session.operation():
+        cache = render_cache if cache is None else cache
+        probe = probe_rendered(session, page_id, cache, version, title)
+        if probe is not None:
+            if not probe["success"]:
+                return _failure(probe)
+            key = (render_cache_key(session, page_id, probe["version"], add_level_mark, mark_prefix, table_format),
+                   "chunks", max_size, unit, overlap)
+            chunks = cache.get(key)
+            if chunks is not None:
+                session.metrics.incr("render_cache_hits")
+                return {
+                    "success": True,
+                    "title": probe["title"],
+                    "version": probe["version"],
+                    "chunks": chunks,
+                    "from_cache": True,
+                    "message": "转换成功"
+                }
+
+        wiki = session.get_page_content(str(page_id), probe=probe)
+        if not wiki.get('success'):
+            return _failure(wiki)
+
+        title = wiki.get('title', 'untitled')
+        with session.metrics.stage("parse"):
+            parser = create_parser(add_level_mark=add_level_mark, mark_prefix=mark_prefix, table_format=table_format,
+                                   chunker=MarkdownChunker(max_size=max_size, unit=unit, overlap=overlap))
+            parser.feed(wiki.get('results', ''))
+            chunks = [{"page_id": str(page_id), "title": title, **chunk} for chunk in parser.drain_chunks(final=True)]
+        key = (render_cache_key(session, page_id, wiki.get('version'), add_level_mark, mark_prefix, table_format),
+               "chunks", max_size, unit, overlap)
+        remember_rendered(session, page_id, cache, key, chunks, sum(chunk["chars"] for chunk in chunks))
+        return {
+            "success": True,
+            "title": title,
+            "version": wiki.get('version'),
+            "chunks": chunks,
+            "from_cache": False,
+            "message": "转换成功"
+        }
+
+
+def iter_pages_markdown(session: ConfluenceSession, page_ids: Iterable[str], max_workers: int = 4,
+                        add_level_mark: bool = False, mark_prefix: str = "L_",
+                        table_format: str = "markdown") -> Generator[Tuple[str, Dict[str, Any]], None, None]:
+    """Fetch and convert pages concurrently, yielding results as each page completes.
+
+    Args:
+        session: Confluence session shared by the workers
+        page_ids: Page ids to convert
+        max_workers: Size of the bounded worker pool
+        add_level_mark: Whether to add level marks in headings
+        mark_prefix: Prefix of the level marks
+        table_format: One of TABLE_FORMATS
+
+    Yields:
+        (page_id, result) tuples in completion order
+    """
+    max_workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_page_markdown, session, page_id, add_level_mark, mark_prefix,
+                            None, table_format): page_id
+            for page_id in page_ids
+        }
+        for future in as_completed(futures):
+            page_id = futures[future]
+            try:
+                yield page_id, future.result()
+            except Exception as e:
+                yield page_id, {
+                    "success": False,
+                    "title": "获取文档异常！",
+                    "message": f"转换失败 异常：{str(e)}"
+                }
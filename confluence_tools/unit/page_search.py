@@ -0,0 +1,141 @@
+"""CQL search with prefetched pagination and concurrent conversion of the top hits."""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from collections.abc import Generator, Iterator
+from typing import Any, Dict, Optional
+import html
+import re
+
+from unit.confluence_session import ConfluenceSession
+from unit.page_markdown import MAX_WORKERS_LIMIT, fetch_page_markdown
+
+# 可以转换为 Markdown 的内容类型
+CONVERTIBLE_TYPES = ("page", "blogpost")
+# 搜索摘要中的高亮标记与 HTML 标签
+_EXCERPT_MARKUP = re.compile(r'@@@(?:end)?hl@@@|<[^>]+>')
+
+
+class SearchError(Exception):
+    """Raised when a page of search results cannot be fetched."""
+
+
+def search_hit(result: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+    """Flatten one search result to id, type, title, space, version, modified time, url and excerpt."""
+    webui = result.get('_links', {}).get('webui', '')
+    excerpt = _EXCERPT_MARKUP.sub('', result.get('excerpt') or '')
+    return {
+        "id": str(result.get('id', '')),
+        "type": result.get('type', ''),
+        "title": result.get('title', ''),
+        "space": (result.get('space') or {}).get('key', ''),
+        "version": (result.get('version') or {}).get('number'),
+        "modified": (result.get('version') or {}).get('when', ''),
+        "url": f"{base_url}{webui}" if webui else "",
+        "excerpt": html.unescape(excerpt).strip(),
+    }
+
+
+class CqlSearch:
+    """Iterates over the hits of a CQL search, page by page.
+
+    While the hits of one result page are being consumed, the next page is
+    already requested on a background thread. Iteration stops once
+    ``max_results`` hits were produced; ``truncated`` then tells whether the
+    search had more results.
+    """
+
+    def __init__(self, session: ConfluenceSession, cql: str, page_size: int = 25,
+                 max_results: Optional[int] = None):
+        """Initialize the search.
+
+        Args:
+            session: Confluence session
+            cql: CQL query
+            page_size: Results requested per page
+            max_results: Result budget, None for all results
+        """
+        self.session = session
+        self.cql = cql
+        self.max_results = max_results if max_results and max_results > 0 else None
+        self.page_size = max(1, min(int(page_size), self.max_results or int(page_size)))
+        self.pages = 0
+        self.count = 0
+        self.truncated = False
+
+    def _fetch(self, next_url: Optional[str] = None) -> Dict[str, Any]:
+        """Request one page of results with its own operation deadline."""
+        with self.session.operation():
+            return self.session.search(self.cql, self.page_size, next_url)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            future: Optional[Future] = executor.submit(self._fetch)
+            while future is not None:
+                page = future.result()
+                if not page["success"]:
+                    raise SearchError(page["message"])
+                self.pages += 1
+                results = page["results"]
+                remaining = None if self.max_results is None else self.max_results - self.count
+                if remaining is not None and len(results) >= remaining:
+                    self.truncated = len(results) > remaining or bool(page.get("next"))
+                    results = results[:remaining]
+                    future = None
+                elif page.get("next"):
+                    # 预取下一页，与当前页结果的处理并行
+                    future = executor.submit(self._fetch, page["next"])
+                else:
+                    future = None
+                for result in results:
+                    self.count += 1
+                    yield search_hit(result, self.session.base_url)
+        finally:
+            # 调用方提前结束时不再等待预取的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def search_and_convert(session: ConfluenceSession, cql: str, page_size: int = 25,
+                       max_results: Optional[int] = None, convert_top: int = 0, max_workers: int = 4,
+                       add_level_mark: bool = False, mark_prefix: str = "L_",
+                       table_format: str = "markdown") -> Generator[Dict[str, Any], None, None]:
+    """Stream search hits and convert the first ``convert_top`` pages concurrently.
+
+    Conversions start as soon as their hit arrives, so they overlap with the
+    remaining pagination; finished conversions are reported between hits.
+
+    Yields:
+        ``{"event": "hit", "hit": ...}`` per hit, ``{"event": "page", "hit": ..., "result": ...}``
+        per converted page, and a final ``{"event": "done", "total", "converted", "truncated"}``
+    """
+    search = CqlSearch(session, cql, page_size=page_size, max_results=max_results)
+    max_workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: Dict[Future, Dict[str, Any]] = {}
+    submitted = 0
+
+    def finished(block: bool) -> Generator[Dict[str, Any], None, None]:
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            hit = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "title": hit["title"], "message": f"转换失败 异常：{str(e)}"}
+            yield {"event": "page", "hit": hit, "result": result}
+
+    try:
+        for hit in search:
+            yield {"event": "hit", "hit": hit}
+            if submitted < convert_top and hit["type"] in CONVERTIBLE_TYPES:
+                submitted += 1
+                future = executor.submit(fetch_page_markdown, session, hit["id"], add_level_mark, mark_prefix,
+                                         None, table_format, hit.get("version"), hit.get("title"))
+                pending[future] = hit
+            if pending:
+                yield from finished(block=False)
+        while pending:
+            yield from finished(block=True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield {"event": "done", "total": search.count, "converted": submitted, "truncated": search.truncated}
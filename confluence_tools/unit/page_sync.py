@@ -0,0 +1,236 @@
+"""Incremental "changed since" sync of a CQL scope with persisted checkpoints."""
+
+from collections.abc import Generator
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import re
+import zlib
+
+from unit.confluence_session import ConfluenceSession
+from unit.page_markdown import iter_pages_markdown
+from unit.page_search import CqlSearch, SearchError
+
+# 检查点格式版本，格式变化时递增，旧检查点视为不存在
+CHECKPOINT_VERSION = 1
+# 重新查询上次同步时间之前的这段时间（分钟），覆盖 CQL 的分钟精度与时区差异
+SYNC_OVERLAP_MINUTES = int(os.environ.get("CONFLUENCE_SYNC_OVERLAP_MINUTES", 30))
+# 枚举页面时每次请求的结果数
+SYNC_PAGE_SIZE = 100
+# 单个检查点压缩后的最大字节数，不超过 manifest 中插件存储的容量
+MAX_CHECKPOINT_BYTES = int(os.environ.get("CONFLUENCE_SYNC_CHECKPOINT_BYTES", 1024 * 1024))
+_ORDER_BY = re.compile(r'\border\s+by\b.*$', re.IGNORECASE | re.DOTALL)
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint cannot be written to plugin storage."""
+
+
+def checkpoint_key(base_url: str, username: str, scope: str, name: str = "") -> str:
+    """Plugin storage key of the checkpoint of one sync scope."""
+    digest = hashlib.sha256(f"{base_url.rstrip('/')}|{username}|{scope.strip()}|{name}".encode('utf-8'))
+    return f"confluence_sync_{digest.hexdigest()[:32]}"
+
+
+def load_checkpoint(storage: Any, key: str) -> Optional[Dict[str, Any]]:
+    """Load a checkpoint from plugin storage; a missing or unreadable one counts as none."""
+    try:
+        raw = storage.get(key)
+    except Exception:
+        return None
+    try:
+        checkpoint = json.loads(zlib.decompress(raw).decode('utf-8'))
+    except (zlib.error, ValueError, TypeError):
+        return None
+    if checkpoint.get("format") != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(storage: Any, key: str, checkpoint: Dict[str, Any],
+                    max_bytes: int = MAX_CHECKPOINT_BYTES) -> None:
+    """Store a checkpoint in plugin storage as compressed JSON.
+
+    Raises:
+        CheckpointError: If the compressed checkpoint exceeds ``max_bytes`` or storage rejects it
+    """
+    data = zlib.compress(json.dumps(checkpoint, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    if len(data) > max_bytes:
+        raise CheckpointError(f"检查点过大（{len(data)} 字节，上限 {max_bytes} 字节），请缩小同步范围")
+    try:
+        storage.set(key, data)
+    except Exception as e:
+        raise CheckpointError(f"检查点保存失败 异常：{str(e)}") from e
+
+
+def cql_time(modified: str, overlap_minutes: int = SYNC_OVERLAP_MINUTES) -> str:
+    """CQL ``lastmodified`` literal for a version timestamp, moved back by the overlap.
+
+    The timestamp keeps the server's UTC offset, so the literal is in the
+    server's local time like the values CQL compares against.
+    """
+    moment = datetime.fromisoformat(modified.replace('Z', '+00:00'))
+    return (moment - timedelta(minutes=overlap_minutes)).strftime("%Y-%m-%d %H:%M")
+
+
+def _scope(cql: str) -> str:
+    """The scope without any ORDER BY clause, ready to be combined with more conditions."""
+    return _ORDER_BY.sub('', cql).strip()
+
+
+def _later(first: str, second: str) -> str:
+    if not first:
+        return second
+    if not second:
+        return first
+    return max(first, second, key=lambda value: datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+class PageSync:
+    """Computes the changes of a CQL scope since the previous run.
+
+    The checkpoint holds the newest modification time seen (``watermark``),
+    a page id -> version map and the ids whose conversion failed; titles,
+    only needed to name deleted pages, are kept only with ``detect_deletes``. A run only
+    queries pages with ``lastmodified`` at or after the watermark (minus a
+    small overlap), compares their versions with the map and converts the
+    new and updated pages, so its cost follows the amount of change. Deleted
+    pages are only found on request (``detect_deletes``), by listing the ids
+    still in scope: that needs no page bodies but one search request per
+    ``SYNC_PAGE_SIZE`` pages of the whole scope on every run.
+    """
+
+    def __init__(self, session: ConfluenceSession, scope: str, checkpoint: Optional[Dict[str, Any]] = None,
+                 max_pages: int = 200, detect_deletes: bool = False, max_workers: int = 4,
+                 add_level_mark: bool = False, mark_prefix: str = "L_", table_format: str = "markdown"):
+        """Initialize the sync.
+
+        Args:
+            session: Confluence session
+            scope: CQL selecting the synced content, e.g. ``space = DEV``
+            checkpoint: Checkpoint of the previous run, None for a full first run
+            max_pages: Maximum pages converted per run; the rest follow in the next run
+            detect_deletes: Whether to list the scope to find deleted pages
+            max_workers: Size of the conversion worker pool
+            add_level_mark: Whether to add level marks in headings
+            mark_prefix: Prefix of the level marks
+            table_format: One of TABLE_FORMATS
+        """
+        self.session = session
+        self.scope = _scope(scope)
+        self.previous = checkpoint
+        self.max_pages = max(1, int(max_pages))
+        self.detect_deletes = detect_deletes
+        self.max_workers = max_workers
+        self.add_level_mark = add_level_mark
+        self.mark_prefix = mark_prefix
+        self.table_format = table_format
+        self.unchanged = 0
+        self.truncated = False
+        # 删除检测失败时的错误信息，此时检查点只包含变更
+        self.delete_error: Optional[str] = None
+        self.checkpoint: Optional[Dict[str, Any]] = None
+
+    def changes_cql(self) -> str:
+        cql = f"({self.scope}) AND type = page"
+        if self.previous and self.previous.get("watermark"):
+            cql += f' AND lastmodified >= "{cql_time(self.previous["watermark"])}"'
+        return cql + " ORDER BY lastmodified ASC"
+
+    def _collect_changes(self, known: Dict[str, int]) -> Dict[str, Any]:
+        """Changed hits in modification order, cut at ``max_pages``."""
+        changed: Dict[str, Dict[str, Any]] = {}
+        watermark = self.previous.get("watermark", "") if self.previous else ""
+        retry = list(self.previous.get("failed", [])) if self.previous else []
+        budget = self.max_pages - len(retry)
+        for hit in CqlSearch(self.session, self.changes_cql(), page_size=SYNC_PAGE_SIZE):
+            version = known.get(hit["id"])
+            if version is not None and hit["version"] is not None and hit["version"] <= version:
+                self.unchanged += 1
+                watermark = _later(watermark, hit["modified"])
+                continue
+            if len(changed) >= budget:
+                # 剩余的变更按修改时间排在后面，下次从水位线继续
+                self.truncated = True
+                break
+            changed[hit["id"]] = hit
+            watermark = _later(watermark, hit["modified"])
+        return {"changed": changed, "watermark": watermark, "retry": retry}
+
+    def _list_scope(self) -> Dict[str, str]:
+        """Ids and titles of all pages currently in scope."""
+        return {hit["id"]: hit["title"]
+                for hit in CqlSearch(self.session, f"({self.scope}) AND type = page", page_size=SYNC_PAGE_SIZE)}
+
+    def _build_checkpoint(self, watermark: str, known: Dict[str, int], titles: Dict[str, str],
+                          failed: List[str]) -> Dict[str, Any]:
+        checkpoint = {
+            "format": CHECKPOINT_VERSION,
+            "scope": self.scope,
+            "watermark": watermark,
+            "synced_at": datetime.now().astimezone().isoformat(timespec='seconds'),
+            "pages": known,
+            "failed": failed,
+        }
+        if self.detect_deletes:
+            # 标题只用于命名已删除的页面
+            checkpoint["titles"] = titles
+        return checkpoint
+
+    def run(self) -> Generator[Dict[str, Any], None, None]:
+        """Run the sync, yielding one event per changed page.
+
+        The checkpoint of the changes is built before delete detection starts,
+        so a failing scope listing only loses the deletes (``delete_error``
+        is set) and never causes the changed pages to be returned again.
+
+        Yields:
+            ``{"change": "created"|"updated", "page_id", "title", "version", "result"}`` per converted page
+            and ``{"change": "deleted", "page_id", "title"}`` per deleted page. When the generator
+            is exhausted, ``checkpoint`` holds the checkpoint to persist.
+
+        Raises:
+            SearchError: If the change search fails; nothing has been yielded nor should be persisted then
+        """
+        known: Dict[str, int] = dict(self.previous.get("pages", {})) if self.previous else {}
+        titles: Dict[str, str] = dict(self.previous.get("titles", {})) \
+            if self.previous and self.detect_deletes else {}
+        collected = self._collect_changes(known)
+        changed = collected["changed"]
+        page_ids = list(changed) + [page_id for page_id in collected["retry"] if page_id not in changed]
+
+        failed: List[str] = []
+        for page_id, result in iter_pages_markdown(self.session, page_ids, max_workers=self.max_workers,
+                                                   add_level_mark=self.add_level_mark,
+                                                   mark_prefix=self.mark_prefix, table_format=self.table_format):
+            hit = changed.get(page_id, {})
+            change = "updated" if page_id in known else "created"
+            if result["success"]:
+                known[page_id] = result.get("version") or hit.get("version")
+                if self.detect_deletes:
+                    titles[page_id] = result["title"]
+            else:
+                # 转换失败的页面记入检查点，下次运行时重试
+                failed.append(page_id)
+            yield {"change": change, "page_id": page_id, "title": result.get("title") or hit.get("title", ""),
+                   "version": result.get("version") or hit.get("version"), "result": result}
+
+        self.checkpoint = self._build_checkpoint(collected["watermark"], known, titles, failed)
+        if not (self.detect_deletes and self.previous):
+            return
+        try:
+            in_scope = self._list_scope()
+        except SearchError as e:
+            # 变更已返回，检查点保留变更部分，删除留到下次检测
+            self.delete_error = str(e)
+            return
+        deleted = [(page_id, titles.pop(page_id, "")) for page_id in known if page_id not in in_scope]
+        for page_id, _ in deleted:
+            del known[page_id]
+        # 已不在范围内的页面不再重试
+        failed = [page_id for page_id in failed if page_id in in_scope]
+        self.checkpoint = self._build_checkpoint(collected["watermark"], known, titles, failed)
+        for page_id, title in deleted:
+            yield {"change": "deleted", "page_id": page_id, "title": title}
@@ -0,0 +1,124 @@
+"""Crawl a Confluence page tree and bundle it as Markdown files."""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+import io
+import re
+import zipfile
+
+from unit.confluence_session import ConfluenceSession
+from unit.page_markdown import MAX_WORKERS_LIMIT, fetch_page_markdown
+
+# 文件名中不允许出现的字符
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def safe_filename(title: str, fallback: str) -> str:
+    """Turn a page title into a file/directory name usable inside an archive."""
+    name = _UNSAFE_FILENAME.sub('_', title).strip().strip('.')
+    return name[:120] or fallback
+
+
+class PageTreeCrawler:
+    """Walks a page subtree concurrently and converts every page to Markdown.
+
+    Each page is fetched, converted and has its children listed by one worker
+    task; children are scheduled as soon as their parent completes, bounded by
+    ``max_depth`` and ``max_pages``. Page ``Foo`` with children is laid out as
+    ``Foo.md`` next to a ``Foo/`` directory holding the children.
+    """
+
+    def __init__(self, session: ConfluenceSession, max_depth: int = 3, max_pages: int = 200,
+                 max_workers: int = 4, add_level_mark: bool = False, mark_prefix: str = "L_"):
+        """Initialize the crawler.
+
+        Args:
+            session: Confluence session shared by the workers
+            max_depth: Deepest level below the root to export (root is depth 0)
+            max_pages: Maximum number of pages to export
+            max_workers: Size of the bounded worker pool
+            add_level_mark: Whether to add level marks in headings
+            mark_prefix: Prefix of the level marks
+        """
+        self.session = session
+        self.max_depth = max(0, int(max_depth))
+        self.max_pages = max(1, int(max_pages))
+        self.max_workers = max(1, min(int(max_workers), MAX_WORKERS_LIMIT))
+        self.add_level_mark = add_level_mark
+        self.mark_prefix = mark_prefix
+
+    def _process(self, page_id: str, depth: int, version: Optional[int] = None,
+                 title: Optional[str] = None) -> Dict[str, Any]:
+        """Convert one page and list its children (worker task) within one operation deadline.
+
+        Children pass the version and title from the child listing, so an
+        unchanged page already in the render cache costs no request.
+        """
+        with self.session.operation():
+            result = fetch_page_markdown(self.session, page_id, self.add_level_mark, self.mark_prefix,
+                                         version=version, title=title)
+            children: List[Dict[str, Any]] = []
+            if result["success"] and depth < self.max_depth:
+                try:
+                    children = list(self.session.iter_child_pages(page_id))
+                except Exception as e:
+                    result["children_error"] = f"获取子页面失败 异常：{str(e)}"
+        result["children"] = children
+        return result
+
+    def crawl(self, root_id: str) -> List[Dict[str, Any]]:
+        """Crawl the subtree rooted at ``root_id``.
+
+        Returns:
+            Page entries (id, depth, path, success, title, markdown/message) in
+            the order they completed
+        """
+        pages: List[Dict[str, Any]] = []
+        used_paths: Dict[str, str] = {}
+        scheduled = 1
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._process, str(root_id), 0): (str(root_id), 0, None)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_id, depth, parent_dir = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"success": False, "title": "获取文档异常！",
+                                  "message": f"转换失败 异常：{str(e)}", "children": []}
+
+                    name = safe_filename(result.get("title", ""), page_id)
+                    path = _unique_path(f"{parent_dir}/{name}" if parent_dir else name, page_id, used_paths)
+                    entry = {"id": page_id, "depth": depth, "path": path}
+                    entry.update({k: v for k, v in result.items() if k != "children"})
+                    pages.append(entry)
+
+                    for child in result["children"]:
+                        if scheduled >= self.max_pages:
+                            entry["truncated"] = True
+                            break
+                        scheduled += 1
+                        future_child = executor.submit(self._process, child["id"], depth + 1,
+                                                       child.get("version"), child.get("title"))
+                        pending[future_child] = (child["id"], depth + 1, path)
+        return pages
+
+
+def _unique_path(path: str, page_id: str, used_paths: Dict[str, str]) -> str:
+    """Append the page id when a sibling already uses the same name."""
+    owner: Optional[str] = used_paths.get(path)
+    if owner is not None and owner != page_id:
+        path = f"{path}_{page_id}"
+    used_paths[path] = page_id
+    return path
+
+
+def build_markdown_archive(pages: List[Dict[str, Any]]) -> bytes:
+    """Bundle converted pages into a zip archive laid out by hierarchy."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for page in sorted(pages, key=lambda p: (p["depth"], p["path"])):
+            if page.get("success"):
+                archive.writestr(f"{page['path']}.md", page["markdown"])
+    return buffer.getvalue()
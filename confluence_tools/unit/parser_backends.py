@@ -0,0 +1,232 @@
+"""Parser backends for Confluence storage format.
+
+The pure-Python ``ConfluenceHTMLParser`` is always available. When lxml is
+installed, its libxml2 tokenizer can drive the same handler through a parser
+target: libxml2 does the tokenizing and entity decoding in C, and the events
+are replayed into the handler callbacks, so both backends produce identical
+Markdown on well-formed storage XHTML. libxml2 is strict about markup that
+html.parser tolerates (bare ``&``, unquoted attributes, unclosed ``<br>``), so
+lxml is opt-in and falls back to the pure-Python parser on malformed input.
+"""
+
+from html.entities import name2codepoint
+from typing import Any, Callable, Dict, List, Optional
+import copy
+import os
+
+from unit.confluence_html_parser import ConfluenceHTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml 为可选依赖，缺失时使用纯 Python 解析器
+    etree = None
+
+# 解析器后端；auto 使用纯 Python 解析器，lxml 需显式指定
+PARSER_BACKENDS = ("auto", "lxml", "python")
+
+# 存储格式中常用的命名空间前缀
+STORAGE_NAMESPACES = {
+    "ac": "http://atlassian.com/content",
+    "ri": "http://atlassian.com/resource/identifier",
+    "at": "http://atlassian.com/template",
+}
+_PREFIXES = {uri: prefix for prefix, uri in STORAGE_NAMESPACES.items()}
+
+# 包裹根元素：声明 XHTML 实体与命名空间前缀，使存储格式片段成为完整的 XML 文档
+_ROOT = "confluence-storage"
+_PROLOGUE = (
+    f"<!DOCTYPE {_ROOT} ["
+    + "".join(f'<!ENTITY {name} "&#{codepoint};">' for name, codepoint in name2codepoint.items())
+    + "]>"
+    + f"<{_ROOT} "
+    + " ".join(f'xmlns:{prefix}="{uri}"' for prefix, uri in STORAGE_NAMESPACES.items())
+    + ">"
+)
+# 这些元素中的文本在存储格式中以 CDATA 保存
+_CDATA_TAGS = ("ac:plain-text-body", "ac:plain-text-link-body")
+
+
+def lxml_available() -> bool:
+    return etree is not None
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """Resolve the backend name from the argument or CONFLUENCE_PARSER_BACKEND.
+
+    Raises:
+        ValueError: If the backend is unknown, or lxml is requested but not installed
+    """
+    backend = (backend or os.environ.get("CONFLUENCE_PARSER_BACKEND") or "auto").strip().lower()
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"不支持的解析器后端: {backend}")
+    if backend == "auto":
+        # lxml 在不规范的存储格式上会丢失内容，默认不使用
+        return "python"
+    if backend == "lxml" and not lxml_available():
+        raise ValueError("解析器后端 lxml 不可用，请安装 lxml")
+    return backend
+
+
+def _local_name(name: str) -> str:
+    """Map lxml's ``{uri}local`` names back to ``prefix:local`` as html.parser reports them."""
+    if name[0] == "{":
+        uri, local = name[1:].split("}", 1)
+        prefix = _PREFIXES.get(uri)
+        name = f"{prefix}:{local}" if prefix else local
+    return name.lower()
+
+
+class _StorageEventTarget:
+    """lxml parser target replaying events into a ConfluenceHTMLParser."""
+
+    def __init__(self, handler: ConfluenceHTMLParser):
+        self.handler = handler
+        self.depth = 0
+        # 当前所在的 CDATA 元素层数
+        self.cdata_depth = 0
+
+    def start(self, tag: str, attrib: Dict[str, str], nsmap: Optional[Dict[str, str]] = None) -> None:
+        self.depth += 1
+        if self.depth == 1:
+            return
+        name = _local_name(tag)
+        if name in _CDATA_TAGS:
+            self.cdata_depth += 1
+        self.handler.handle_starttag(name, [(_local_name(key), value) for key, value in attrib.items()])
+
+    def end(self, tag: str) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            return
+        name = _local_name(tag)
+        if name in _CDATA_TAGS:
+            self.cdata_depth -= 1
+        self.handler.handle_endtag(name)
+
+    def data(self, data: str) -> None:
+        if self.depth < 1:
+            return
+        if self.cdata_depth:
+            # html.parser 以 unknown_decl 报告 CDATA 段，这里保持相同的回调
+            self.handler.unknown_decl("CDATA[" + data)
+        else:
+            self.handler.handle_data(data)
+
+    def close(self) -> None:
+        return None
+
+
+class LxmlStorageParser:
+    """ConfluenceHTMLParser driven by lxml's incremental XML parser.
+
+    Exposes the same feed/drain interface as ConfluenceHTMLParser. Output
+    that depends on the end of the document is only produced after
+    ``close()``, which ``get_markdown`` and the final drains call implicitly.
+
+    libxml2 parses strictly. When the input turns out not to be well-formed
+    XML, the text fed so far is replayed into a fresh handler from
+    ``fallback`` and parsing continues on the pure-Python backend. The fed
+    text is kept only until output is first drained; a syntax error after
+    that raises ValueError rather than silently dropping content.
+    """
+
+    def __init__(self, handler: ConfluenceHTMLParser,
+                 fallback: Optional[Callable[[], ConfluenceHTMLParser]] = None):
+        self.handler = handler
+        self._fallback = fallback
+        # 已输入的原文，回退时重放；输出过内容后无法无损回退，不再保留
+        self._source: Optional[List[str]] = [] if fallback is not None else None
+        # huge_tree 解除大文档的深度与文本长度限制；不使用 recover，语法错误时回退
+        self._parser = etree.XMLParser(target=_StorageEventTarget(handler), recover=False,
+                                       resolve_entities=True, huge_tree=True, no_network=True)
+        self._parser.feed(_PROLOGUE)
+        self._closed = False
+        self.fell_back = False
+
+    def _fall_back(self, error: Exception) -> None:
+        if self._source is None:
+            raise ValueError(f"存储格式不是规范的 XHTML，请使用 python 解析器后端：{error}") from error
+        self.handler = self._fallback()
+        self.fell_back = True
+        for data in self._source:
+            self.handler.feed(data)
+        self._source = None
+
+    def _drained(self, output) -> None:
+        if output:
+            self._source = None
+
+    def feed(self, data: str) -> None:
+        if self.fell_back:
+            self.handler.feed(data)
+            return
+        if self._source is not None:
+            self._source.append(data)
+        try:
+            self._parser.feed(data)
+        except etree.XMLSyntaxError as e:
+            self._fall_back(e)
+
+    def close(self) -> None:
+        if self._closed or self.fell_back:
+            return
+        self._closed = True
+        try:
+            self._parser.feed(f"</{_ROOT}>")
+            self._parser.close()
+        except etree.XMLSyntaxError as e:
+            self._fall_back(e)
+
+    def get_markdown(self) -> str:
+        self.close()
+        return self.handler.get_markdown()
+
+    def drain_markdown(self, final: bool = False) -> str:
+        if final:
+            self.close()
+        output = self.handler.drain_markdown(final)
+        self._drained(output)
+        return output
+
+    def drain_chunks(self, final: bool = False) -> List[Dict[str, Any]]:
+        if final:
+            self.close()
+        output = self.handler.drain_chunks(final)
+        self._drained(output)
+        return output
+
+
+def create_parser(add_level_mark: bool = False, mark_prefix: str = "L_", chunker=None,
+                  table_format: str = "markdown", backend: Optional[str] = None,
+                  attachment_links: Optional[Dict[str, str]] = None):
+    """Create a storage-format parser on the requested backend.
+
+    Args:
+        add_level_mark: Add level marks to headings
+        mark_prefix: Prefix of the level marks
+        chunker: Optional MarkdownChunker for chunked output
+        table_format: One of TABLE_FORMATS
+        backend: "auto", "lxml" or "python"; defaults to CONFLUENCE_PARSER_BACKEND, then
+            auto, which is the pure-Python parser
+        attachment_links: Attachment filename to link mapping; when given, images and
+            attachment links are rendered instead of dropped
+
+    Returns:
+        ConfluenceHTMLParser or LxmlStorageParser
+    """
+    if resolve_backend(backend) == "lxml":
+        # 回退时的分段器需要从初始状态开始
+        pristine_chunker = copy.deepcopy(chunker)
+
+        def fallback() -> ConfluenceHTMLParser:
+            return ConfluenceHTMLParser(add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                        chunker=pristine_chunker, table_format=table_format,
+                                        attachment_links=attachment_links)
+
+        handler = ConfluenceHTMLParser(add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                       chunker=chunker, table_format=table_format,
+                                       attachment_links=attachment_links)
+        return LxmlStorageParser(handler, fallback)
+    return ConfluenceHTMLParser(add_level_mark=add_level_mark, mark_prefix=mark_prefix,
+                                chunker=chunker, table_format=table_format,
+                                attachment_links=attachment_links)
@@ -0,0 +1,128 @@
+"""Process-wide registry of pooled HTTP sessions for Confluence."""
+
+from typing import Dict, List, Tuple
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SessionKey = Tuple[str, str, str]
+
+
+class ConfluenceSessionRegistry:
+    """Keeps one long-lived requests.Session per (base_url, username, password).
+
+    Sessions are shared across tool invocations so that connections stay warm
+    and TCP/TLS handshakes are reused. The password is part of the key as a
+    SHA-256 fingerprint, so a shared session's credentials never change under
+    a running invocation. A session that stays idle longer than
+    ``keep_alive`` seconds is closed and rebuilt, since servers usually drop
+    idle connections by then anyway; users of a session report every request
+    through ``touch`` so that a long invocation does not count as idle.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 keep_alive: float = 120.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0):
+        """Initialize the registry.
+
+        Args:
+            pool_connections: Number of host pools cached per session
+            pool_maxsize: Maximum connections kept per host pool
+            keep_alive: Idle seconds after which a session is recycled
+            connect_timeout: TCP connect timeout in seconds
+            read_timeout: Socket read timeout in seconds
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._sessions: Dict[SessionKey, Tuple[requests.Session, float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ConfluenceSessionRegistry":
+        """Build a registry from CONFLUENCE_* environment variables."""
+        return cls(
+            pool_connections=int(os.environ.get("CONFLUENCE_POOL_CONNECTIONS", 4)),
+            pool_maxsize=int(os.environ.get("CONFLUENCE_POOL_MAXSIZE", 16)),
+            keep_alive=float(os.environ.get("CONFLUENCE_KEEP_ALIVE", 120)),
+            connect_timeout=float(os.environ.get("CONFLUENCE_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(os.environ.get("CONFLUENCE_READ_TIMEOUT", 60)),
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeout tuple for requests calls."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def _create_session(self, username: str, password: str) -> requests.Session:
+        session = requests.Session()
+        session.auth = (username, password)
+        session.headers.update({'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @staticmethod
+    def session_key(base_url: str, username: str, password: str) -> SessionKey:
+        """Registry key of the given credentials; the password is only kept as a fingerprint."""
+        return (base_url.rstrip('/'), username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+
+    def get_session(self, base_url: str, username: str, password: str) -> requests.Session:
+        """Return the pooled session for the given credentials.
+
+        Sessions of other credentials idle past ``keep_alive`` are closed on
+        the way, e.g. the session of a password that has since been changed.
+
+        Args:
+            base_url: Base URL of the Confluence instance
+            username: Confluence username
+            password: Confluence password
+        """
+        key = self.session_key(base_url, username, password)
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, (_, last_used) in self._sessions.items() if now - last_used > self.keep_alive]
+            stale: List[requests.Session] = [self._sessions.pop(k)[0] for k in idle]
+            entry = self._sessions.get(key)
+            session = entry[0] if entry is not None else self._create_session(username, password)
+            self._sessions[key] = (session, now)
+        for old in stale:
+            old.close()
+        return session
+
+    def touch(self, key: SessionKey) -> None:
+        """Mark the session of ``key`` as used now, so keep-alive recycling spares it."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions[key] = (entry[0], now)
+
+    def discard(self, base_url: str, username: str) -> None:
+        """Close and forget every session of the given user."""
+        base_url = base_url.rstrip('/')
+        with self._lock:
+            keys = [key for key in self._sessions if key[:2] == (base_url, username)]
+            entries = [self._sessions.pop(key) for key in keys]
+        for session, _ in entries:
+            session.close()
+
+    def close_all(self) -> None:
+        """Close every pooled session."""
+        with self._lock:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+        for session, _ in entries:
+            session.close()
+
+
+# 进程内共享的连接池
+session_registry = ConfluenceSessionRegistry.from_env()
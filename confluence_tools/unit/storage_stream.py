@@ -0,0 +1,138 @@
+"""Incremental extraction of ``body.storage.value`` from a streamed content response."""
+
+from collections.abc import Generator, Iterable, Iterator
+from typing import Any, Dict, List
+import codecs
+import json
+import re
+
+# 定位 storage 对象中 value 字符串的起始位置
+_STORAGE_VALUE_START = re.compile(r'"storage"\s*:\s*\{[^{}]*?"value"\s*:\s*"')
+# JSON 字符串中的完整转义序列或结束引号
+_STRING_TOKEN = re.compile(r'\\u[0-9a-fA-F]{4}|\\[^u]|"', re.S)
+# 前导代理项（需要与后续的 \uDCxx 一起解码）
+_HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}')
+# 元数据中的页面标题与版本号
+_TITLE = re.compile(r'"title"\s*:\s*("(?:[^"\\]|\\.)*")', re.S)
+_VERSION_START = re.compile(r'"version"\s*:\s*\{')
+_VERSION_NUMBER = re.compile(r'"number"\s*:\s*(\d+)')
+
+
+def parse_page_metadata(text: str) -> Dict[str, Any]:
+    """Title and version number found in the JSON text before the page body.
+
+    Returns:
+        Dict with ``title`` and ``version`` when present
+    """
+    metadata: Dict[str, Any] = {}
+    title = _TITLE.search(text)
+    if title:
+        metadata["title"] = json.loads(title.group(1))
+    version = _VERSION_START.search(text)
+    number = _VERSION_NUMBER.search(text, version.end()) if version else None
+    if number:
+        metadata["version"] = int(number.group(1))
+    return metadata
+
+
+class StorageValueExtractor:
+    """Pulls the decoded storage HTML out of a JSON document fed in pieces.
+
+    Text before the ``"storage": {... "value": "`` marker is buffered (it is
+    only page metadata); after the marker every fed piece is decoded and
+    returned right away, carrying incomplete escape sequences over to the next
+    piece.
+    """
+
+    def __init__(self):
+        self._prefix = ""
+        self._carry = ""
+        # storage 之前的 JSON 文本（页面元数据）
+        self.metadata_text = ""
+        self.started = False
+        self.finished = False
+
+    def feed(self, text: str) -> str:
+        """Feed the next piece of the JSON document and return newly decoded HTML."""
+        if self.finished:
+            return ""
+        if not self.started:
+            self._prefix += text
+            match = _STORAGE_VALUE_START.search(self._prefix)
+            if not match:
+                return ""
+            self.started = True
+            self.metadata_text = self._prefix[:match.start()]
+            text = self._prefix[match.end():]
+            self._prefix = ""
+
+        raw = self._carry + text
+        self._carry = ""
+        last_token = None
+        for token in _STRING_TOKEN.finditer(raw):
+            if token.group() == '"':
+                self.finished = True
+                return self._decode(raw[:token.start()])
+            last_token = token
+
+        # 末尾不完整的转义序列留到下一次解码
+        cut = raw.find('\\', last_token.end() if last_token else 0)
+        if cut == -1:
+            cut = len(raw)
+        if last_token and last_token.end() == cut and _HIGH_SURROGATE.fullmatch(last_token.group()):
+            cut = last_token.start()
+        self._carry = raw[cut:]
+        return self._decode(raw[:cut])
+
+    @staticmethod
+    def _decode(raw: str) -> str:
+        return json.loads(f'"{raw}"') if raw else ""
+
+
+class StorageStream:
+    """Iterator over the storage HTML of a streamed content response.
+
+    ``read_metadata`` reads ahead up to the start of the body, so the page
+    title and version are known before the body is consumed; the pieces read
+    ahead are replayed by the iterator.
+    """
+
+    def __init__(self, byte_chunks: Iterable[bytes]):
+        self._chunks = iter(byte_chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._extractor = StorageValueExtractor()
+        self._ahead: List[str] = []
+
+    def read_metadata(self) -> Dict[str, Any]:
+        """Read up to the body and return the ``parse_page_metadata`` of the text before it."""
+        extractor = self._extractor
+        while not extractor.started:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            piece = extractor.feed(self._decoder.decode(chunk))
+            if piece:
+                self._ahead.append(piece)
+        return parse_page_metadata(extractor.metadata_text)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._pieces()
+
+    def _pieces(self) -> Generator[str, None, None]:
+        extractor = self._extractor
+        yield from self._ahead
+        self._ahead = []
+        if extractor.finished:
+            return
+        for chunk in self._chunks:
+            piece = extractor.feed(self._decoder.decode(chunk))
+            if piece:
+                yield piece
+            if extractor.finished:
+                return
+        piece = extractor.feed(self._decoder.decode(b'', final=True))
+        if piece:
+            yield piece
+        if not extractor.finished:
+            raise ValueError("body.storage.value not found in response")
+
@@ -0,0 +1,217 @@
+"""Occupancy-grid table model used to render Confluence tables."""
+
+from typing import Any, Dict, List, Optional, Tuple
+import csv
+import html
+import io
+import json
+
+# 表格输出格式；auto 在列数超过阈值时改用 HTML
+TABLE_FORMATS = ("markdown", "html", "csv", "json", "auto")
+# auto 模式下仍使用 Markdown 表格的最大列数
+AUTO_MARKDOWN_MAX_COLUMNS = 12
+# Markdown 中跨行/跨列占位单元格的内容
+SPAN_FILLER = "   "
+# colspan/rowspan 上限，与浏览器的 HTML 解析限制一致
+MAX_COLSPAN = 1000
+MAX_ROWSPAN = 65534
+
+
+def parse_span(value: Optional[str], limit: int = MAX_ROWSPAN) -> int:
+    """Parse a rowspan/colspan attribute; missing, invalid or zero values count as 1.
+
+    Args:
+        value: Attribute value
+        limit: Largest span kept; larger values are clamped to it
+    """
+    if value is None or value == "1":
+        return 1
+    try:
+        span = int(value)
+    except ValueError:
+        return 1
+    return min(span, limit) if span > 0 else 1
+
+
+class TableGrid:
+    """Table model that places every cell exactly once on an occupancy grid.
+
+    Each slot of ``grid`` holds the index of the cell that starts there, or
+    the complement (``~index``) of the cell covering it through a rowspan or
+    colspan. Overlapping spans are resolved at placement time: a slot already
+    taken by an earlier cell is never overwritten. Rows are only created as
+    they are parsed: rowspans reaching further down are kept as pending
+    coverage per column, so a huge rowspan costs nothing past the last row.
+    Building and rendering are linear in the number of slots.
+    """
+
+    def __init__(self):
+        # 按文档顺序保存的单元格：{text, cell_type, rowspan, colspan}
+        self.cells: List[Dict[str, Any]] = []
+        self.grid: List[List[Optional[int]]] = []
+        self.row_count = 0
+        # 列号 -> 按放置顺序排列的 (~index, 结束行)，表示尚未展开的跨行覆盖
+        self._pending: Dict[int, List[Tuple[int, int]]] = {}
+
+    @classmethod
+    def from_rows(cls, rows: List[List[Dict[str, Any]]]) -> "TableGrid":
+        """Build a grid from parsed rows of cell dicts."""
+        grid = cls()
+        for row in rows:
+            grid.add_row(row)
+        return grid
+
+    def add_row(self, row: List[Dict[str, Any]]) -> None:
+        """Place the cells of the next row, skipping slots taken by rowspans above."""
+        r = self.row_count
+        line: List[Optional[int]] = []
+        pending = self._pending
+        for col in list(pending):
+            spans = [span for span in pending[col] if span[1] > r]
+            if not spans:
+                del pending[col]
+                continue
+            pending[col] = spans
+            if len(line) <= col:
+                line.extend([None] * (col + 1 - len(line)))
+            # 最早放置的单元格优先占用该位置
+            line[col] = spans[0][0]
+
+        cells = self.cells
+        col = 0
+        for cell in row:
+            size = len(line)
+            while col < size and line[col] is not None:
+                col += 1
+            index = len(cells)
+            cells.append(cell)
+            rowspan = min(cell.get("rowspan") or 1, MAX_ROWSPAN)
+            colspan = min(cell.get("colspan") or 1, MAX_COLSPAN)
+            if col == size:
+                line.append(index)
+            else:
+                line[col] = index
+            end = col + colspan
+            if colspan > 1:
+                if len(line) < end:
+                    line.extend([None] * (end - len(line)))
+                covered = ~index
+                for c in range(col + 1, end):
+                    if line[c] is None:
+                        line[c] = covered
+            if rowspan > 1:
+                # 下方的行尚未解析，先记录待覆盖的列
+                for c in range(col, end):
+                    pending.setdefault(c, []).append((~index, r + rowspan))
+            col = end
+        self.grid.append(line)
+        self.row_count += 1
+
+    @property
+    def width(self) -> int:
+        """Number of columns; rowspans past the last row are clipped."""
+        return max((len(line) for line in self.grid), default=0)
+
+    @staticmethod
+    def cell_text(cell: Dict[str, Any]) -> str:
+        """Cell text on a single line."""
+        return cell.get("text", "").strip().replace('\n', ' ')
+
+    def _text_rows(self, filler: str, texts: Optional[List[str]] = None) -> List[List[str]]:
+        """Rectangular rows of cell texts; spanned slots hold ``filler``, empty slots ``""``."""
+        if texts is None:
+            texts = [self.cell_text(cell) for cell in self.cells]
+        width = self.width
+        result = []
+        for line in self.grid:
+            if not line:
+                continue
+            values = ["" if slot is None else texts[slot] if slot >= 0 else filler for slot in line]
+            if len(values) < width:
+                values.extend([""] * (width - len(values)))
+            result.append(values)
+        return result
+
+    def to_markdown(self) -> str:
+        """Markdown table; the first row is the header, spanned slots are padded."""
+        texts = [self.cell_text(cell).replace('|', '\\|') for cell in self.cells]
+        rows = self._text_rows(SPAN_FILLER, texts)
+        if not rows:
+            return ""
+        lines = ["| " + " | ".join(row) + " |" for row in rows]
+        if len(lines) > 1:
+            lines.insert(1, "| " + " | ".join(["---"] * len(rows[0])) + " |")
+        return "\n".join(lines) + "\n"
+
+    def to_html(self, compact: bool = False) -> str:
+        """HTML table that keeps the original rowspan/colspan.
+
+        Args:
+            compact: Render on a single line, e.g. inside another table's cell
+        """
+        rows = []
+        for r, line in enumerate(self.grid):
+            # 每行只输出从该行开始的单元格，跨行/跨列占用的位置由属性表达；
+            # 完全被上方单元格覆盖的行输出为空行，以免后续行的 rowspan 错位
+            cells = []
+            for slot in line:
+                if slot is None or slot < 0:
+                    continue
+                cell = self.cells[slot]
+                tag = "th" if cell.get("cell_type") == "th" else "td"
+                attrs = ""
+                # 跨行数截断到实际解析的行数
+                rowspan = min(cell.get("rowspan") or 1, MAX_ROWSPAN, self.row_count - r)
+                colspan = min(cell.get("colspan") or 1, MAX_COLSPAN)
+                if rowspan > 1:
+                    attrs += f' rowspan="{rowspan}"'
+                if colspan > 1:
+                    attrs += f' colspan="{colspan}"'
+                text = cell.get("text", "").strip()
+                # 含嵌套表格的单元格内容已是 HTML，无需转义
+                if not cell.get("nested_html"):
+                    text = html.escape(text).replace('\n', '<br/>')
+                cells.append(f"<{tag}{attrs}>{text}</{tag}>")
+            rows.append(f"<tr>{''.join(cells)}</tr>")
+        if not self.cells:
+            return ""
+        if compact:
+            return f"<table>{''.join(rows)}</table>"
+        return "<table>\n" + "\n".join(rows) + "\n</table>\n"
+
+    def to_csv(self) -> str:
+        """CSV rows in a fenced code block; spanned slots are empty."""
+        rows = self._text_rows("")
+        if not rows:
+            return ""
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return "```csv\n" + buffer.getvalue() + "```\n"
+
+    def to_json(self) -> str:
+        """JSON array of row objects keyed by the header row, in a fenced code block."""
+        rows = self._text_rows("")
+        if not rows:
+            return ""
+        keys = []
+        for i, name in enumerate(rows[0]):
+            key = name or f"column_{i + 1}"
+            while key in keys:
+                key = f"{key}_{i + 1}"
+            keys.append(key)
+        records = [json.dumps(dict(zip(keys, row)), ensure_ascii=False) for row in rows[1:]]
+        if not records:
+            return "```json\n[]\n```\n"
+        return "```json\n[\n" + ",\n".join(records) + "\n]\n```\n"
+
+    def render(self, table_format: str = "markdown") -> str:
+        """Render in one of TABLE_FORMATS."""
+        if table_format == "auto":
+            table_format = "markdown" if self.width <= AUTO_MARKDOWN_MAX_COLUMNS else "html"
+        if table_format == "html":
+            return self.to_html()
+        if table_format == "csv":
+            return self.to_csv()
+        if table_format == "json":
+            return self.to_json()
+        return self.to_markdown()
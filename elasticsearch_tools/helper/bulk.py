@@ -0,0 +1,251 @@
+"""Streaming bulk indexing over the Elasticsearch ``_bulk`` API."""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import random
+import time
+
+import requests
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.json_codec import JsonCodec, default_codec
+
+# 每个分块的最大文档数
+BULK_CHUNK_DOCS = 500
+# 每个分块的最大字节数
+BULK_CHUNK_BYTES = 5 * 1024 * 1024
+# 并发发送分块的线程数
+BULK_MAX_WORKERS = 4
+# 并发数上限，与每个主机的连接池大小（ES_POOL_MAXSIZE）一致，超出的线程只会排队等待连接
+BULK_MAX_WORKERS_LIMIT = int(os.environ.get("ES_POOL_MAXSIZE", 16))
+# 被拒绝（429）的条目最多重试次数
+BULK_MAX_RETRIES = 3
+# 每个分块摘要中最多保留的错误条数
+BULK_MAX_ERRORS = 5
+
+BULK_OPERATIONS = ("index", "create", "update", "delete")
+# 写入操作行而非文档体的元数据字段
+_META_FIELDS = ("_index", "_id", "_routing", "if_seq_no", "if_primary_term", "retry_on_conflict", "pipeline")
+
+
+def serialize_action(action: Dict[str, Any],
+                     codec: JsonCodec = default_codec) -> Tuple[str, Dict[str, Any], bytes]:
+    """Serialize one action to its NDJSON lines.
+
+    An action is a document, optionally carrying ``_op_type`` (``index`` by
+    default, ``create``, ``update`` or ``delete``) and metadata such as
+    ``_index``, ``_id`` and ``_routing``. The body is ``_source`` when given,
+    otherwise the remaining fields; for ``update`` it holds ``doc``,
+    ``script`` or ``upsert`` as the ``_bulk`` API expects.
+
+    Returns:
+        Tuple of (operation, metadata, NDJSON bytes ending with a newline)
+
+    Raises:
+        ValueError: If the action is not an object or has an unknown operation
+    """
+    if not isinstance(action, dict):
+        raise ValueError(f"bulk action must be an object: {action!r}")
+    action = dict(action)
+    op = action.pop("_op_type", "index")
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f"unsupported bulk operation: {op}")
+    meta = {field: action.pop(field) for field in _META_FIELDS if field in action}
+    source = action.pop("_source", action)
+    lines = codec.dumps({op: meta}) + b"\n"
+    if op != "delete":
+        lines += codec.dumps(source) + b"\n"
+    return op, meta, lines
+
+
+def iter_chunks(actions: Iterable[Dict[str, Any]], chunk_docs: int = BULK_CHUNK_DOCS,
+                chunk_bytes: int = BULK_CHUNK_BYTES,
+                codec: JsonCodec = default_codec) -> Iterator[List[Tuple[str, Dict[str, Any], bytes]]]:
+    """Group serialized actions into chunks capped by document count and bytes.
+
+    Actions are consumed lazily, so only one chunk is held at a time. An
+    action larger than ``chunk_bytes`` is sent in a chunk of its own.
+    """
+    chunk: List[Tuple[str, Dict[str, Any], bytes]] = []
+    size = 0
+    for action in actions:
+        item = serialize_action(action, codec)
+        if chunk and (len(chunk) >= chunk_docs or size + len(item[2]) > chunk_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(item)
+        size += len(item[2])
+    if chunk:
+        yield chunk
+
+
+def _backoff(attempt: int, initial: float, maximum: float) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(maximum, initial * (2 ** attempt)))
+
+
+def _item_error(op: str, meta: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    error = result.get("error") or {}
+    if not isinstance(error, dict):
+        error = {"reason": str(error)}
+    return {
+        "op": op,
+        "_index": result.get("_index", meta.get("_index")),
+        "_id": result.get("_id", meta.get("_id")),
+        "status": result.get("status"),
+        "type": error.get("type"),
+        "reason": error.get("reason"),
+    }
+
+
+def send_chunk(helper: ElasticsearchHelper, chunk: List[Tuple[str, Dict[str, Any], bytes]],
+               index: Optional[str] = None, refresh: Optional[str] = None,
+               max_retries: int = BULK_MAX_RETRIES, initial_backoff: float = 0.5,
+               max_backoff: float = 10.0) -> Dict[str, Any]:
+    """Send one chunk and retry the items rejected with 429.
+
+    A chunk rejected as a whole with 429 is retried the same way. Other
+    transport or HTTP errors, and a response that cannot be decoded, fail
+    every item of the chunk.
+
+    Returns:
+        Compact summary with counts, elapsed time and the first errors
+    """
+    summary: Dict[str, Any] = {
+        "docs": len(chunk),
+        "bytes": sum(len(item[2]) for item in chunk),
+        "succeeded": 0,
+        "failed": 0,
+        "retried": 0,
+        "took_ms": 0,
+        "errors": [],
+    }
+    started = time.monotonic()
+    pending = chunk
+    attempt = 0
+    while pending:
+        body = b"".join(item[2] for item in pending)
+        try:
+            response = helper.bulk(body, index=index, refresh=refresh)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status == 429 and attempt < max_retries:
+                time.sleep(_backoff(attempt, initial_backoff, max_backoff))
+                attempt += 1
+                summary["retried"] += len(pending)
+                continue
+            summary["failed"] += len(pending)
+            summary["errors"].append({"status": status, "reason": str(e)})
+            break
+        except requests.RequestException as e:
+            summary["failed"] += len(pending)
+            summary["errors"].append({"status": None, "reason": str(e)})
+            break
+        except ValueError as e:
+            # 响应体无法解码时整个分块记为失败，不让异常逃出工作线程
+            summary["failed"] += len(pending)
+            summary["errors"].append({"status": None, "reason": f"invalid bulk response: {e}"})
+            break
+
+        rejected = []
+        for item, result in zip(pending, response.get("items", [])):
+            op, meta, _ = item
+            result = result.get(op) or next(iter(result.values()), {})
+            status = result.get("status", 500)
+            if status < 300 or (op == "delete" and status == 404):
+                summary["succeeded"] += 1
+            elif status == 429 and attempt < max_retries:
+                rejected.append(item)
+            else:
+                summary["failed"] += 1
+                if len(summary["errors"]) < BULK_MAX_ERRORS:
+                    summary["errors"].append(_item_error(op, meta, result))
+        if rejected:
+            # 集群队列已满，退避后只重发被拒绝的条目
+            time.sleep(_backoff(attempt, initial_backoff, max_backoff))
+            attempt += 1
+            summary["retried"] += len(rejected)
+        pending = rejected
+
+    summary["took_ms"] = round((time.monotonic() - started) * 1000, 2)
+    return summary
+
+
+def streaming_bulk(helper: ElasticsearchHelper, actions: Iterable[Dict[str, Any]],
+                   index: Optional[str] = None, chunk_docs: int = BULK_CHUNK_DOCS,
+                   chunk_bytes: int = BULK_CHUNK_BYTES, max_workers: int = BULK_MAX_WORKERS,
+                   refresh: Optional[str] = None, max_retries: int = BULK_MAX_RETRIES,
+                   initial_backoff: float = 0.5, max_backoff: float = 10.0) -> Iterator[Dict[str, Any]]:
+    """Index actions through ``_bulk``, sending chunks from parallel workers.
+
+    At most ``2 * max_workers`` chunks are serialized ahead of the requests in
+    flight, so memory stays bounded however many actions the iterable yields.
+    ``max_workers`` is clamped to ``1..BULK_MAX_WORKERS_LIMIT``.
+
+    Args:
+        helper: Helper of the target cluster
+        actions: Iterable of actions, see ``serialize_action``
+        index: Default index of actions without ``_index``
+        chunk_docs: Maximum documents per request
+        chunk_bytes: Maximum NDJSON bytes per request
+        max_workers: Number of chunks sent concurrently
+        refresh: ``refresh`` parameter of the requests
+        max_retries: Retries of items rejected with 429
+        initial_backoff: Backoff ceiling of the first retry in seconds
+        max_backoff: Backoff ceiling of any retry in seconds
+
+    Yields:
+        Chunk summaries in chunk order, numbered by ``chunk``
+
+    Raises:
+        ValueError: If an action cannot be parsed or serialized; the summaries
+            of the chunks sent before it are yielded first
+    """
+    max_workers = max(1, min(int(max_workers), BULK_MAX_WORKERS_LIMIT))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight: Deque[Future] = deque()
+    number = 0
+    codec = getattr(helper, "codec", None) or default_codec
+    error: Optional[ValueError] = None
+    try:
+        try:
+            for chunk in iter_chunks(actions, chunk_docs, chunk_bytes, codec):
+                in_flight.append(executor.submit(send_chunk, helper, chunk, index, refresh,
+                                                 max_retries, initial_backoff, max_backoff))
+                while len(in_flight) >= 2 * max_workers:
+                    number += 1
+                    yield {"chunk": number, **in_flight.popleft().result()}
+        except ValueError as e:
+            # 输入中途出错时，已提交的分块可能已经写入，先交付它们的摘要
+            error = e
+        while in_flight:
+            number += 1
+            yield {"chunk": number, **in_flight.popleft().result()}
+        if error is not None:
+            raise error
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def bulk(helper: ElasticsearchHelper, actions: Iterable[Dict[str, Any]], **options: Any) -> Dict[str, Any]:
+    """Run ``streaming_bulk`` and aggregate its chunk summaries.
+
+    Returns:
+        Dict with totals of docs, succeeded, failed and retried items, and the
+        numbered chunk summaries. When an action cannot be parsed or
+        serialized, the totals cover the chunks sent before it and ``error``
+        holds the reason
+    """
+    totals: Dict[str, Any] = {"docs": 0, "succeeded": 0, "failed": 0, "retried": 0, "chunks": []}
+    try:
+        for summary in streaming_bulk(helper, actions, **options):
+            for key in ("docs", "succeeded", "failed", "retried"):
+                totals[key] += summary[key]
+            totals["chunks"].append(summary)
+    except ValueError as e:
+        totals["error"] = str(e)
+    return totals
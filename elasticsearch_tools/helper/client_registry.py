@@ -0,0 +1,234 @@
+"""Process-wide registry of parsed auth lists and pooled Elasticsearch helpers."""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.json_codec import get_codec
+
+
+HelperKey = Tuple[str, str, str]
+
+
+def _fingerprint(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def parse_auth_list(auth_list_text: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Index the auth_list credential by cluster address.
+
+    When an address appears more than once the first entry wins, as with the
+    linear scan it replaces.
+
+    Args:
+        auth_list_text: JSON array of ``{"cluster_address": ...}`` entries
+
+    Returns:
+        Dict mapping cluster address to its auth_list entry
+
+    Raises:
+        json.JSONDecodeError: If the text is not valid JSON
+    """
+    if not auth_list_text:
+        return {}
+    index: Dict[str, Dict[str, Any]] = {}
+    for item in json.loads(auth_list_text):
+        if isinstance(item, dict) and item.get("cluster_address"):
+            index.setdefault(item["cluster_address"], item)
+    return index
+
+
+def entry_credentials(entry: Dict[str, Any]) -> Tuple[str, str]:
+    """Return (username, password) of an auth_list entry.
+
+    Entries may carry explicit ``username`` and ``password`` fields; otherwise
+    the cluster address is split on ``:`` as before.
+
+    Raises:
+        ValueError: If the credentials cannot be derived from the entry
+    """
+    if "username" in entry or "password" in entry:
+        return entry.get("username") or "", entry.get("password") or ""
+    username, password = entry["cluster_address"].split(":")
+    return username, password
+
+
+class ElasticsearchClientRegistry:
+    """Keeps parsed auth lists and one pooled helper per cluster and credentials.
+
+    Helpers are keyed by cluster address, username and a fingerprint of the
+    password, and share a long-lived requests.Session with a sized connection
+    pool, so TCP/TLS handshakes are reused across tool invocations. Changed
+    credentials get a helper of their own, so a running invocation keeps its
+    helper. A helper with no request for longer than ``keep_alive`` seconds
+    (helpers record every request in ``last_used``) is dropped, since servers
+    usually drop idle connections by then anyway; a dropped helper is retired,
+    i.e. its session closes once its requests in flight have finished.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 keep_alive: float = 120.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, max_auth_lists: int = 16,
+                 codec: str = "auto", compression: bool = False):
+        """Initialize the registry.
+
+        Args:
+            pool_connections: Number of host pools cached per session
+            pool_maxsize: Maximum connections kept per host pool
+            keep_alive: Idle seconds after which a helper is recycled
+            connect_timeout: TCP connect timeout in seconds
+            read_timeout: Socket read timeout in seconds
+            max_auth_lists: Number of distinct parsed auth lists kept
+            codec: JSON codec of the helpers, see ``get_codec``
+            compression: Whether helpers gzip request bodies
+
+        Raises:
+            ValueError: If the codec is unknown or unavailable
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_auth_lists = max_auth_lists
+        self.codec = get_codec(codec)
+        self.compression = compression
+        self._auth_lists: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._helpers: Dict[HelperKey, ElasticsearchHelper] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ElasticsearchClientRegistry":
+        """Build a registry from ES_* environment variables."""
+        return cls(
+            pool_connections=int(os.environ.get("ES_POOL_CONNECTIONS", 4)),
+            pool_maxsize=int(os.environ.get("ES_POOL_MAXSIZE", 16)),
+            keep_alive=float(os.environ.get("ES_KEEP_ALIVE", 120)),
+            connect_timeout=float(os.environ.get("ES_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(os.environ.get("ES_READ_TIMEOUT", 60)),
+            codec=os.environ.get("ES_JSON_CODEC", "auto"),
+            compression=os.environ.get("ES_HTTP_COMPRESSION", "false").strip().lower() in ("1", "true", "yes"),
+        )
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """(connect, read) timeout tuple for requests calls."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def auth_index(self, auth_list_text: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the parsed auth_list, parsing each distinct text only once.
+
+        The returned index is shared and must not be modified.
+
+        Raises:
+            json.JSONDecodeError: If the text is not valid JSON
+        """
+        key = _fingerprint(auth_list_text or "")
+        with self._lock:
+            index = self._auth_lists.get(key)
+            if index is not None:
+                self._auth_lists.move_to_end(key)
+                return index
+        index = parse_auth_list(auth_list_text)
+        with self._lock:
+            self._auth_lists[key] = index
+            while len(self._auth_lists) > self.max_auth_lists:
+                self._auth_lists.popitem(last=False)
+        return index
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update({'Connection': 'keep-alive'})
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @staticmethod
+    def helper_key(cluster_address: str, username: str, password: str) -> HelperKey:
+        """Registry key of the given credentials; the password is only kept as a fingerprint."""
+        return (cluster_address.rstrip('/'), username, _fingerprint(username, password))
+
+    def get_helper(self, cluster_address: str, username: str, password: str) -> ElasticsearchHelper:
+        """Return the pooled helper for the given cluster and credentials.
+
+        Helpers of any credentials idle past ``keep_alive`` are retired on the
+        way, e.g. the helper of a password that has since been rotated.
+
+        Args:
+            cluster_address: Elasticsearch cluster URL
+            username: ES username
+            password: ES password
+        """
+        key = self.helper_key(cluster_address, username, password)
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, helper in self._helpers.items()
+                    if helper.in_flight == 0 and now - helper.last_used > self.keep_alive]
+            stale: List[ElasticsearchHelper] = [self._helpers.pop(k) for k in idle]
+            helper = self._helpers.get(key)
+            if helper is None:
+                helper = ElasticsearchHelper(cluster_address, username, password,
+                                             session=self._create_session(), timeout=self.timeout,
+                                             codec=self.codec, compression=self.compression)
+                self._helpers[key] = helper
+            helper.last_used = now
+        for old in stale:
+            old.retire()
+        return helper
+
+    def helper_for(self, auth_list_text: Optional[str], cluster_address: str) -> ElasticsearchHelper:
+        """Look up the cluster in the auth_list and return its pooled helper.
+
+        Args:
+            auth_list_text: The auth_list credential
+            cluster_address: Elasticsearch cluster URL
+
+        Raises:
+            ValueError: If the cluster is not listed or its credentials are malformed
+        """
+        entry = self.auth_index(auth_list_text).get(cluster_address)
+        username = password = None
+        if entry is not None:
+            try:
+                username, password = entry_credentials(entry)
+            except ValueError as e:
+                raise ValueError(f"cluster_address format error: {cluster_address}") from e
+        if not username or not password:
+            raise ValueError(f"Matching cluster_address not found: {cluster_address}")
+        return self.get_helper(cluster_address, username, password)
+
+    def discard(self, cluster_address: str, username: str) -> None:
+        """Forget and retire every helper of the given cluster and user."""
+        prefix = (cluster_address.rstrip('/'), username)
+        with self._lock:
+            keys = [key for key in self._helpers if key[:2] == prefix]
+            helpers = [self._helpers.pop(key) for key in keys]
+        for helper in helpers:
+            helper.retire()
+
+    def close_all(self) -> None:
+        """Retire every pooled helper and forget the parsed auth lists."""
+        with self._lock:
+            helpers = list(self._helpers.values())
+            self._helpers.clear()
+            self._auth_lists.clear()
+        for helper in helpers:
+            helper.retire()
+
+
+# 进程内共享的客户端注册表
+client_registry = ElasticsearchClientRegistry.from_env()
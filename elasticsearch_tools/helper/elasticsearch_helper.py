@@ -1,28 +1,77 @@
 """Helper class for Elasticsearch operations."""
 
-from typing import Dict
+from typing import Dict, Optional, Tuple
+import gzip
+import threading
+import time
 import requests
 from urllib.parse import urljoin
 
+from helper.json_codec import JsonCodec
+
+# 小于该字节数的请求体不压缩
+COMPRESS_MIN_BYTES = 1024
+# gzip 压缩级别，兼顾压缩率与 CPU 开销
+COMPRESS_LEVEL = 6
+
 
 class ElasticsearchHelper:
     """Helper class for Elasticsearch HTTP operations."""
     
-    def __init__(self, cluster_url: str, username: str, password: str):
+    def __init__(self, cluster_url: str, username: str, password: str,
+                 session: Optional[requests.Session] = None,
+                 timeout: Optional[Tuple[float, float]] = None,
+                 codec: Optional[JsonCodec] = None, compression: bool = False):
         """Initialize ES helper with cluster credentials.
         
         Args:
             cluster_url: Elasticsearch cluster URL
             username: ES username
             password: ES password
+            session: Pooled session to send requests with, a new one by default
+            timeout: (connect, read) timeout applied to requests without their own
+            codec: JSON codec for request and response bodies; requests' own
+                JSON handling when None
+            compression: Gzip request bodies of at least COMPRESS_MIN_BYTES; the
+                cluster needs ``http.compression``. Responses are compressed either
+                way, requests already sends ``Accept-Encoding: gzip, deflate``
         """
         self.base_url = cluster_url.rstrip('/')
-        self.session = requests.Session()
+        self.timeout = timeout
+        self.codec = codec
+        self.compression = compression
+        self.session = session or requests.Session()
         self.session.auth = (username, password)
         self.session.headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         })
+        # 进行中的请求数与最近一次请求的时间，供连接池注册表判断空闲与延迟关闭
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self._retired = False
+        self._usage_lock = threading.Lock()
+
+    def retire(self) -> None:
+        """Close the session now, or when the requests in flight have finished."""
+        with self._usage_lock:
+            self._retired = True
+            idle = self.in_flight == 0
+        if idle:
+            self.session.close()
+
+    def _acquire(self) -> None:
+        with self._usage_lock:
+            self.in_flight += 1
+            self.last_used = time.monotonic()
+
+    def _release(self) -> None:
+        with self._usage_lock:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+            close = self._retired and self.in_flight == 0
+        if close:
+            self.session.close()
 
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict:
         """Make HTTP request to ES cluster.
@@ -39,9 +88,27 @@ class ElasticsearchHelper:
             requests.RequestException: If request fails
         """
         url = urljoin(self.base_url, endpoint)
-        response = self.session.request(method, url, **kwargs)
-        response.raise_for_status()
-        return response.json()
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        if self.codec is not None and 'json' in kwargs:
+            body = kwargs.pop('json')
+            if body is not None:
+                kwargs['data'] = self.codec.dumps(body)
+        if self.compression:
+            data = kwargs.get('data')
+            if isinstance(data, bytes) and len(data) >= COMPRESS_MIN_BYTES:
+                kwargs['data'] = gzip.compress(data, COMPRESS_LEVEL)
+                kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Content-Encoding': 'gzip'}
+        self._acquire()
+        try:
+            response = self.session.request(method, url, **kwargs)
+            response.raise_for_status()
+            if self.codec is not None:
+                # gzip 响应已由 urllib3 解压，这里直接解码原始字节
+                return self.codec.loads(response.content)
+            return response.json()
+        finally:
+            self._release()
 
     def cluster_health(self) -> Dict:
         """Get cluster health status."""
@@ -72,10 +139,58 @@ class ElasticsearchHelper:
         """
         return self._make_request('POST', f'/{index}/_search', json=query)
     
+    def msearch(self, body: bytes, index: Optional[str] = None) -> Dict:
+        """Send an NDJSON body of header and query lines to the _msearch API.
+
+        Args:
+            body: Header and search body lines, each ending with a newline
+            index: Default index of searches whose header names none
+        """
+        endpoint = f'/{index}/_msearch' if index else '/_msearch'
+        return self._make_request('POST', endpoint, data=body,
+                                  headers={'Content-Type': 'application/x-ndjson'})
+    
+    def open_point_in_time(self, index: str, keep_alive: str) -> Dict:
+        """Open a point in time on an index (Elasticsearch 7.10+)."""
+        return self._make_request('POST', f'/{index}/_pit', params={'keep_alive': keep_alive})
+    
+    def close_point_in_time(self, pit_id: str) -> Dict:
+        """Release a point in time."""
+        return self._make_request('DELETE', '/_pit', json={'id': pit_id})
+    
+    def search_pit(self, query: Dict) -> Dict:
+        """Execute a search against the point in time named in the query body."""
+        return self._make_request('POST', '/_search', json=query)
+    
+    def scroll_search(self, index: str, query: Dict, keep_alive: str) -> Dict:
+        """Execute a search that opens a scroll context."""
+        return self._make_request('POST', f'/{index}/_search', params={'scroll': keep_alive}, json=query)
+    
+    def scroll(self, scroll_id: str, keep_alive: str) -> Dict:
+        """Fetch the next page of a scroll."""
+        return self._make_request('POST', '/_search/scroll', json={'scroll': keep_alive, 'scroll_id': scroll_id})
+    
+    def clear_scroll(self, scroll_id: str) -> Dict:
+        """Release a scroll context."""
+        return self._make_request('DELETE', '/_search/scroll', json={'scroll_id': [scroll_id]})
+    
     def write_to_index(self, index: str, doc: Dict) -> Dict:
         """Write document to index."""
         return self._make_request('POST', f'/{index}/_doc', json=doc)
     
+    def bulk(self, body: bytes, index: Optional[str] = None, refresh: Optional[str] = None) -> Dict:
+        """Send an NDJSON body to the _bulk API.
+
+        Args:
+            body: Action and document lines, each ending with a newline
+            index: Default index of actions without ``_index``
+            refresh: Optional ``refresh`` parameter (``true``, ``false`` or ``wait_for``)
+        """
+        endpoint = f'/{index}/_bulk' if index else '/_bulk'
+        params = {'refresh': refresh} if refresh else None
+        return self._make_request('POST', endpoint, data=body, params=params,
+                                  headers={'Content-Type': 'application/x-ndjson'})
+    
     def delete_from_index(self, index: str, doc_id: str) -> Dict:
         """Delete document from index."""
         return self._make_request('DELETE', f'/{index}/_doc/{doc_id}')
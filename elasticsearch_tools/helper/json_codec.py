@@ -0,0 +1,80 @@
+"""Pluggable JSON encoding and decoding of Elasticsearch request and response bodies.
+
+The stdlib codec is always available. When orjson is installed it encodes and
+decodes large search and aggregation responses several times faster; both
+codecs produce compact UTF-8 JSON, so either can be used for NDJSON bodies.
+"""
+
+from typing import Any, Optional, Union
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用标准库 json
+    orjson = None
+
+# JSON 编解码器；auto 在安装了 orjson 时使用 orjson
+JSON_CODECS = ("auto", "orjson", "stdlib")
+
+
+class JsonCodec:
+    """Encodes objects to UTF-8 JSON bytes and decodes bytes or text."""
+
+    name = ""
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        raise NotImplementedError
+
+
+class StdlibJsonCodec(JsonCodec):
+    """Codec backed by the standard library ``json`` module."""
+
+    name = "stdlib"
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """Codec backed by orjson; its decode errors subclass ``json.JSONDecodeError``."""
+
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+def get_codec(name: Optional[str] = None) -> JsonCodec:
+    """Return the codec named by the argument or ES_JSON_CODEC.
+
+    Raises:
+        ValueError: If the codec is unknown, or orjson is requested but not installed
+    """
+    name = (name or os.environ.get("ES_JSON_CODEC") or "auto").strip().lower()
+    if name not in JSON_CODECS:
+        raise ValueError(f"不支持的 JSON 编解码器: {name}")
+    if name == "auto":
+        name = "orjson" if orjson_available() else "stdlib"
+    if name == "orjson":
+        if not orjson_available():
+            raise ValueError("JSON 编解码器 orjson 不可用，请安装 orjson")
+        return OrjsonCodec()
+    return StdlibJsonCodec()
+
+
+# 未指定编解码器时使用的默认实现
+default_codec = get_codec("auto")
@@ -0,0 +1,127 @@
+"""Batching of independent searches into ``_msearch`` requests."""
+
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import requests
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.json_codec import JsonCodec, default_codec
+
+# 每个 _msearch 请求最多包含的查询数
+MSEARCH_MAX_SEARCHES = 100
+# 每个 _msearch 请求的最大字节数
+MSEARCH_MAX_BYTES = 5 * 1024 * 1024
+# 请求体过大时集群返回的状态码
+_TOO_LARGE = 413
+
+Search = Union[Dict[str, Any], Tuple[str, Dict[str, Any]], List[Any]]
+
+
+def serialize_search(search: Search, codec: JsonCodec = default_codec) -> bytes:
+    """Serialize one search to its header and body lines.
+
+    A search is an ``(index, query)`` pair, or an object with ``index`` and
+    ``query`` fields; ``query`` is the full search body.
+
+    Raises:
+        ValueError: If the search is malformed
+    """
+    if isinstance(search, dict):
+        index, query = search.get("index"), search.get("query", {})
+    elif isinstance(search, (list, tuple)) and len(search) == 2:
+        index, query = search
+    else:
+        raise ValueError(f"search must be an [index, query] pair or an object: {search!r}")
+    if not index or not isinstance(index, str):
+        raise ValueError(f"search index must be a non-empty string: {index!r}")
+    if not isinstance(query, dict):
+        raise ValueError(f"search query must be an object: {query!r}")
+    return codec.dumps({"index": index}) + b"\n" + codec.dumps(query) + b"\n"
+
+
+def _batches(lines: List[bytes], max_searches: int, max_bytes: int) -> List[Tuple[int, int]]:
+    """Split serialized searches into (start, end) ranges capped by count and bytes."""
+    ranges = []
+    start, size = 0, 0
+    for position, line in enumerate(lines):
+        if position > start and (position - start >= max_searches or size + len(line) > max_bytes):
+            ranges.append((start, position))
+            start, size = position, 0
+        size += len(line)
+    if lines:
+        ranges.append((start, len(lines)))
+    return ranges
+
+
+def _error_result(status: Any, reason: str, error_type: str = "request_error") -> Dict[str, Any]:
+    return {"success": False, "status": status, "error": {"type": error_type, "reason": reason}}
+
+
+def _send(helper: ElasticsearchHelper, lines: List[bytes], results: List[Dict[str, Any]], start: int, end: int) -> int:
+    """Send searches ``start:end``, halving the batch when it is too large.
+
+    Returns:
+        Number of requests sent
+    """
+    try:
+        response = helper.msearch(b"".join(lines[start:end]))
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if status == _TOO_LARGE and end - start > 1:
+            # 请求体超过集群限制，拆成两半分别发送
+            middle = (start + end) // 2
+            return 1 + _send(helper, lines, results, start, middle) + _send(helper, lines, results, middle, end)
+        for position in range(start, end):
+            results[position] = _error_result(status, str(e))
+        return 1
+    except requests.RequestException as e:
+        for position in range(start, end):
+            results[position] = _error_result(None, str(e))
+        return 1
+
+    responses = response.get("responses", [])
+    for position in range(start, end):
+        offset = position - start
+        item = responses[offset] if offset < len(responses) else None
+        if item is None:
+            results[position] = _error_result(None, "missing response", "missing_response")
+        elif "error" in item:
+            error = item["error"]
+            if not isinstance(error, dict):
+                error = {"reason": str(error)}
+            results[position] = _error_result(item.get("status"), error.get("reason"), error.get("type"))
+        else:
+            results[position] = {"success": True, "status": item.get("status", 200), "result": item}
+    return 1
+
+
+def multi_search(helper: ElasticsearchHelper, searches: Iterable[Search],
+                 max_searches: int = MSEARCH_MAX_SEARCHES,
+                 max_bytes: int = MSEARCH_MAX_BYTES) -> Dict[str, Any]:
+    """Run independent searches in as few ``_msearch`` requests as possible.
+
+    Searches are packed into batches capped by count and bytes; a batch the
+    cluster rejects with 413 is split in half and resent. Failures are
+    reported per search, so one bad query does not fail the others.
+
+    Args:
+        helper: Helper of the target cluster
+        searches: ``(index, query)`` pairs or ``{"index", "query"}`` objects
+        max_searches: Maximum searches per request
+        max_bytes: Maximum NDJSON bytes per request
+
+    Returns:
+        Dict with ``results`` aligned with the searches, each holding
+        ``success``, ``status`` and either ``result`` or ``error``, and the
+        number of ``requests`` sent
+
+    Raises:
+        ValueError: If a search is malformed; nothing is sent then
+    """
+    codec = getattr(helper, "codec", None) or default_codec
+    lines = [serialize_search(search, codec) for search in searches]
+    results: List[Dict[str, Any]] = [{} for _ in lines]
+    requests_sent = 0
+    for start, end in _batches(lines, max(1, max_searches), max_bytes):
+        requests_sent += _send(helper, lines, results, start, end)
+    return {"results": results, "requests": requests_sent}
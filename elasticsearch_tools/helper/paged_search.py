@@ -0,0 +1,221 @@
+"""Deep pagination over point in time + search_after, with scroll as fallback."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+import requests
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+
+logger = logging.getLogger(__name__)
+
+# 每页拉取的命中数
+SEARCH_PAGE_SIZE = 1000
+# PIT / scroll 上下文的保活时间，只需覆盖相邻两页的间隔
+SEARCH_KEEP_ALIVE = "1m"
+SEARCH_MODES = ("auto", "pit", "scroll")
+# 集群不支持 PIT 时的响应状态码（7.10 之前的版本）；404 表示索引不存在，不回退
+_PIT_UNSUPPORTED = (400, 405)
+
+Hit = Dict[str, Any]
+
+
+class _PitCursor:
+    """Pages through a point in time with search_after."""
+
+    mode = "pit"
+
+    def __init__(self, helper: ElasticsearchHelper, index: str, body: Dict[str, Any], keep_alive: str):
+        self.helper = helper
+        self.keep_alive = keep_alive
+        self.pit_id = helper.open_point_in_time(index, keep_alive)["id"]
+        # PIT 搜索不能指定索引；_shard_doc 是最廉价且唯一的排序
+        self.body = {"sort": ["_shard_doc"], "track_total_hits": False, **body}
+        # 未指定排序时，7.10/7.11 不认识 _shard_doc，首页被拒绝后改用 _doc
+        self.default_sort = "sort" not in body
+        self.search_after: Optional[List[Any]] = None
+
+    def fetch(self, size: int) -> List[Hit]:
+        try:
+            response = self._search(size)
+        except requests.HTTPError as e:
+            if not (self.default_sort and self.search_after is None and _rejects_shard_doc(e)):
+                raise
+            logger.info("_shard_doc sort unsupported, using _doc as the tiebreak")
+            self.body = {**self.body, "sort": ["_doc"]}
+            self.default_sort = False
+            response = self._search(size)
+        # 每次响应都可能返回新的 PIT id
+        self.pit_id = response.get("pit_id", self.pit_id)
+        hits = response["hits"]["hits"]
+        if hits:
+            self.search_after = hits[-1]["sort"]
+        return hits
+
+    def _search(self, size: int) -> Dict[str, Any]:
+        body = {**self.body, "size": size, "pit": {"id": self.pit_id, "keep_alive": self.keep_alive}}
+        if self.search_after is not None:
+            body["search_after"] = self.search_after
+        return self.helper.search_pit(body)
+
+    def close(self) -> None:
+        self.helper.close_point_in_time(self.pit_id)
+
+
+def _rejects_shard_doc(error: requests.HTTPError) -> bool:
+    """Whether a search failed because the cluster does not know the ``_shard_doc`` sort."""
+    response = error.response
+    if response is None or response.status_code != 400:
+        return False
+    return "_shard_doc" in (getattr(response, "text", "") or "")
+
+
+class _ScrollCursor:
+    """Pages through a scroll context; the page size is fixed by the first page."""
+
+    mode = "scroll"
+
+    def __init__(self, helper: ElasticsearchHelper, index: str, body: Dict[str, Any], keep_alive: str):
+        self.helper = helper
+        self.index = index
+        self.keep_alive = keep_alive
+        self.body = {"sort": ["_doc"], **body}
+        self.scroll_id: Optional[str] = None
+
+    def fetch(self, size: int) -> List[Hit]:
+        if self.scroll_id is None:
+            response = self.helper.scroll_search(self.index, {**self.body, "size": size}, self.keep_alive)
+        else:
+            response = self.helper.scroll(self.scroll_id, self.keep_alive)
+        self.scroll_id = response.get("_scroll_id", self.scroll_id)
+        return response["hits"]["hits"]
+
+    def close(self) -> None:
+        if self.scroll_id is not None:
+            self.helper.clear_scroll(self.scroll_id)
+
+
+class PagedSearch:
+    """Iterates over every hit of a query, page by page, beyond max_result_window.
+
+    Pages come from a point in time with ``search_after``; clusters without
+    PIT support fall back to a scroll. While a page is being consumed the next
+    one is already requested on a helper thread. The PIT or scroll context is
+    released when the iteration ends, including when the consumer stops early
+    or an error is raised.
+
+    Example:
+        for page in PagedSearch(helper, "logs", {"query": {"match_all": {}}}, max_hits=50000):
+            ...
+    """
+
+    def __init__(self, helper: ElasticsearchHelper, index: str, query: Optional[Dict[str, Any]] = None,
+                 page_size: int = SEARCH_PAGE_SIZE, max_hits: Optional[int] = None,
+                 keep_alive: str = SEARCH_KEEP_ALIVE, mode: str = "auto", prefetch: bool = True):
+        """Initialize the search.
+
+        Args:
+            helper: Helper of the target cluster
+            index: Index name or pattern
+            query: Search body; ``from`` and ``size`` are ignored
+            page_size: Hits per request
+            max_hits: Total hits budget, unlimited when None
+            keep_alive: Keep-alive of the PIT or scroll context
+            mode: ``auto`` (PIT, scroll when unsupported), ``pit`` or ``scroll``
+            prefetch: Request the next page while the current one is consumed
+
+        Raises:
+            ValueError: If the mode or page size is invalid
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"unsupported search mode: {mode}")
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+        self.helper = helper
+        self.index = index
+        self.body = {k: v for k, v in (query or {}).items() if k not in ("from", "size", "search_after", "pit")}
+        self.page_size = page_size
+        self.max_hits = max_hits
+        self.keep_alive = keep_alive
+        self.mode = mode
+        self.prefetch = prefetch
+        # 实际使用的分页方式，以及是否因命中数上限而提前结束
+        self.used_mode: Optional[str] = None
+        self.fetched = 0
+        self.truncated = False
+
+    def _open(self):
+        if self.mode != "scroll":
+            try:
+                cursor = _PitCursor(self.helper, self.index, self.body, self.keep_alive)
+                self.used_mode = cursor.mode
+                return cursor
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if self.mode == "pit" or status not in _PIT_UNSUPPORTED:
+                    raise
+                logger.info("point in time unavailable (%s), falling back to scroll", status)
+        cursor = _ScrollCursor(self.helper, self.index, self.body, self.keep_alive)
+        self.used_mode = cursor.mode
+        return cursor
+
+    def _size(self) -> int:
+        if self.max_hits is None:
+            return self.page_size
+        return max(1, min(self.page_size, self.max_hits - self.fetched))
+
+    def __iter__(self) -> Iterator[List[Hit]]:
+        return self.pages()
+
+    def pages(self) -> Iterator[List[Hit]]:
+        """Yield lists of hits until the query is exhausted or the budget is spent."""
+        self.fetched = 0
+        self.truncated = False
+        if self.max_hits is not None and self.max_hits <= 0:
+            return
+        cursor = self._open()
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        pending: Optional[Future] = None
+        try:
+            size = self._size()
+            hits = cursor.fetch(size)
+            while hits:
+                if self.max_hits is not None:
+                    hits = hits[:self.max_hits - self.fetched]
+                self.fetched += len(hits)
+                budget_spent = self.max_hits is not None and self.fetched >= self.max_hits
+                exhausted = len(hits) < size and not budget_spent
+                if budget_spent and len(hits) == size:
+                    self.truncated = True
+                done = budget_spent or exhausted
+                if not done and executor is not None:
+                    size = self._size()
+                    pending = executor.submit(cursor.fetch, size)
+                yield hits
+                if done:
+                    break
+                if pending is not None:
+                    hits, pending = pending.result(), None
+                else:
+                    size = self._size()
+                    hits = cursor.fetch(size)
+        finally:
+            if pending is not None:
+                # 提前退出时等待预取请求结束，再释放上下文
+                pending.cancel()
+                try:
+                    pending.result()
+                except Exception:
+                    pass
+            if executor is not None:
+                executor.shutdown(wait=True)
+            try:
+                cursor.close()
+            except requests.RequestException as e:
+                logger.warning("failed to release %s context: %s", cursor.mode, e)
+
+    def hits(self) -> Iterator[Hit]:
+        """Yield the hits one by one."""
+        for page in self.pages():
+            yield from page
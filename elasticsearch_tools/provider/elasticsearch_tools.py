@@ -6,7 +6,7 @@ import json
 
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
-from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.client_registry import client_registry, entry_credentials
 
 class ElasticsearchToolsProvider(ToolProvider):
     """Provider for Elasticsearch API integration and credential validation."""
@@ -33,13 +33,14 @@ class ElasticsearchToolsProvider(ToolProvider):
                     raise ToolProviderCredentialValidationError("auth_list中缺少cluster_address字段")
 
                 try:
-                    username, password = cluster_address.split(":")
+                    username, password = entry_credentials(auth_item)
                 except ValueError:
                     raise ToolProviderCredentialValidationError(
                         f"cluster_address格式错误: {cluster_address}, 应为 'username:password'"
                     )
 
-                helper = ElasticsearchHelper(cluster_address, username, password)
+                # 校验时即建立连接池，工具调用可直接复用
+                helper = client_registry.get_helper(cluster_address, username, password)
 
                 try:
                     helper.cluster_health()
@@ -0,0 +1,224 @@
+"""Unit tests for streaming bulk indexing."""
+
+import json
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from helper.bulk import bulk, iter_chunks, serialize_action, streaming_bulk
+from helper.elasticsearch_helper import ElasticsearchHelper
+
+
+def decode(body):
+    return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+
+def accept_all(body, index=None, refresh=None):
+    lines = decode(body)
+    return {"errors": False, "items": [{next(iter(meta)): {"status": 201}}
+                                       for meta in lines if set(meta) & {"index", "create", "update", "delete"}]}
+
+
+class TestSerialization(unittest.TestCase):
+    """Test suite for action serialization and chunking."""
+
+    def test_serialize_actions(self):
+        """Test the action and body lines of each operation"""
+        _, _, lines = serialize_action({"_index": "logs", "_id": "1", "msg": "你好"})
+        self.assertEqual(decode(lines), [{"index": {"_index": "logs", "_id": "1"}}, {"msg": "你好"}])
+        _, _, lines = serialize_action({"_op_type": "update", "_id": "2", "doc": {"a": 1}, "doc_as_upsert": True})
+        self.assertEqual(decode(lines), [{"update": {"_id": "2"}}, {"doc": {"a": 1}, "doc_as_upsert": True}])
+        _, _, lines = serialize_action({"_op_type": "delete", "_id": "3"})
+        self.assertEqual(decode(lines), [{"delete": {"_id": "3"}}])
+        _, _, lines = serialize_action({"_op_type": "create", "_source": {"_id": "field"}})
+        self.assertEqual(decode(lines), [{"create": {}}, {"_id": "field"}])
+        with self.assertRaises(ValueError):
+            serialize_action({"_op_type": "upsert"})
+        with self.assertRaises(ValueError):
+            serialize_action(["not", "an", "object"])
+
+    def test_chunks_capped_by_count_and_bytes(self):
+        """Test that chunks respect both caps and an oversized action goes alone"""
+        docs = [{"n": i} for i in range(10)]
+        self.assertEqual([len(c) for c in iter_chunks(docs, chunk_docs=4)], [4, 4, 2])
+        size = len(serialize_action({"n": 0})[2])
+        self.assertEqual([len(c) for c in iter_chunks(docs, chunk_docs=100, chunk_bytes=3 * size)], [3, 3, 3, 1])
+        big = [{"n": 0}, {"text": "x" * 1000}, {"n": 1}]
+        self.assertEqual([len(c) for c in iter_chunks(big, chunk_bytes=100)], [1, 1, 1])
+
+    def test_actions_consumed_lazily(self):
+        """Test that actions are pulled only as chunks are built"""
+        pulled = []
+
+        def actions():
+            for i in range(10):
+                pulled.append(i)
+                yield {"n": i}
+
+        chunks = iter_chunks(actions(), chunk_docs=3)
+        next(chunks)
+        self.assertEqual(len(pulled), 4)
+
+
+class TestStreamingBulk(unittest.TestCase):
+    """Test suite for streaming_bulk and bulk."""
+
+    def setUp(self):
+        self.helper = Mock(spec=ElasticsearchHelper)
+        self.helper.bulk.side_effect = accept_all
+
+    def test_summaries_in_order(self):
+        """Test that chunk summaries come back numbered and in order"""
+        result = bulk(self.helper, ({"n": i} for i in range(25)), index="logs", chunk_docs=10, max_workers=3)
+        self.assertEqual(result["docs"], 25)
+        self.assertEqual(result["succeeded"], 25)
+        self.assertEqual(result["failed"], 0)
+        self.assertEqual([c["chunk"] for c in result["chunks"]], [1, 2, 3])
+        self.assertEqual([c["docs"] for c in result["chunks"]], [10, 10, 5])
+        self.assertEqual(self.helper.bulk.call_count, 3)
+        self.assertEqual(self.helper.bulk.call_args.kwargs["index"], "logs")
+
+    def test_chunks_sent_in_parallel(self):
+        """Test that several chunks are in flight at the same time"""
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow(body, index=None, refresh=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return accept_all(body)
+
+        self.helper.bulk.side_effect = slow
+        list(streaming_bulk(self.helper, ({"n": i} for i in range(40)), chunk_docs=5, max_workers=4))
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 4)
+
+    def test_workers_clamped(self):
+        """Test that max_workers beyond the connection pool size is clamped"""
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow(body, index=None, refresh=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return accept_all(body)
+
+        self.helper.bulk.side_effect = slow
+        with patch('helper.bulk.BULK_MAX_WORKERS_LIMIT', 2):
+            result = bulk(self.helper, ({"n": i} for i in range(30)), chunk_docs=5, max_workers=100)
+        self.assertEqual(result["succeeded"], 30)
+        self.assertLessEqual(peak[0], 2)
+
+    @patch('helper.bulk.time.sleep')
+    def test_rejected_items_retried(self, sleep):
+        """Test that only the items rejected with 429 are sent again"""
+        calls = []
+
+        def throttled(body, index=None, refresh=None):
+            docs = len(decode(body)) // 2
+            calls.append(docs)
+            if len(calls) == 1:
+                items = [{"index": {"status": 429 if i % 2 else 201, "error": {"type": "es_rejected_execution_exception"}}}
+                         for i in range(docs)]
+                return {"errors": True, "items": items}
+            return accept_all(body)
+
+        self.helper.bulk.side_effect = throttled
+        result = bulk(self.helper, [{"n": i} for i in range(6)])
+        self.assertEqual(calls, [6, 3])
+        self.assertEqual(result["succeeded"], 6)
+        self.assertEqual(result["retried"], 3)
+        self.assertEqual(result["failed"], 0)
+        sleep.assert_called_once()
+
+    @patch('helper.bulk.time.sleep')
+    def test_retries_exhausted(self, sleep):
+        """Test that items still rejected after the retries are reported as failed"""
+        self.helper.bulk.side_effect = lambda body, index=None, refresh=None: {
+            "errors": True, "items": [{"index": {"_id": "1", "status": 429, "error": {"type": "rejected", "reason": "queue full"}}}]}
+        result = bulk(self.helper, [{"_id": "1"}], max_retries=2)
+        self.assertEqual(self.helper.bulk.call_count, 3)
+        self.assertEqual(result["failed"], 1)
+        self.assertEqual(result["chunks"][0]["errors"], [
+            {"op": "index", "_index": None, "_id": "1", "status": 429, "type": "rejected", "reason": "queue full"}])
+
+    @patch('helper.bulk.time.sleep')
+    def test_whole_request_throttled(self, sleep):
+        """Test that a chunk rejected with HTTP 429 is retried as a whole"""
+        response = Mock(status_code=429)
+        self.helper.bulk.side_effect = [requests.HTTPError("429", response=response), accept_all(b'{"index":{}}\n{}\n')]
+        result = bulk(self.helper, [{"n": 1}])
+        self.assertEqual(result["succeeded"], 1)
+        self.assertEqual(result["retried"], 1)
+
+    def test_item_and_request_errors(self):
+        """Test that mapping errors and failed requests are summarized, not raised"""
+        self.helper.bulk.side_effect = [
+            {"errors": True, "items": [{"index": {"status": 201}},
+                                       {"index": {"_id": "b", "status": 400,
+                                                  "error": {"type": "mapper_parsing_exception", "reason": "bad"}}}]},
+            requests.ConnectionError("refused"),
+        ]
+        result = bulk(self.helper, [{"n": 1}, {"n": 2}, {"n": 3}], chunk_docs=2, max_workers=1)
+        self.assertEqual(result["succeeded"], 1)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual(result["chunks"][0]["errors"][0]["type"], "mapper_parsing_exception")
+        self.assertIn("refused", result["chunks"][1]["errors"][0]["reason"])
+
+    def test_undecodable_response_fails_chunk(self):
+        """Test that a response the codec cannot decode fails its chunk instead of raising"""
+        self.helper.bulk.side_effect = [ValueError("unexpected character"), accept_all(b'{"index":{}}\n{}\n')]
+        result = bulk(self.helper, [{"n": 1}, {"n": 2}], chunk_docs=1, max_workers=1)
+        self.assertEqual((result["succeeded"], result["failed"]), (1, 1))
+        self.assertIn("unexpected character", result["chunks"][0]["errors"][0]["reason"])
+        self.assertNotIn("error", result)
+
+    def test_invalid_action_keeps_partial_totals(self):
+        """Test that an action failing midway returns the totals of the chunks sent before it"""
+        def actions():
+            for i in range(5):
+                yield {"n": i}
+            raise ValueError("line 6 is not valid JSON")
+
+        result = bulk(self.helper, actions(), chunk_docs=2, max_workers=2)
+        self.assertEqual(result["error"], "line 6 is not valid JSON")
+        self.assertEqual((result["docs"], result["succeeded"]), (4, 4))
+        self.assertEqual([c["chunk"] for c in result["chunks"]], [1, 2])
+
+    def test_streaming_bulk_raises_after_sent_chunks(self):
+        """Test that streaming_bulk yields the submitted chunks before raising the input error"""
+        summaries = []
+        with self.assertRaises(ValueError):
+            for summary in streaming_bulk(self.helper, [{"n": 1}, {"n": 2}, {"n": 3}, "bad"],
+                                          chunk_docs=1, max_workers=4):
+                summaries.append(summary)
+        self.assertEqual([s["succeeded"] for s in summaries], [1, 1])
+
+
+class TestHelperBulk(unittest.TestCase):
+    """Test suite for ElasticsearchHelper.bulk."""
+
+    @patch('requests.Session')
+    def test_bulk_request(self, mock_session):
+        """Test that the body is posted as NDJSON to the index _bulk endpoint"""
+        mock_session.return_value.request.return_value.json.return_value = {"errors": False, "items": []}
+        helper = ElasticsearchHelper("http://localhost:9200", "elastic", "password")
+        helper.bulk(b'{"index":{}}\n{}\n', index="logs", refresh="wait_for")
+        mock_session.return_value.request.assert_called_with(
+            'POST', 'http://localhost:9200/logs/_bulk', data=b'{"index":{}}\n{}\n',
+            params={'refresh': 'wait_for'}, headers={'Content-Type': 'application/x-ndjson'})
+
+
+if __name__ == '__main__':
+    unittest.main()
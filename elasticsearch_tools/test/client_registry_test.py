@@ -0,0 +1,132 @@
+"""Unit tests for the ElasticsearchClientRegistry class."""
+
+import json
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from helper.client_registry import ElasticsearchClientRegistry, entry_credentials, parse_auth_list
+
+
+class TestAuthList(unittest.TestCase):
+    """Test suite for auth_list parsing."""
+
+    def test_parse_auth_list(self):
+        """Test that entries are indexed by cluster address and the first one wins"""
+        text = json.dumps([
+            {"cluster_address": "http://a:9200", "username": "u1", "password": "p1"},
+            {"cluster_address": "http://a:9200", "username": "u2", "password": "p2"},
+            {"cluster_address": "elastic:secret"},
+            {"other": "ignored"},
+        ])
+        index = parse_auth_list(text)
+        self.assertEqual(set(index), {"http://a:9200", "elastic:secret"})
+        self.assertEqual(index["http://a:9200"]["username"], "u1")
+        self.assertEqual(parse_auth_list(""), {})
+
+    def test_entry_credentials(self):
+        """Test explicit credentials and the split of the cluster address"""
+        self.assertEqual(entry_credentials({"cluster_address": "http://a:9200", "username": "u", "password": "p"}),
+                         ("u", "p"))
+        self.assertEqual(entry_credentials({"cluster_address": "elastic:secret"}), ("elastic", "secret"))
+        with self.assertRaises(ValueError):
+            entry_credentials({"cluster_address": "http://a:9200"})
+
+
+class TestElasticsearchClientRegistry(unittest.TestCase):
+    """Test suite for ElasticsearchClientRegistry class functionality."""
+
+    def setUp(self):
+        self.registry = ElasticsearchClientRegistry(pool_connections=2, pool_maxsize=8,
+                                                    connect_timeout=1, read_timeout=10)
+        self.auth_list = json.dumps([
+            {"cluster_address": "http://localhost:9200", "username": "elastic", "password": "password"},
+        ])
+
+    def tearDown(self):
+        self.registry.close_all()
+
+    def test_auth_list_parsed_once(self):
+        """Test that the same auth_list text is parsed only once"""
+        with patch('helper.client_registry.parse_auth_list', wraps=parse_auth_list) as parse:
+            first = self.registry.auth_index(self.auth_list)
+            second = self.registry.auth_index(self.auth_list)
+        self.assertIs(first, second)
+        parse.assert_called_once()
+
+    def test_helper_reused(self):
+        """Test that the same cluster and credentials share one pooled helper"""
+        helper = self.registry.helper_for(self.auth_list, "http://localhost:9200")
+        self.assertIs(self.registry.helper_for(self.auth_list, "http://localhost:9200"), helper)
+        self.assertEqual(helper.session.auth, ("elastic", "password"))
+        self.assertEqual(helper.session.headers['Content-Type'], 'application/json')
+        adapter = helper.session.get_adapter("http://localhost:9200")
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 8)
+
+    def test_credential_change_keeps_running_helper(self):
+        """Test that rotated credentials get their own helper and the old one is not closed"""
+        helper = self.registry.get_helper("http://localhost:9200", "elastic", "password")
+        with patch.object(helper.session, 'close') as close:
+            rotated = self.registry.get_helper("http://localhost:9200", "elastic", "changed")
+        self.assertIsNot(rotated, helper)
+        close.assert_not_called()
+        self.assertEqual(helper.session.auth, ("elastic", "password"))
+        self.assertEqual(rotated.session.auth, ("elastic", "changed"))
+        key = self.registry.helper_key("http://localhost:9200", "elastic", "password")
+        self.assertNotIn("password", key)
+
+    def test_idle_helper_recycled(self):
+        """Test that a helper idle past keep_alive is rebuilt and its session closed"""
+        self.registry.keep_alive = 0
+        helper = self.registry.get_helper("http://localhost:9200", "elastic", "password")
+        time.sleep(0.01)
+        with patch.object(helper.session, 'close') as close:
+            self.assertIsNot(self.registry.get_helper("http://localhost:9200", "elastic", "password"), helper)
+        close.assert_called_once()
+
+    def test_requests_refresh_last_used(self):
+        """Test that every request keeps the helper alive, not only the lookup"""
+        self.registry.keep_alive = 0.2
+        helper = self.registry.get_helper("http://localhost:9200", "elastic", "password")
+        with patch.object(helper.session, 'request', return_value=Mock(content=b'{}')):
+            for _ in range(4):
+                time.sleep(0.08)
+                helper.cluster_health()
+        self.assertIs(self.registry.get_helper("http://localhost:9200", "elastic", "password"), helper)
+
+    def test_retired_helper_closes_after_request(self):
+        """Test that a helper dropped mid-request closes its session only when the request finishes"""
+        helper = self.registry.get_helper("http://localhost:9200", "elastic", "password")
+        close = Mock()
+
+        def request(*args, **kwargs):
+            self.registry.discard("http://localhost:9200", "elastic")
+            close.assert_not_called()
+            return Mock(content=b'{}')
+
+        with patch.object(helper.session, 'request', side_effect=request), \
+                patch.object(helper.session, 'close', close):
+            helper.cluster_health()
+        close.assert_called_once()
+        self.assertEqual(helper.in_flight, 0)
+
+    def test_lookup_errors(self):
+        """Test the errors of unknown clusters and malformed entries"""
+        with self.assertRaisesRegex(ValueError, "not found"):
+            self.registry.helper_for(self.auth_list, "http://other:9200")
+        malformed = json.dumps([{"cluster_address": "http://localhost:9200"}])
+        with self.assertRaisesRegex(ValueError, "format error"):
+            self.registry.helper_for(malformed, "http://localhost:9200")
+
+    def test_timeout_applied(self):
+        """Test that pooled helpers send requests with the registry timeouts"""
+        helper = self.registry.get_helper("http://localhost:9200", "elastic", "password")
+        response = Mock(content=b'{"status": "green"}')
+        with patch.object(helper.session, 'request', return_value=response) as request:
+            self.assertEqual(helper.cluster_health(), {"status": "green"})
+        request.assert_called_once_with('GET', 'http://localhost:9200/_cluster/health', timeout=(1, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
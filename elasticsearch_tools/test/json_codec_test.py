@@ -0,0 +1,144 @@
+"""Unit tests for the JSON codecs and compressed transport of ElasticsearchHelper."""
+
+import gzip
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+
+import requests
+
+from helper.elasticsearch_helper import COMPRESS_MIN_BYTES, ElasticsearchHelper
+from helper.json_codec import OrjsonCodec, StdlibJsonCodec, get_codec, orjson_available
+
+DOCUMENT = {"title": "日志", "count": 3, "ratio": 0.5, "tags": ["a", "b"], "nested": {"ok": True, "none": None}}
+
+
+class TestJsonCodec(unittest.TestCase):
+    """Test suite for the codecs."""
+
+    def codecs(self):
+        codecs = [StdlibJsonCodec()]
+        if orjson_available():
+            codecs.append(OrjsonCodec())
+        return codecs
+
+    def test_round_trip(self):
+        """Test that every codec emits the same compact UTF-8 JSON and decodes bytes and text"""
+        expected = json.dumps(DOCUMENT, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        for codec in self.codecs():
+            with self.subTest(codec=codec.name):
+                self.assertEqual(codec.dumps(DOCUMENT), expected)
+                self.assertEqual(codec.loads(expected), DOCUMENT)
+                self.assertEqual(codec.loads(expected.decode('utf-8')), DOCUMENT)
+                with self.assertRaises(json.JSONDecodeError):
+                    codec.loads(b"{broken")
+
+    def test_get_codec(self):
+        """Test codec resolution from the argument and the environment"""
+        self.assertEqual(get_codec("stdlib").name, "stdlib")
+        self.assertEqual(get_codec("auto").name, "orjson" if orjson_available() else "stdlib")
+        with patch.dict('os.environ', {"ES_JSON_CODEC": "STDLIB"}):
+            self.assertEqual(get_codec().name, "stdlib")
+        with self.assertRaises(ValueError):
+            get_codec("simplejson")
+
+    def test_orjson_unavailable(self):
+        """Test that requesting orjson without it installed is an error"""
+        with patch('helper.json_codec.orjson', None):
+            self.assertEqual(get_codec("auto").name, "stdlib")
+            with self.assertRaises(ValueError):
+                get_codec("orjson")
+
+
+class TestHelperTransport(unittest.TestCase):
+    """Test suite for codec and compression handling in ElasticsearchHelper."""
+
+    def helper(self, **options):
+        session = Mock()
+        session.headers = {}
+        session.request.return_value = Mock(content=b'{"acknowledged":true}')
+        return ElasticsearchHelper("http://localhost:9200", "elastic", "password", session=session, **options)
+
+    def test_codec_encodes_and_decodes(self):
+        """Test that bodies are encoded by the codec and responses decoded from bytes"""
+        helper = self.helper(codec=StdlibJsonCodec())
+        self.assertEqual(helper.search("logs", {"size": 1}), {"acknowledged": True})
+        helper.session.request.assert_called_with('POST', 'http://localhost:9200/logs/_search', data=b'{"size":1}')
+        self.assertNotIn('Accept-Encoding', helper.session.headers)
+
+    def test_large_bodies_compressed(self):
+        """Test that bodies above the threshold are gzipped and small ones are not"""
+        helper = self.helper(codec=StdlibJsonCodec(), compression=True)
+        self.assertNotIn('Accept-Encoding', helper.session.headers)
+        query = {"query": {"terms": {"id": list(range(COMPRESS_MIN_BYTES))}}}
+        helper.search("logs", query)
+        kwargs = helper.session.request.call_args.kwargs
+        self.assertEqual(kwargs['headers'], {'Content-Encoding': 'gzip'})
+        self.assertEqual(json.loads(gzip.decompress(kwargs['data'])), query)
+
+        helper.search("logs", {"size": 1})
+        self.assertNotIn('headers', helper.session.request.call_args.kwargs)
+
+    def test_ndjson_headers_kept(self):
+        """Test that compressed NDJSON keeps its content type"""
+        helper = self.helper(compression=True)
+        body = b'{"index":{}}\n' + b'{"n":1}\n' * COMPRESS_MIN_BYTES
+        helper.bulk(body)
+        kwargs = helper.session.request.call_args.kwargs
+        self.assertEqual(kwargs['headers'], {'Content-Type': 'application/x-ndjson', 'Content-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(kwargs['data']), body)
+
+
+class _CompressingHandler(BaseHTTPRequestHandler):
+    """Echoes the decoded request body back, gzipped when the client accepts it."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.request_encoding = self.headers.get('Content-Encoding')
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.dumps({"echo": json.loads(body), "padding": "x" * 4096}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload)
+            self.send_header('Content-Encoding', 'gzip')
+        self.server.response_bytes = len(payload)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class TestCompressedRoundTrip(unittest.TestCase):
+    """Test suite for gzip transport against a local HTTP server."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _CompressingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_gzip_both_ways(self):
+        """Test that a compressed request is understood and a compressed response decoded"""
+        helper = ElasticsearchHelper(self.url, "elastic", "password", codec=get_codec(), compression=True)
+        query = {"query": {"match": {"text": "y" * 2048}}}
+        result = helper.search("logs", query)
+        self.assertEqual(result["echo"], query)
+        self.assertEqual(self.server.request_encoding, 'gzip')
+        self.assertLess(self.server.response_bytes, 1024)
+        # 响应压缩依赖 requests 默认的 Accept-Encoding，而不是 compression 选项
+        self.assertEqual(helper.session.headers['Accept-Encoding'],
+                         requests.utils.default_headers()['Accept-Encoding'])
+        helper.session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
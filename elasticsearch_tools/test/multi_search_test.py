@@ -0,0 +1,107 @@
+"""Unit tests for _msearch batching."""
+
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.multi_search import multi_search, serialize_search
+
+
+def answer_all(body, index=None):
+    lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+    return {"responses": [{"status": 200, "index": header["index"], "hits": {"hits": []}}
+                          for header in lines[0::2]]}
+
+
+class TestMultiSearch(unittest.TestCase):
+    """Test suite for multi_search."""
+
+    def setUp(self):
+        self.helper = Mock(spec=ElasticsearchHelper)
+        self.helper.msearch.side_effect = answer_all
+
+    def test_serialize_search(self):
+        """Test pairs and objects serialize to header and body lines"""
+        self.assertEqual(serialize_search(["logs", {"size": 1}]), b'{"index":"logs"}\n{"size":1}\n')
+        self.assertEqual(serialize_search({"index": "logs"}), b'{"index":"logs"}\n{}\n')
+        for bad in (["logs"], ["", {}], ["logs", "match_all"], "logs"):
+            with self.subTest(search=bad), self.assertRaises(ValueError):
+                serialize_search(bad)
+
+    def test_single_request_aligned(self):
+        """Test that searches share one request and results follow the input order"""
+        searches = [("a", {}), ("b", {}), {"index": "c", "query": {"size": 0}}]
+        result = multi_search(self.helper, searches)
+        self.assertEqual(result["requests"], 1)
+        self.assertEqual([r["result"]["index"] for r in result["results"]], ["a", "b", "c"])
+        self.assertTrue(all(r["success"] for r in result["results"]))
+
+    def test_batches_split_by_count_and_bytes(self):
+        """Test that oversized lists are split while keeping the alignment"""
+        searches = [(f"i{n}", {}) for n in range(7)]
+        result = multi_search(self.helper, searches, max_searches=3)
+        self.assertEqual(result["requests"], 3)
+        self.assertEqual([r["result"]["index"] for r in result["results"]], [f"i{n}" for n in range(7)])
+        line = len(serialize_search(("i0", {})))
+        result = multi_search(self.helper, searches, max_bytes=2 * line)
+        self.assertEqual(result["requests"], 4)
+
+    def test_too_large_request_halved(self):
+        """Test that a batch rejected with 413 is split in half and resent"""
+        def limited(body, index=None):
+            if body.count(b"\n") > 4:
+                raise requests.HTTPError("413", response=Mock(status_code=413))
+            return answer_all(body)
+
+        self.helper.msearch.side_effect = limited
+        result = multi_search(self.helper, [(f"i{n}", {}) for n in range(5)])
+        self.assertEqual([r["result"]["index"] for r in result["results"]], [f"i{n}" for n in range(5)])
+        self.assertTrue(all(r["success"] for r in result["results"]))
+        self.assertGreater(result["requests"], 1)
+
+    def test_per_query_errors(self):
+        """Test that a failing query reports its own error without failing the others"""
+        self.helper.msearch.side_effect = lambda body, index=None: {"responses": [
+            {"status": 200, "hits": {"hits": []}},
+            {"status": 404, "error": {"type": "index_not_found_exception", "reason": "no such index [missing]"}},
+        ]}
+        results = multi_search(self.helper, [("logs", {}), ("missing", {})])["results"]
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[1], {"success": False, "status": 404,
+                                      "error": {"type": "index_not_found_exception",
+                                                "reason": "no such index [missing]"}})
+
+    def test_failed_request_fails_its_batch(self):
+        """Test that a transport error only fails the searches of its batch"""
+        self.helper.msearch.side_effect = [answer_all(b'{"index":"a"}\n{}\n'), requests.ConnectionError("reset")]
+        results = multi_search(self.helper, [("a", {}), ("b", {})], max_searches=1)["results"]
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(results[1]["success"])
+        self.assertIn("reset", results[1]["error"]["reason"])
+
+    def test_malformed_search_sends_nothing(self):
+        """Test that validation happens before any request"""
+        with self.assertRaises(ValueError):
+            multi_search(self.helper, [("a", {}), ("b",)])
+        self.helper.msearch.assert_not_called()
+
+
+class TestHelperMsearch(unittest.TestCase):
+    """Test suite for ElasticsearchHelper.msearch."""
+
+    @patch('requests.Session')
+    def test_msearch_request(self, mock_session):
+        """Test that the body is posted as NDJSON to _msearch"""
+        mock_session.return_value.request.return_value.json.return_value = {"responses": []}
+        helper = ElasticsearchHelper("http://localhost:9200", "elastic", "password")
+        helper.msearch(b'{"index":"a"}\n{}\n')
+        mock_session.return_value.request.assert_called_with(
+            'POST', 'http://localhost:9200/_msearch', data=b'{"index":"a"}\n{}\n',
+            headers={'Content-Type': 'application/x-ndjson'})
+
+
+if __name__ == '__main__':
+    unittest.main()
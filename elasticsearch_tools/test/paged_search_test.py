@@ -0,0 +1,191 @@
+"""Unit tests for PagedSearch deep pagination."""
+
+import threading
+import unittest
+from unittest.mock import Mock
+
+import requests
+
+from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.paged_search import PagedSearch
+
+
+def make_hits(start, count):
+    return [{"_id": str(i), "sort": [i]} for i in range(start, start + count)]
+
+
+class FakeCluster:
+    """Serves ``total`` documents through PIT and scroll calls of a mocked helper."""
+
+    def __init__(self, total, pit_supported=True, shard_doc_supported=True):
+        self.total = total
+        self.pit_supported = pit_supported
+        self.shard_doc_supported = shard_doc_supported
+        self.open_contexts = set()
+        self.bodies = []
+        self.scroll_size = None
+        self.scroll_offset = 0
+        self.helper = Mock(spec=ElasticsearchHelper)
+        self.helper.open_point_in_time.side_effect = self.open_point_in_time
+        self.helper.close_point_in_time.side_effect = lambda pit_id: self.open_contexts.discard(pit_id)
+        self.helper.search_pit.side_effect = self.search_pit
+        self.helper.scroll_search.side_effect = self.scroll_search
+        self.helper.scroll.side_effect = self.scroll
+        self.helper.clear_scroll.side_effect = lambda scroll_id: self.open_contexts.discard(scroll_id)
+
+    def open_point_in_time(self, index, keep_alive):
+        if not self.pit_supported:
+            raise requests.HTTPError("no handler", response=Mock(status_code=405))
+        self.open_contexts.add("pit-1")
+        return {"id": "pit-1"}
+
+    def search_pit(self, body):
+        self.bodies.append(body)
+        if body.get("sort") == ["_shard_doc"] and not self.shard_doc_supported:
+            raise requests.HTTPError("bad request", response=Mock(
+                status_code=400, text='{"error":{"reason":"No mapping found for [_shard_doc] in order to sort on"}}'))
+        start = body.get("search_after", [-1])[0] + 1
+        self.open_contexts.discard(body["pit"]["id"])
+        self.open_contexts.add("pit-2")
+        return {"pit_id": "pit-2", "hits": {"hits": make_hits(start, max(0, min(body["size"], self.total - start)))}}
+
+    def scroll_search(self, index, body, keep_alive):
+        self.bodies.append(body)
+        self.scroll_size = body["size"]
+        self.open_contexts.add("scroll-1")
+        return self._scroll_page()
+
+    def scroll(self, scroll_id, keep_alive):
+        return self._scroll_page()
+
+    def _scroll_page(self):
+        start = self.scroll_offset
+        count = max(0, min(self.scroll_size, self.total - start))
+        self.scroll_offset += count
+        return {"_scroll_id": "scroll-1", "hits": {"hits": make_hits(start, count)}}
+
+
+class TestPagedSearch(unittest.TestCase):
+    """Test suite for PagedSearch."""
+
+    def test_pit_pages_through_everything(self):
+        """Test that all hits are returned in order past the page size"""
+        cluster = FakeCluster(25)
+        search = PagedSearch(cluster.helper, "logs", {"query": {"match_all": {}}, "from": 5, "size": 3}, page_size=10)
+        ids = [hit["_id"] for hit in search.hits()]
+        self.assertEqual(ids, [str(i) for i in range(25)])
+        self.assertEqual(search.used_mode, "pit")
+        self.assertFalse(search.truncated)
+        first = cluster.bodies[0]
+        self.assertNotIn("from", first)
+        self.assertEqual(first["sort"], ["_shard_doc"])
+        self.assertEqual(cluster.bodies[1]["search_after"], [9])
+        # 每次请求使用上一次响应返回的 PIT id，结束后全部释放
+        self.assertEqual(cluster.bodies[1]["pit"]["id"], "pit-2")
+        self.assertEqual(cluster.open_contexts, set())
+
+    def test_budget_limits_hits(self):
+        """Test that the total hits budget truncates the last page and the request sizes"""
+        cluster = FakeCluster(100)
+        search = PagedSearch(cluster.helper, "logs", page_size=10, max_hits=25)
+        pages = list(search)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([body["size"] for body in cluster.bodies], [10, 10, 5])
+        self.assertTrue(search.truncated)
+        self.assertEqual(search.fetched, 25)
+        self.assertEqual(cluster.open_contexts, set())
+
+    def test_early_exit_releases_pit(self):
+        """Test that stopping the iteration waits for the prefetch and closes the PIT"""
+        cluster = FakeCluster(1000)
+        pages = PagedSearch(cluster.helper, "logs", page_size=10).pages()
+        next(pages)
+        pages.close()
+        self.assertEqual(cluster.open_contexts, set())
+        cluster.helper.close_point_in_time.assert_called_once()
+
+    def test_next_page_prefetched(self):
+        """Test that the next page is requested before the current one is consumed"""
+        cluster = FakeCluster(30)
+        fetched = threading.Event()
+        original = cluster.search_pit
+
+        def tracking(body):
+            result = original(body)
+            if "search_after" in body:
+                fetched.set()
+            return result
+
+        cluster.helper.search_pit.side_effect = tracking
+        pages = PagedSearch(cluster.helper, "logs", page_size=10).pages()
+        next(pages)
+        self.assertTrue(fetched.wait(2))
+        pages.close()
+
+    def test_without_prefetch(self):
+        """Test that pages are fetched on demand when prefetch is disabled"""
+        cluster = FakeCluster(15)
+        pages = PagedSearch(cluster.helper, "logs", page_size=10, prefetch=False).pages()
+        next(pages)
+        self.assertEqual(cluster.helper.search_pit.call_count, 1)
+        self.assertEqual(len(next(pages)), 5)
+        pages.close()
+
+    def test_scroll_fallback(self):
+        """Test that clusters without PIT are paged with a scroll that is cleared afterwards"""
+        cluster = FakeCluster(23, pit_supported=False)
+        search = PagedSearch(cluster.helper, "logs", {"query": {"term": {"a": 1}}}, page_size=10)
+        ids = [hit["_id"] for hit in search.hits()]
+        self.assertEqual(ids, [str(i) for i in range(23)])
+        self.assertEqual(search.used_mode, "scroll")
+        self.assertEqual(cluster.bodies[0]["sort"], ["_doc"])
+        cluster.helper.clear_scroll.assert_called_once_with("scroll-1")
+        self.assertEqual(cluster.open_contexts, set())
+
+    def test_shard_doc_rejected_uses_doc(self):
+        """Test that 7.10/7.11 clusters rejecting _shard_doc are paged with a _doc tiebreak"""
+        cluster = FakeCluster(15, shard_doc_supported=False)
+        search = PagedSearch(cluster.helper, "logs", page_size=10)
+        ids = [hit["_id"] for hit in search.hits()]
+        self.assertEqual(ids, [str(i) for i in range(15)])
+        self.assertEqual(search.used_mode, "pit")
+        self.assertEqual([body["sort"] for body in cluster.bodies], [["_shard_doc"], ["_doc"], ["_doc"]])
+        self.assertEqual(cluster.open_contexts, set())
+
+    def test_missing_index_does_not_fall_back(self):
+        """Test that a 404 from opening the PIT is raised instead of retried with a scroll"""
+        cluster = FakeCluster(5)
+        cluster.helper.open_point_in_time.side_effect = requests.HTTPError(
+            "index_not_found_exception", response=Mock(status_code=404))
+        with self.assertRaises(requests.HTTPError):
+            list(PagedSearch(cluster.helper, "missing"))
+        cluster.helper.scroll_search.assert_not_called()
+
+    def test_pit_mode_does_not_fall_back(self):
+        """Test that an explicit pit mode raises when PIT is unsupported"""
+        cluster = FakeCluster(5, pit_supported=False)
+        with self.assertRaises(requests.HTTPError):
+            list(PagedSearch(cluster.helper, "logs", mode="pit"))
+        cluster.helper.scroll_search.assert_not_called()
+
+    def test_error_releases_context(self):
+        """Test that a failing page still releases the PIT"""
+        cluster = FakeCluster(100)
+        cluster.helper.search_pit.side_effect = [cluster.search_pit({"size": 10, "pit": {"id": "pit-1"}}),
+                                                 requests.ConnectionError("reset")]
+        cluster.open_contexts.add("pit-1")
+        with self.assertRaises(requests.ConnectionError):
+            list(PagedSearch(cluster.helper, "logs", page_size=10))
+        cluster.helper.close_point_in_time.assert_called_once_with("pit-2")
+
+    def test_invalid_arguments(self):
+        """Test that unknown modes and empty pages are rejected"""
+        helper = Mock(spec=ElasticsearchHelper)
+        with self.assertRaises(ValueError):
+            PagedSearch(helper, "logs", mode="from")
+        with self.assertRaises(ValueError):
+            PagedSearch(helper, "logs", page_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Benchmark of response decoding and bytes on the wire for Elasticsearch responses.
+
+Run from the plugin root:
+
+    python test/transport_benchmark.py                    # print results
+    python test/transport_benchmark.py --scale 4          # larger responses
+    python test/transport_benchmark.py --save bench.json  # record the results
+
+Each scenario is a canned response (search hits with documents, nested
+aggregation buckets, a bulk response). For every codec it reports the best
+decode time, and for gzip transport the compressed size and the time to
+decompress and decode the body.
+"""
+
+from typing import Any, Dict, List
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+# 以脚本方式运行时，将插件根目录加入模块搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.elasticsearch_helper import COMPRESS_LEVEL  # noqa: E402
+from helper.json_codec import JSON_CODECS, get_codec, orjson_available  # noqa: E402
+
+WORDS = ("error", "warning", "timeout", "request", "user", "order", "payment", "服务", "数据库", "连接")
+
+
+def search_response(hits: int, rng: random.Random) -> Dict[str, Any]:
+    """A search response with ``hits`` log documents."""
+    return {
+        "took": 42, "timed_out": False,
+        "_shards": {"total": 5, "successful": 5, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": hits, "relation": "eq"}, "max_score": 1.0,
+            "hits": [{
+                "_index": "logs-2025.03", "_id": f"doc-{i:08d}", "_score": round(rng.random(), 6),
+                "_source": {
+                    "@timestamp": f"2025-03-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+                    "level": rng.choice(("INFO", "WARN", "ERROR")),
+                    "service": f"service-{i % 17}",
+                    "message": " ".join(rng.choice(WORDS) for _ in range(24)),
+                    "latency_ms": round(rng.random() * 1000, 3),
+                    "status": rng.choice((200, 201, 404, 500)),
+                    "tags": [rng.choice(WORDS) for _ in range(4)],
+                    "host": {"name": f"node-{i % 9}", "ip": f"10.0.{i % 255}.{i % 251}"},
+                },
+            } for i in range(hits)],
+        },
+    }
+
+
+def aggregation_response(buckets: int, rng: random.Random) -> Dict[str, Any]:
+    """A terms > date_histogram > stats aggregation response."""
+    return {
+        "took": 120, "timed_out": False, "hits": {"total": {"value": 10000, "relation": "gte"}, "hits": []},
+        "aggregations": {"by_service": {
+            "doc_count_error_upper_bound": 0, "sum_other_doc_count": 0,
+            "buckets": [{
+                "key": f"service-{s}", "doc_count": rng.randint(1000, 100000),
+                "per_hour": {"buckets": [{
+                    "key_as_string": f"2025-03-01T{h:02d}:00:00.000Z", "key": 1740787200000 + h * 3600000,
+                    "doc_count": rng.randint(0, 5000),
+                    "latency": {"count": rng.randint(0, 5000), "min": rng.random(), "max": rng.random() * 1000,
+                                "avg": rng.random() * 100, "sum": rng.random() * 1e6},
+                } for h in range(24)]},
+            } for s in range(buckets)],
+        }},
+    }
+
+
+def bulk_response(items: int, rng: random.Random) -> Dict[str, Any]:
+    """A bulk response for ``items`` index actions."""
+    return {"took": 300, "errors": False, "items": [{"index": {
+        "_index": "logs-2025.03", "_id": f"doc-{i:08d}", "_version": 1, "result": "created",
+        "_shards": {"total": 2, "successful": 2, "failed": 0}, "_seq_no": i, "_primary_term": 1, "status": 201,
+    }} for i in range(items)]}
+
+
+def scenarios(scale: float) -> Dict[str, bytes]:
+    rng = random.Random(7)
+    responses = {
+        "search_hits": search_response(int(5000 * scale), rng),
+        "aggregations": aggregation_response(int(400 * scale), rng),
+        "bulk_items": bulk_response(int(20000 * scale), rng),
+    }
+    return {name: json.dumps(body, ensure_ascii=False).encode('utf-8') for name, body in responses.items()}
+
+
+def best_of(repeat: int, func, *args) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure(body: bytes, codec_names: List[str], repeat: int = 5) -> Dict[str, Any]:
+    """Decode timings per codec and gzip transfer sizes of one response body."""
+    compressed = gzip.compress(body, COMPRESS_LEVEL)
+    result: Dict[str, Any] = {
+        "raw_kb": round(len(body) / 1024, 1),
+        "gzip_kb": round(len(compressed) / 1024, 1),
+        "wire_saving": round(1 - len(compressed) / len(body), 3),
+        "decode_ms": {},
+        "gunzip_decode_ms": {},
+    }
+    for name in codec_names:
+        codec = get_codec(name)
+        result["decode_ms"][name] = round(best_of(repeat, codec.loads, body) * 1000, 2)
+        result["gunzip_decode_ms"][name] = round(
+            best_of(repeat, lambda data: codec.loads(gzip.decompress(data)), compressed) * 1000, 2)
+    if len(codec_names) > 1:
+        stdlib, fast = result["decode_ms"]["stdlib"], result["decode_ms"][codec_names[-1]]
+        result["decode_speedup"] = round(stdlib / fast, 2) if fast else float('inf')
+    return result
+
+
+def run(scale: float = 1.0, repeat: int = 5) -> Dict[str, Dict[str, Any]]:
+    codec_names = ["stdlib"] + (["orjson"] if orjson_available() else [])
+    return {name: measure(body, codec_names, repeat) for name, body in scenarios(scale).items()}
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="response size multiplier")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="timed runs per measurement")
+    arg_parser.add_argument("--save", help="write results to this JSON file")
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.scale, args.repeat)
+    codecs = [name for name in JSON_CODECS if name != "auto" and (name != "orjson" or orjson_available())]
+    header = f"{'scenario':<14}{'raw KB':>10}{'gzip KB':>10}{'saved':>8}" + "".join(
+        f"{name + ' ms':>14}{'gz+' + name + ' ms':>16}" for name in codecs)
+    print(header)
+    for name, result in results.items():
+        line = f"{name:<14}{result['raw_kb']:>10}{result['gzip_kb']:>10}{result['wire_saving']:>8.0%}"
+        for codec in codecs:
+            line += f"{result['decode_ms'][codec]:>14}{result['gunzip_decode_ms'][codec]:>16}"
+        if "decode_speedup" in result:
+            line += f"   x{result['decode_speedup']}"
+        print(line)
+    if not orjson_available():
+        print("orjson is not installed; only the stdlib codec was measured")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
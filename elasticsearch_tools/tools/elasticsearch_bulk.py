@@ -0,0 +1,65 @@
+from collections.abc import Generator, Iterator
+from typing import Any
+import json
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from helper.bulk import BULK_CHUNK_BYTES, BULK_CHUNK_DOCS, BULK_MAX_WORKERS, bulk
+from helper.client_registry import client_registry
+
+
+def iter_actions(text: str) -> Iterator[dict]:
+    """Parse actions from a JSON array or from NDJSON with one action per line.
+
+    NDJSON lines are decoded lazily, so a large input is not held twice.
+    """
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        yield from json.loads(stripped)
+        return
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {number} is not valid JSON: {e}") from e
+
+
+class ElasticsearchBulkTool(Tool):
+    """Tool for indexing many documents through the _bulk API."""
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        cluster_address = tool_parameters.get("cluster_address")
+        index = tool_parameters.get("index") or None
+        actions = tool_parameters.get("actions") or ""
+        chunk_size = int(tool_parameters.get("chunk_size") or BULK_CHUNK_DOCS)
+        max_chunk_bytes = int(tool_parameters.get("max_chunk_bytes") or BULK_CHUNK_BYTES)
+        max_workers = int(tool_parameters.get("max_workers") or BULK_MAX_WORKERS)
+        refresh = tool_parameters.get("refresh") or None
+
+        auth_list_text = self.runtime.credentials["auth_list"]
+
+        try:
+            helper = client_registry.helper_for(auth_list_text, cluster_address)
+        except ValueError as e:
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", str(e))
+            return
+
+        if chunk_size < 1 or max_chunk_bytes < 1 or max_workers < 1:
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", "chunk_size, max_chunk_bytes and max_workers must be positive")
+            return
+
+        result = bulk(helper, iter_actions(actions), index=index, chunk_docs=chunk_size,
+                      chunk_bytes=max_chunk_bytes, max_workers=max_workers, refresh=refresh)
+        if "error" in result:
+            # 输入在流式解析中途出错时，之前的分块可能已经写入，一并返回其统计
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", f"invalid bulk actions: {result['error']}")
+            yield self.create_variable_message("result_object", result)
+            return
+
+        yield self.create_variable_message("success", result["failed"] == 0)
+        yield self.create_variable_message("result_object", result)
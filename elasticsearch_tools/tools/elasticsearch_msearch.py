@@ -0,0 +1,41 @@
+from collections.abc import Generator
+from typing import Any
+import json
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from helper.client_registry import client_registry
+from helper.multi_search import MSEARCH_MAX_SEARCHES, multi_search
+
+
+class ElasticsearchMsearchTool(Tool):
+    """Tool for running several independent searches in one _msearch round trip."""
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        cluster_address = tool_parameters.get("cluster_address")
+        searches = tool_parameters.get("searches") or "[]"
+        max_searches = int(tool_parameters.get("max_searches_per_request") or MSEARCH_MAX_SEARCHES)
+
+        auth_list_text = self.runtime.credentials["auth_list"]
+
+        try:
+            helper = client_registry.helper_for(auth_list_text, cluster_address)
+            if isinstance(searches, str):
+                searches = json.loads(searches)
+            if not isinstance(searches, list):
+                raise ValueError("searches must be a JSON array")
+            result = multi_search(helper, searches, max_searches=max_searches)
+        except ValueError as e:
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", str(e))
+            return
+
+        failed = sum(1 for item in result["results"] if not item["success"])
+        yield self.create_variable_message("success", failed == 0)
+        # 结果与输入的查询一一对应，失败的查询带有各自的错误
+        yield self.create_variable_message("result_array", result["results"])
+        yield self.create_variable_message("result_object", {
+            "searches": len(result["results"]),
+            "failed": failed,
+            "requests": result["requests"],
+        })
@@ -1,10 +1,9 @@
 from collections.abc import Generator
 from typing import Any
-import json
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from helper.elasticsearch_helper import ElasticsearchHelper
+from helper.client_registry import client_registry
 
 class ElasticsearchToolsTool(Tool):
     
@@ -22,30 +21,14 @@ class ElasticsearchToolsTool(Tool):
 
         auth_list_text = self.runtime.credentials["auth_list"]
 
-        if not auth_list_text:
-            auth_list = []
-        else:
-            auth_list = json.loads(auth_list_text)
-
-        username = None
-        password = None
-
-        for item in auth_list:
-            if item.get("cluster_address") == cluster_address:
-                try:
-                    username, password = cluster_address.split(":")
-                except ValueError:
-                    yield self.create_variable_message("success", False)
-                    yield self.create_variable_message("error_message", f"cluster_address format error: {cluster_address}")
-                    return
-                break
-
-        if not username or not password:
+        # auth_list 只解析一次并按集群地址建立索引，连接池按集群和凭据复用
+        try:
+            helper = client_registry.helper_for(auth_list_text, cluster_address)
+        except ValueError as e:
             yield self.create_variable_message("success", False)
-            yield self.create_variable_message("error_message", f"Matching cluster_address not found: {cluster_address}")
+            yield self.create_variable_message("error_message", str(e))
             return
 
-        helper = ElasticsearchHelper(cluster_address, username, password)
         result = helper._make_request(method, endpoint, json=body)
 
         yield self.create_variable_message("success", True)
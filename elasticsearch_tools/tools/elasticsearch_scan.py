@@ -0,0 +1,60 @@
+from collections.abc import Generator
+from typing import Any
+import json
+
+import requests
+
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from helper.client_registry import client_registry
+from helper.paged_search import PagedSearch
+
+# 单次调用默认最多返回的命中数
+SCAN_MAX_HITS = 10000
+# 每条消息包含的命中数
+SCAN_BATCH_SIZE = 500
+
+
+class ElasticsearchScanTool(Tool):
+    """Tool for streaming every hit of a query beyond max_result_window."""
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        cluster_address = tool_parameters.get("cluster_address")
+        index = tool_parameters.get("index")
+        query = tool_parameters.get("query") or {}
+        batch_size = int(tool_parameters.get("batch_size") or SCAN_BATCH_SIZE)
+        max_hits = int(tool_parameters.get("max_hits") or SCAN_MAX_HITS)
+        mode = tool_parameters.get("mode") or "auto"
+
+        auth_list_text = self.runtime.credentials["auth_list"]
+
+        try:
+            helper = client_registry.helper_for(auth_list_text, cluster_address)
+            if isinstance(query, str):
+                query = json.loads(query)
+            if not isinstance(query, dict):
+                raise ValueError("query must be a JSON object")
+            search = PagedSearch(helper, index, query, page_size=batch_size, max_hits=max_hits, mode=mode)
+        except ValueError as e:
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", str(e))
+            return
+
+        # 每页命中作为一条 JSON 消息流式输出
+        batches = 0
+        try:
+            for hits in search:
+                batches += 1
+                yield self.create_json_message({"batch": batches, "hits": hits})
+        except requests.RequestException as e:
+            yield self.create_variable_message("success", False)
+            yield self.create_variable_message("error_message", str(e))
+            return
+
+        yield self.create_variable_message("success", True)
+        yield self.create_variable_message("result_object", {
+            "total": search.fetched,
+            "batches": batches,
+            "mode": search.used_mode,
+            "truncated": search.truncated,
+        })